@@ -0,0 +1,7 @@
+from django.apps import AppConfig
+
+
+class BenchConfig(AppConfig):
+    name = 'benchmarks.app'
+    # the label the benchmark models and their logging config use
+    label = 'bench'
@@ -0,0 +1,2 @@
+def noop(tcl, notifiable_fields):
+    """Callback that only costs what dispatching it costs."""
@@ -0,0 +1,32 @@
+from django.db import models
+
+from benchmarks.scenarios import WIDE_FIELDS, WIDE_PROPERTIES
+
+
+class NarrowModel(models.Model):
+    name = models.CharField(max_length=100)
+    counter = models.IntegerField(default=0)
+    speed = models.FloatField(default=0)
+    active = models.BooleanField(default=True)
+
+    class Meta:
+        app_label = 'bench'
+
+    @property
+    def label(self):
+        return '{}-{}'.format(self.name, self.counter)
+
+
+def make_wide_property(index):
+    def wide_property(self):
+        return sum(getattr(self, name) for name in WIDE_FIELDS[index::5])
+    return property(wide_property)
+
+
+WideModel = type('WideModel', (models.Model,), dict(
+    {name: models.IntegerField(default=0) for name in WIDE_FIELDS},
+    **{name: make_wide_property(index)
+       for index, name in enumerate(WIDE_PROPERTIES)},
+    Meta=type('Meta', (), {'app_label': 'bench'}),
+    __module__=__name__
+))
@@ -0,0 +1,221 @@
+"""
+Measures what table change logging costs per save.
+
+Each scenario runs in its own process, since the logging config is read
+once at import time:
+
+    python -m benchmarks.run --output results.json
+"""
+import argparse
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import time
+
+from benchmarks.scenarios import MODELS, MODES
+
+
+def get_percentile(values, percentile):
+    values = sorted(values)
+    index = int(round((len(values) - 1) * percentile / 100.0))
+    return values[index]
+
+
+def change_instance(instance, fields, round_number):
+    """Gives every concrete tracked field of instance a new value."""
+    for name in fields:
+        field = instance._meta.get_field(name)
+        value = getattr(instance, name)
+        if field.get_internal_type() == 'BooleanField':
+            setattr(instance, name, not value)
+        elif field.get_internal_type() == 'CharField':
+            setattr(instance, name, 'name-{}'.format(round_number))
+        else:
+            setattr(instance, name, value + 1)
+
+
+def get_bytes_per_log(connection, model):
+    table = connection.ops.quote_name(model._meta.db_table)
+    with connection.cursor() as cursor:
+        if connection.vendor == 'postgresql':
+            cursor.execute(
+                'SELECT avg(pg_column_size(t.*)) FROM {} t'.format(table))
+        else:
+            cursor.execute('SELECT avg(length(log)) FROM {}'.format(table))
+        value = cursor.fetchone()[0]
+    return float(value) if value is not None else None
+
+
+def time_admin_changelist(repeat):
+    from django.contrib import admin
+    from django.contrib.auth.models import User
+    from django.test import RequestFactory
+
+    from tablechangelogger.models import TableChangesLog
+
+    user = User.objects.create_superuser('bench', 'bench@example.com', 'x')
+    model_admin = admin.site._registry[TableChangesLog]
+    timings = []
+    for _ in range(repeat):
+        request = RequestFactory().get('/admin/tablechangelogger/')
+        request.user = user
+        start = time.perf_counter()
+        model_admin.changelist_view(request).render()
+        timings.append(time.perf_counter() - start)
+    return statistics.median(timings)
+
+
+def measure(scenario):
+    from django.apps import apps
+    from django.db import connection, transaction
+    from django.test.utils import CaptureQueriesContext
+
+    from tablechangelogger.coalesce import COALESCER
+    from tablechangelogger.models import TableChangesLog
+
+    model = apps.get_model(
+        'bench', MODELS[scenario['model']]['path'].rsplit('.', 1)[1])
+    fields = [field.name for field in model._meta.concrete_fields
+              if field.name in MODELS[scenario['model']]['fields']]
+    model.objects.bulk_create([
+        model(name='name') if 'name' in fields else model()
+        for _ in range(scenario['instances'])
+    ])
+    instances = list(model.objects.all())
+    batch = scenario['batch']
+
+    def run_batches(rounds, offset=0):
+        timings = []
+        for batch_number in range(rounds):
+            start = time.perf_counter()
+            with transaction.atomic():
+                for index in range(batch):
+                    round_number = offset + batch_number * batch + index
+                    instance = instances[round_number % len(instances)]
+                    change_instance(instance, fields, round_number)
+                    instance.save()
+            timings.append((time.perf_counter() - start) / batch)
+        return timings
+
+    # warm up caches and connections before timing anything
+    run_batches(1)
+    timings = run_batches(scenario['saves'] // batch, offset=batch)
+
+    counted_rounds = max(1, min(scenario['saves'], 100) // batch)
+    with CaptureQueriesContext(connection) as queries:
+        run_batches(counted_rounds, offset=batch + scenario['saves'])
+    COALESCER.flush()
+
+    return {
+        'latency_mean_ms': statistics.mean(timings) * 1000,
+        'latency_p50_ms': get_percentile(timings, 50) * 1000,
+        'latency_p95_ms': get_percentile(timings, 95) * 1000,
+        'queries_per_save': len(queries) / float(counted_rounds * batch),
+        'log_rows': TableChangesLog.objects.count(),
+        'bytes_per_log_row': get_bytes_per_log(connection, TableChangesLog),
+        'admin_changelist_ms': time_admin_changelist(
+            scenario['admin_repeat']) * 1000,
+    }
+
+
+def run_child():
+    """Runs the scenario of BENCHMARK_SCENARIO on a fresh test database."""
+    os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'benchmarks.settings')
+
+    import django
+    django.setup()
+
+    from django.db import connection
+    from django.test.utils import (
+        setup_test_environment, teardown_test_environment
+    )
+
+    scenario = json.loads(os.environ['BENCHMARK_SCENARIO'])
+    setup_test_environment()
+    old_name = connection.creation.create_test_db(verbosity=0)
+    try:
+        result = measure(scenario)
+    finally:
+        connection.creation.destroy_test_db(old_name, verbosity=0)
+        teardown_test_environment()
+    sys.stdout.write(json.dumps(result) + '\n')
+
+
+def run_scenario(scenario):
+    env = dict(os.environ, BENCHMARK_SCENARIO=json.dumps(scenario),
+               DJANGO_SETTINGS_MODULE='benchmarks.settings')
+    process = subprocess.run(
+        [sys.executable, '-m', 'benchmarks.run', '--child'], env=env,
+        stdout=subprocess.PIPE, stderr=subprocess.PIPE,
+        universal_newlines=True)
+    if process.returncode != 0:
+        return {'error': (process.stderr.strip().splitlines() or [''])[-1]}
+    return json.loads(process.stdout.strip().splitlines()[-1])
+
+
+def get_revision():
+    """Git revision of the code being measured, to compare versions."""
+    try:
+        return subprocess.check_output(
+            ['git', 'rev-parse', '--short', 'HEAD'], stderr=subprocess.DEVNULL,
+            universal_newlines=True).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--child', action='store_true',
+                        help=argparse.SUPPRESS)
+    parser.add_argument('--modes', nargs='+', default=list(MODES),
+                        choices=list(MODES))
+    parser.add_argument('--models', nargs='+', default=list(MODELS),
+                        choices=list(MODELS))
+    parser.add_argument('--instances', type=int, default=100,
+                        help='Number of instances saved in turn')
+    parser.add_argument('--saves', type=int, default=1000,
+                        help='Number of timed saves per scenario')
+    parser.add_argument('--batch', type=int, default=10,
+                        help='Number of saves per transaction')
+    parser.add_argument('--admin-repeat', type=int, default=5,
+                        help='Number of admin changelist renders')
+    parser.add_argument('--output', help='File to write the results to, '
+                                         'defaults to stdout')
+    args = parser.parse_args(argv)
+
+    if args.child:
+        return run_child()
+
+    import django
+
+    results = []
+    for model in args.models:
+        for mode in args.modes:
+            scenario = {
+                'model': model, 'mode': mode, 'instances': args.instances,
+                'saves': args.saves, 'batch': args.batch,
+                'admin_repeat': args.admin_repeat,
+            }
+            result = run_scenario(scenario)
+            sys.stderr.write('{} {}: {}\n'.format(model, mode, result))
+            results.append(dict(scenario, **result))
+
+    report = json.dumps({
+        'revision': get_revision(),
+        'python': platform.python_version(),
+        'django': django.get_version(),
+        'database': os.environ.get('BENCHMARK_DATABASE', 'postgresql'),
+        'results': results,
+    }, indent=2)
+    if args.output:
+        with open(args.output, 'w') as output:
+            output.write(report + '\n')
+    else:
+        sys.stdout.write(report + '\n')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,46 @@
+from collections import OrderedDict
+
+# tracked fields and properties of the models in benchmarks.app.models
+NARROW_FIELDS = ['name', 'counter', 'speed', 'active']
+NARROW_PROPERTIES = ['label']
+
+WIDE_FIELDS = ['field_{:02d}'.format(index) for index in range(20)]
+WIDE_PROPERTIES = ['property_{}'.format(index) for index in range(5)]
+
+MODELS = OrderedDict([
+    ('narrow', {
+        'path': 'benchmarks.app.models.NarrowModel',
+        'fields': NARROW_FIELDS + NARROW_PROPERTIES,
+    }),
+    ('wide', {
+        'path': 'benchmarks.app.models.WideModel',
+        'fields': WIDE_FIELDS + WIDE_PROPERTIES,
+    }),
+])
+
+CALLBACK = 'benchmarks.app.callbacks.noop'
+
+# global config keys and per-model config keys of each mode
+MODES = OrderedDict([
+    ('off', ({'TABLE_CHANGE_LOG_ENABLED': False}, {})),
+    ('on', ({}, {})),
+    ('track_loaded_state', ({'TRACK_LOADED_STATE': True}, {})),
+    ('buffer_writes', ({'BUFFER_WRITES': True}, {})),
+    ('callback_sync', ({'CALLBACK_MODE': 'sync'}, {'callback': CALLBACK})),
+    ('callback_thread', ({'CALLBACK_MODE': 'thread'},
+                         {'callback': CALLBACK})),
+    ('callback_queue', ({'CALLBACK_MODE': 'queue'}, {'callback': CALLBACK})),
+    ('coalesce', ({}, {'coalesce_seconds': 60})),
+])
+
+
+def build_table_change_log_config(mode, model):
+    global_options, model_options = MODES[mode]
+    model_config = dict(fields=MODELS[model]['fields'], **model_options)
+    config = {
+        'LOGGABLE_APPS': {
+            'bench': {MODELS[model]['path']: model_config},
+        },
+    }
+    config.update(global_options)
+    return config
@@ -0,0 +1,58 @@
+import json
+import os
+
+from benchmarks.scenarios import build_table_change_log_config
+
+# set by the runner for each scenario it runs in a child process
+SCENARIO = json.loads(os.environ.get('BENCHMARK_SCENARIO') or
+                      '{"mode": "off", "model": "narrow"}')
+
+SECRET_KEY = 'benchmarks'
+DEBUG = False
+USE_TZ = True
+ROOT_URLCONF = 'benchmarks.urls'
+ALLOWED_HOSTS = ['*']
+
+INSTALLED_APPS = (
+    'django.contrib.admin',
+    'django.contrib.auth',
+    'django.contrib.contenttypes',
+    'django.contrib.messages',
+    'django.contrib.sessions',
+    'tablechangelogger',
+    'benchmarks.app.apps.BenchConfig',
+)
+
+TEMPLATES = [{
+    'BACKEND': 'django.template.backends.django.DjangoTemplates',
+    'APP_DIRS': True,
+    'OPTIONS': {
+        'context_processors': [
+            'django.template.context_processors.request',
+            'django.contrib.auth.context_processors.auth',
+            'django.contrib.messages.context_processors.messages',
+        ],
+    },
+}]
+
+if os.environ.get('BENCHMARK_DATABASE') == 'sqlite':
+    DATABASES = {
+        'default': {
+            'ENGINE': 'django.db.backends.sqlite3',
+            'NAME': 'benchmarks.sqlite3',
+        }
+    }
+else:
+    DATABASES = {
+        'default': {
+            'ENGINE': 'django.db.backends.postgresql',
+            'NAME': os.environ.get('BENCHMARK_DB_NAME', 'benchmarks'),
+            'HOST': os.environ.get('BENCHMARK_DB_HOST', 'localhost'),
+            'PORT': os.environ.get('BENCHMARK_DB_PORT', '5432'),
+            'USER': os.environ.get('BENCHMARK_DB_USER', 'postgres'),
+            'PASSWORD': os.environ.get('BENCHMARK_DB_PASSWORD', ''),
+        }
+    }
+
+TABLE_CHANGE_LOG_CONFIG = build_table_change_log_config(
+    SCENARIO['mode'], SCENARIO['model'])
@@ -11,7 +11,7 @@ setuptools.setup(
     author_email="tech@voltlines.com",
     description="""A python package which logs each change made to a Django model instance""",
     url="https://github.com/voltlines/django-table-change-logger",
-    packages=setuptools.find_packages(),
+    packages=setuptools.find_packages(exclude=['benchmarks', 'benchmarks.*']),
     license='MIT',
     classifiers=[
         "Programming Language :: Python :: 3",
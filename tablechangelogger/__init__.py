@@ -1,2 +1,4 @@
 VERSION = (0, 0, 1)
 __version__ = '.'.join(map(str, VERSION))
+
+default_app_config = 'tablechangelogger.apps.TableChangeLoggerConfig'
@@ -1,13 +1,75 @@
 import json
+from collections import defaultdict
 
 from django.apps import apps
 from django.contrib import admin
+from django.contrib.admin.views.main import ChangeList
+from django.core.paginator import Paginator
+from django.db import connections
+from django.utils.functional import cached_property
 from django.utils.html import format_html
 
 from tablechangelogger.models import TableChangesLog
 from tablechangelogger.log_table_change import (
     get_notifiable_table_change_fields, get_old_changes)
 
+# log attribute holding the logged instance fetched for its changelist page
+RELATED_INSTANCE_ATTR = '_tcl_related_instance'
+
+
+def prefetch_related_instances(tcls):
+    """
+    Fetches the logged instances of TableChangesLog records with one query
+    per model and attaches each to its records.
+    """
+
+    instance_ids = defaultdict(set)
+    for tcl in tcls:
+        instance_ids[(tcl.app_label, tcl.table_name)].add(tcl.instance_id)
+
+    instances = {}
+    for (app_label, table_name), ids in instance_ids.items():
+        try:
+            Model = apps.get_model(app_label, table_name)
+        except LookupError:
+            continue
+        for pk, instance in Model._default_manager.in_bulk(ids).items():
+            instances[(app_label, table_name, pk)] = instance
+
+    for tcl in tcls:
+        key = (tcl.app_label, tcl.table_name, tcl.instance_id)
+        setattr(tcl, RELATED_INSTANCE_ATTR, instances.get(key))
+
+
+class EstimatedCountPaginator(Paginator):
+    """
+    Counts unfiltered PostgreSQL tables from the planner statistics instead
+    of running a COUNT(*) over every row.
+    """
+
+    @cached_property
+    def count(self):
+        queryset = self.object_list
+        connection = connections[queryset.db]
+
+        if connection.vendor == 'postgresql' and not queryset.query.where:
+            with connection.cursor() as cursor:
+                cursor.execute(
+                    'SELECT reltuples FROM pg_class WHERE relname = %s',
+                    [queryset.model._meta.db_table])
+                row = cursor.fetchone()
+            # tables never analyzed have no estimate
+            if row and row[0] > 0:
+                return int(row[0])
+
+        return super().count
+
+
+class TableChangesLogChangeList(ChangeList):
+    def get_results(self, request):
+        super().get_results(request)
+        prefetch_related_instances(self.result_list)
+
 
 class TableChangesLogAdmin(admin.ModelAdmin):
     exclude = ('log', )
@@ -16,8 +78,14 @@ class TableChangesLogAdmin(admin.ModelAdmin):
                     'get_notifiable_fields', 'is_notified', 'details',
                     'created_at')
     list_filter = ('app_label', 'table_name', 'is_notified', )
+    list_select_related = ('previous', )
     search_fields = ('instance_id', 'table_name', 'field_name', 'app_label')
     ordering = ('-created_at', )
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
+
+    def get_changelist(self, request, **kwargs):
+        return TableChangesLogChangeList
 
     def get_previous_log_link(self, obj):
         if obj.previous_log:
@@ -42,7 +110,8 @@ class TableChangesLogAdmin(admin.ModelAdmin):
             'table_name': obj.table_name,
             'app_label': obj.app_label,
             'instance_id': obj.instance_id,
-            'log': obj.log
+            'log': obj.log,
+            'previous_log': obj.previous_log
         }
         changes_dict = get_old_changes(**kwargs)
         return changes_dict
@@ -54,13 +123,20 @@ class TableChangesLogAdmin(admin.ModelAdmin):
             return ''
 
     def get_related_obj(self, obj):
-        Model = apps.get_model(obj.app_label, obj.table_name)
-        instance = Model.objects.get(pk=obj.instance_id)
-        return (
-            '<a href="/admin/%s/%s/%s/change/">%s</a>' % (
-                obj.app_label, obj.table_name.lower(), obj.instance_id,
-                instance.__str__()
-            ))
+        if hasattr(obj, RELATED_INSTANCE_ATTR):
+            instance = getattr(obj, RELATED_INSTANCE_ATTR)
+        else:
+            Model = apps.get_model(obj.app_label, obj.table_name)
+            instance = Model.objects.filter(pk=obj.instance_id).first()
+
+        if instance is None:
+            return obj.instance_id
+
+        return format_html(
+            '<a href="/admin/{0}/{1}/{2}/change/">{3}</a>',
+            obj.app_label, obj.table_name.lower(), obj.instance_id,
+            instance.__str__()
+        )
 
     def get_readonly_fields(self, request, obj=None):
         return [f for f in self.list_display]
@@ -3,3 +3,13 @@ from django.apps import AppConfig
 
 class TableChangeLoggerConfig(AppConfig):
     name = 'tablechangelogger'
+
+    def ready(self):
+        from tablechangelogger.registry import compile_logging_plans
+        from tablechangelogger.signals import (
+            connect_loaded_state_receivers, connect_pre_save_receivers)
+        from tablechangelogger.stats import configure_stats_sink
+        configure_stats_sink()
+        plans = compile_logging_plans()
+        connect_pre_save_receivers(plans)
+        connect_loaded_state_receivers(plans)
@@ -0,0 +1,110 @@
+import gzip
+import json
+import os
+
+from tablechangelogger.codec import encode_value
+
+
+def serialize_table_change_log(tcl):
+    """A JSON-safe dict of a TableChangesLog record, with its log decoded."""
+    changes = {}
+    created = None
+    if tcl.log is not None:
+        created = tcl.log.created
+        for name in tcl.log.get_field_names():
+            changes[name] = {
+                'new': encode_value(tcl.log.get_field_new_value(name)),
+                'old': encode_value(tcl.log.get_field_old_value(name)),
+            }
+
+    return {
+        'id': tcl.id,
+        'app_label': tcl.app_label,
+        'table_name': tcl.table_name,
+        'instance_id': tcl.instance_id,
+        'field_name': tcl.field_name,
+        'created_at': tcl.created_at.isoformat(),
+        'unique_id': tcl.unique_id,
+        'property_unique_ids': tcl.property_unique_ids,
+        'is_notified': tcl.is_notified,
+        'details': encode_value(tcl.details),
+        'previous_id': tcl.previous_id,
+        'seq': tcl.seq,
+        'created': created,
+        'changes': changes,
+    }
+
+
+class ArchiveWriter(object):
+    """
+    Writes records to gzipped NDJSON files of at most max_rows lines. A file
+    is written under a temporary name and renamed once it is complete, so
+    an interrupted run never leaves a file that looks finished.
+    """
+
+    def __init__(self, directory, prefix, max_rows, on_rotate=None):
+        self.directory = directory
+        self.prefix = prefix
+        self.max_rows = max_rows
+        # called with the path, first id and last id of each finished file
+        self.on_rotate = on_rotate
+        self.file = None
+        self.path = None
+        self.rows = 0
+        self.first_id = self.last_id = None
+
+    def open(self, first_id):
+        self.path = os.path.join(self.directory, '{}-{:012d}.ndjson.gz'.format(
+            self.prefix, first_id))
+        self.file = gzip.open(self.path + '.part', 'wt', encoding='utf-8')
+        self.rows = 0
+        self.first_id = first_id
+
+    def write(self, record):
+        if self.file is None:
+            self.open(record['id'])
+        self.file.write(json.dumps(record, sort_keys=True))
+        self.file.write('\n')
+        self.rows += 1
+        self.last_id = record['id']
+        if self.rows >= self.max_rows:
+            self.close()
+
+    def close(self):
+        if self.file is None:
+            return
+        self.file.close()
+        os.replace(self.path + '.part', self.path)
+        self.file = None
+        if self.on_rotate is not None:
+            self.on_rotate(self.path, self.first_id, self.last_id)
+
+
+def get_checkpoint_name(prefix, since=None, until=None):
+    """
+    Name of the checkpoint file of an export, set apart by its filters so
+    exports of different logs do not resume from each other's progress
+    """
+    parts = [prefix]
+    for label, value in (('since', since), ('until', until)):
+        if value is not None:
+            parts.append('{}-{}'.format(
+                label, value.strftime('%Y%m%dT%H%M%S%z')))
+    return '{}.checkpoint.json'.format('-'.join(parts))
+
+
+def read_checkpoint(path):
+    """Last archived id stored in the checkpoint file, 0 without one."""
+    try:
+        with open(path) as checkpoint:
+            return json.load(checkpoint)['last_id']
+    except FileNotFoundError:
+        return 0
+
+
+def write_checkpoint(path, last_id):
+    with open(path + '.tmp', 'w') as checkpoint:
+        json.dump({'last_id': last_id}, checkpoint)
+        checkpoint.flush()
+        os.fsync(checkpoint.fileno())
+    os.replace(path + '.tmp', path)
@@ -0,0 +1,114 @@
+from collections import deque
+
+import django
+from django.apps import apps
+from django.db import transaction
+
+from tablechangelogger.log_table_change import (
+    build_baseline_table_change_log, deduplicate_table_change_logs,
+    get_log_database, get_log_key, get_table_change_log_heads,
+    save_table_change_logs, send_table_change_log_signals
+)
+from tablechangelogger.registry import LOGGING_PLANS
+
+
+def get_chunks(first_pk, last_pk, chunk_size):
+    """Primary key ranges covering first_pk to last_pk, ends excluded"""
+    if first_pk is None:
+        return []
+    return [(start, min(start + chunk_size, last_pk + 1))
+            for start in range(first_pk, last_pk + 1, chunk_size)]
+
+
+class ChunkProgress(object):
+    """
+    Tracks chunks finishing in any order. Everything before the first
+    unfinished chunk is done, that is where a later run resumes.
+    """
+
+    def __init__(self, chunks):
+        self.pending = deque(start for start, _ in chunks)
+        self.ends = dict(chunks)
+        self.finished = set()
+
+    def finish(self, start):
+        """
+        Marks the chunk starting at start finished. Returns the primary key
+        up to which everything is done if that moved, else None.
+        """
+        self.finished.add(start)
+        done = None
+        while self.pending and self.pending[0] in self.finished:
+            done = self.ends[self.pending.popleft()]
+        return done
+
+
+def number_table_change_logs(tcls, heads):
+    """
+    Numbers the logs of instances oldest first, points each to the previous
+    one and the head of its instance to the latest one. Returns the logs
+    and the heads that changed.
+
+    Arguments:
+        tcls: <iterable> TableChangesLog records, oldest first
+        heads: <dict> TableChangeLogHead records by instance key
+    """
+    changed_tcls = []
+    latest_logs = {}
+    for tcl in tcls:
+        key = get_log_key(tcl)
+        previous_log = latest_logs.get(key)
+        seq = previous_log.seq + 1 if previous_log else 1
+        previous_id = previous_log.id if previous_log else None
+
+        if tcl.seq != seq or tcl.previous_id != previous_id:
+            tcl.seq = seq
+            tcl.previous_id = previous_id
+            changed_tcls.append(tcl)
+        latest_logs[key] = tcl
+
+    # new logs of the instance are numbered after the head
+    changed_heads = []
+    for key, tcl in latest_logs.items():
+        head = heads.get(key)
+        if head is not None and (head.seq != tcl.seq or
+                                 head.last_log_id != tcl.id):
+            head.seq = tcl.seq
+            head.last_log_id = tcl.id
+            changed_heads.append(head)
+    return changed_tcls, changed_heads
+
+
+def setup_worker():
+    """Sets Django up in workers that were spawned rather than forked"""
+    if not apps.ready:
+        django.setup()
+
+
+def backfill_chunk(app_label, model_name, start, end):
+    """
+    Writes the baseline logs of the instances of a model whose primary key
+    is in [start, end) and that have no log yet. Returns the number of
+    instances read and of logs written.
+    """
+    model = apps.get_model(app_label, model_name)
+    plan = LOGGING_PLANS[model]
+
+    instances = list(model._base_manager.filter(
+        pk__gte=start, pk__lt=end).order_by('pk'))
+    tcls = [tcl for tcl in (build_baseline_table_change_log(instance, plan)
+                            for instance in instances) if tcl is not None]
+    if not tcls:
+        return len(instances), 0
+
+    using = get_log_database()
+    with transaction.atomic(using=using):
+        # the heads tell which instances already have a log
+        heads = get_table_change_log_heads(set(map(get_log_key, tcls)))
+        tcls = [tcl for tcl in tcls
+                if heads[get_log_key(tcl)].last_log_id is None]
+
+        tcls = deduplicate_table_change_logs(tcls, heads)
+        created_tcls = save_table_change_logs(tcls, heads.values())
+    send_table_change_log_signals(created_tcls, using)
+    return len(instances), len(created_tcls)
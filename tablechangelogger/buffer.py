@@ -0,0 +1,108 @@
+import logging
+import threading
+
+from django.db import router, transaction
+
+logger = logging.getLogger(__name__)
+
+_local = threading.local()
+
+
+class PendingLogs(list):
+    """
+    Unsaved TableChangesLog records buffered in a row under the same
+    savepoints of a transaction. Registered as an on_commit hook, so Django
+    drops it along with its records if one of those savepoints or the
+    transaction rolls back.
+    """
+
+    def __init__(self, runs, savepoint_ids):
+        super().__init__()
+        # every PendingLogs of the transaction, in the order of their records
+        self.runs = runs
+        self.savepoint_ids = savepoint_ids
+        self.committed = False
+
+    def __call__(self):
+        from tablechangelogger.log_table_change import write_table_change_logs
+
+        self.committed = True
+        index = next(index for index, run in enumerate(self.runs)
+                     if run is self)
+        # a later run under none but these savepoints commits as well, it
+        # writes the records of this one along with its own
+        if any(run.savepoint_ids <= self.savepoint_ids
+               for run in self.runs[index + 1:]):
+            return
+
+        # runs before this one that did not commit were rolled back
+        tcls = [tcl for run in self.runs[:index + 1] if run.committed
+                for tcl in run]
+        del self.runs[:index + 1]
+        try:
+            write_table_change_logs(tcls)
+        except Exception as e:
+            logger.exception(e)
+
+
+class TransactionBuffer(object):
+    """
+    Buffers the records of the running transaction of a database connection
+    in order, and writes them at once when it commits. Records of a
+    savepoint that rolls back are left out.
+    """
+
+    def __init__(self, using):
+        self.using = using
+        self.hooks = None
+        self.runs = []
+
+    def prune(self, connection):
+        """Forgets the runs Django discarded on rollback"""
+
+        scheduled = set(id(hook[1]) for hook in connection.run_on_commit)
+        runs = [run for run in self.runs if id(run) in scheduled]
+        if runs:
+            self.runs[:] = runs
+        else:
+            # runs of a committed transaction may still be running
+            self.runs = []
+        self.hooks = connection.run_on_commit
+
+    def get_pending_logs(self):
+        connection = transaction.get_connection(self.using)
+
+        # Django replaces the list of hooks when it discards some of them,
+        # until then every hook registered here is still scheduled
+        if connection.run_on_commit is not self.hooks:
+            self.prune(connection)
+
+        savepoint_ids = set(connection.savepoint_ids)
+        if not self.runs or self.runs[-1].savepoint_ids != savepoint_ids:
+            pending_logs = PendingLogs(self.runs, savepoint_ids)
+            transaction.on_commit(pending_logs, using=self.using)
+            self.runs.append(pending_logs)
+            self.hooks = connection.run_on_commit
+
+        return self.runs[-1]
+
+
+def get_pending_logs(using=None):
+    """
+    Returns the buffer collecting TableChangesLog records for the running
+    transaction of the database alias using, the log database by default,
+    or None when there is no transaction to wait for.
+    """
+    from tablechangelogger.models import TableChangesLog
+
+    using = using or router.db_for_write(TableChangesLog)
+    if not transaction.get_connection(using).in_atomic_block:
+        return None
+
+    buffers = getattr(_local, 'buffers', None)
+    if buffers is None:
+        buffers = _local.buffers = {}
+    if using not in buffers:
+        buffers[using] = TransactionBuffer(using)
+
+    return buffers[using].get_pending_logs()
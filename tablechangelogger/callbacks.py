@@ -0,0 +1,199 @@
+import asyncio
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+
+from django.db import close_old_connections, router, transaction
+
+from tablechangelogger import stats
+from tablechangelogger.config import CALLBACK_MODE, CALLBACK_THREADS
+from tablechangelogger.log_table_change import (
+    ASYNC_CALLBACK_ATTR, get_log_key, get_notifiable_table_change_fields)
+from tablechangelogger.registry import get_log_plan
+
+logger = logging.getLogger(__name__)
+
+
+class OrderedExecutor(object):
+    """
+    Runs tasks on a bounded number of threads. Tasks sharing a key always
+    run on the same thread, one after another, in the order submitted.
+    """
+
+    def __init__(self, max_workers):
+        self.executors = [ThreadPoolExecutor(max_workers=1)
+                          for _ in range(max_workers)]
+
+    def submit(self, key, func, *args, **kwargs):
+        executor = self.executors[hash(key) % len(self.executors)]
+        return executor.submit(func, *args, **kwargs)
+
+    def shutdown(self, wait=True):
+        for executor in self.executors:
+            executor.shutdown(wait=wait)
+
+
+_executor = None
+
+
+def get_executor():
+    global _executor
+    if _executor is None:
+        _executor = OrderedExecutor(CALLBACK_THREADS)
+    return _executor
+
+
+def get_callback_fields(tcl):
+    """
+    Returns the fields a callback is notified of, none when there is no
+    previous log to compare against
+    """
+
+    notifiable_fields = get_notifiable_table_change_fields(tcl)
+    if notifiable_fields and tcl.previous_log:
+        return notifiable_fields
+    return set()
+
+
+def run_table_change_log_callback(tcl, callback):
+    """
+    Calls the callback of a TableChangesLog if there are notifiable fields
+    and there is a previous log
+    """
+
+    with stats.timer('callback', tcl.app_label, tcl.table_name):
+        notifiable_fields = get_callback_fields(tcl)
+        if notifiable_fields:
+            callback(tcl, notifiable_fields)
+
+
+async def aload_previous_log(tcl):
+    """
+    Loads the previous log of a TableChangesLog with the async ORM, so
+    reading its previous_log does not query
+    """
+    from asgiref.sync import sync_to_async
+
+    if tcl.previous_id is not None:
+        previous_log = await type(tcl).objects.using(
+            tcl._state.db).filter(pk=tcl.previous_id).afirst()
+        type(tcl).previous.field.set_cached_value(tcl, previous_log)
+    elif tcl.seq is None:
+        # logs written before pointers existed search the history
+        await sync_to_async(lambda: tcl.previous_log)()
+
+
+async def arun_table_change_log_callback(tcl, callback):
+    """
+    Async version of run_table_change_log_callback. Coroutine callbacks are
+    awaited, others run through sync_to_async.
+    """
+    from asgiref.sync import sync_to_async
+
+    with stats.timer('callback', tcl.app_label, tcl.table_name):
+        await aload_previous_log(tcl)
+        notifiable_fields = get_callback_fields(tcl)
+        if not notifiable_fields:
+            return
+        if asyncio.iscoroutinefunction(callback):
+            await callback(tcl, notifiable_fields)
+        else:
+            await sync_to_async(callback)(tcl, notifiable_fields)
+
+
+# the latest callback task of each instance, the next one waits for it
+_tasks = {}
+
+
+async def run_after(previous_task, tcl, callback):
+    if previous_task is not None:
+        await asyncio.wait([previous_task])
+    try:
+        await arun_table_change_log_callback(tcl, callback)
+    except Exception as e:
+        logger.exception(e)
+
+
+def schedule_table_change_log_callback(tcl, callback):
+    """
+    Runs the callback of a TableChangesLog as a task of the running event
+    loop. Callbacks of the same instance run in the order scheduled.
+    """
+
+    key = get_log_key(tcl)
+    previous_task = _tasks.get(key)
+    if previous_task is not None and (
+            previous_task.done() or
+            previous_task.get_loop() is not asyncio.get_running_loop()):
+        previous_task = None
+
+    task = asyncio.ensure_future(run_after(previous_task, tcl, callback))
+    _tasks[key] = task
+    task.add_done_callback(
+        lambda done: _tasks.pop(key) if _tasks.get(key) is done else None)
+    return task
+
+
+def run_in_thread(tcl, callback):
+    close_old_connections()
+    try:
+        run_table_change_log_callback(tcl, callback)
+    except Exception as e:
+        logger.exception(e)
+    finally:
+        close_old_connections()
+
+
+def enqueue_table_change_log_callback(tcl):
+    from tablechangelogger.models import TableChangeLogCallback
+
+    TableChangeLogCallback.objects.create(
+        log=tcl, app_label=tcl.app_label, table_name=tcl.table_name,
+        instance_id=tcl.instance_id)
+
+
+def dispatch_table_change_log_callback(tcl):
+    """
+    Runs the callback of a TableChangesLog according to CALLBACK_MODE:
+    right away, on a thread once the log is committed, or through the
+    callback queue drained by run_table_change_log_callbacks.
+    """
+
+    # written by the async path, which dispatches it itself
+    if tcl.log.created or getattr(tcl, ASYNC_CALLBACK_ATTR, False):
+        return
+
+    plan = get_log_plan(tcl)
+    if plan is None or plan.callback is None:
+        return
+
+    if CALLBACK_MODE == 'thread':
+        submit = partial(get_executor().submit, get_log_key(tcl),
+                         run_in_thread, tcl, plan.callback)
+        transaction.on_commit(submit, using=router.db_for_write(type(tcl)))
+    elif CALLBACK_MODE == 'queue':
+        enqueue_table_change_log_callback(tcl)
+    else:
+        run_table_change_log_callback(tcl, plan.callback)
+
+
+async def adispatch_table_change_log_callback(tcl):
+    """
+    Async version of dispatch_table_change_log_callback. Callbacks are
+    scheduled as tasks, or queued with the async ORM in the 'queue' mode.
+    """
+    from tablechangelogger.models import TableChangeLogCallback
+
+    if tcl.log.created:
+        return
+
+    plan = get_log_plan(tcl)
+    if plan is None or plan.callback is None:
+        return
+
+    if CALLBACK_MODE == 'queue':
+        await TableChangeLogCallback.objects.acreate(
+            log=tcl, app_label=tcl.app_label, table_name=tcl.table_name,
+            instance_id=tcl.instance_id)
+    else:
+        schedule_table_change_log_callback(tcl, plan.callback)
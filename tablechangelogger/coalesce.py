@@ -0,0 +1,158 @@
+import atexit
+import logging
+import threading
+import time
+
+from django.db import close_old_connections, transaction
+
+from tablechangelogger.datastructures import Change
+
+logger = logging.getLogger(__name__)
+
+
+class CoalescedLog(object):
+    """
+    Changes of an instance collected during a coalescing window. Keeps the
+    first old value and the last new value of every field.
+    """
+
+    def __init__(self, plan, instance_id, field_names, log,
+                 loggable_properties, deadline):
+        self.plan = plan
+        self.instance_id = instance_id
+        self.field_names = list(field_names)
+        self.log = log
+        self.loggable_properties = list(loggable_properties)
+        self.deadline = deadline
+
+    def merge(self, field_names, log, loggable_properties):
+        for name in field_names:
+            change = log.changes[name]
+            if name in self.log.changes:
+                first = self.log.changes[name]
+                self.log.changes[name] = Change(
+                    new_value=change.new_value, old_value=first.old_value)
+            else:
+                self.log.changes[name] = change
+                self.field_names.append(name)
+        for name in loggable_properties:
+            if name not in self.loggable_properties:
+                self.loggable_properties.append(name)
+
+    def drop_reverted_changes(self):
+        """
+        Drops fields changed back to their first value in the window and
+        returns the field names that are left.
+        """
+        field_names = []
+        for name in self.field_names:
+            change = self.log.changes[name]
+            if name in self.loggable_properties or \
+                    change.new_value != change.old_value:
+                field_names.append(name)
+            else:
+                del self.log.changes[name]
+        return field_names
+
+
+class Coalescer(object):
+    """
+    Holds logs in memory until the coalescing window of their instance
+    ends, then writes a single log per instance from a background thread.
+    """
+
+    def __init__(self):
+        self.pending = {}
+        self.lock = threading.Lock()
+        self.wakeup = threading.Event()
+        self.thread = None
+
+    def add(self, plan, instance_id, field_names, log, loggable_properties):
+        key = (plan.app_label, plan.table_name, str(instance_id))
+        with self.lock:
+            entry = self.pending.get(key)
+            if entry is None:
+                self.pending[key] = CoalescedLog(
+                    plan, instance_id, field_names, log, loggable_properties,
+                    time.monotonic() + plan.coalesce_seconds)
+            else:
+                entry.merge(field_names, log, loggable_properties)
+            self.start()
+        self.wakeup.set()
+
+    def start(self):
+        if self.thread is None or not self.thread.is_alive():
+            self.thread = threading.Thread(
+                target=self.run, name='tablechangelogger-coalescer')
+            self.thread.daemon = True
+            self.thread.start()
+
+    def pop_expired(self, now=None):
+        now = time.monotonic() if now is None else now
+        with self.lock:
+            keys = [key for key, entry in self.pending.items()
+                    if entry.deadline <= now]
+            return [self.pending.pop(key) for key in keys]
+
+    def get_timeout(self):
+        with self.lock:
+            if not self.pending:
+                return None
+            deadline = min(entry.deadline for entry in self.pending.values())
+        return max(deadline - time.monotonic(), 0)
+
+    def run(self):
+        while True:
+            self.wakeup.wait(self.get_timeout())
+            self.wakeup.clear()
+            entries = self.pop_expired()
+            if entries:
+                close_old_connections()
+                try:
+                    self.write(entries)
+                finally:
+                    close_old_connections()
+
+    def flush(self):
+        """Writes every pending log, whether its window has ended or not."""
+        with self.lock:
+            entries = list(self.pending.values())
+            self.pending.clear()
+        self.write(entries)
+
+    def write(self, entries):
+        from tablechangelogger.log_table_change import (
+            create_table_change_log_record
+        )
+
+        for entry in entries:
+            field_names = entry.drop_reverted_changes()
+            if len(field_names) == len(entry.loggable_properties):
+                continue
+            try:
+                create_table_change_log_record(
+                    entry.plan.app_label,
+                    entry.plan.table_name,
+                    entry.instance_id,
+                    ','.join(field_names),
+                    entry.log,
+                    entry.loggable_properties
+                )
+            except Exception as e:
+                logger.exception(e)
+
+
+COALESCER = Coalescer()
+
+atexit.register(COALESCER.flush)
+
+
+def coalesce_table_change_log(plan, instance_id, field_names, log,
+                              loggable_properties, using=None):
+    """
+    Hands a log to the coalescer once the transaction of the database alias
+    using commits, so changes that are rolled back are never logged.
+    """
+    transaction.on_commit(
+        lambda: COALESCER.add(plan, instance_id, field_names, log,
+                              loggable_properties), using=using)
@@ -0,0 +1,253 @@
+"""
+Encoding of Logged objects stored by LoggedField.
+
+Version 2 logs are stored as ``2~<created>~<changes>`` where created is 1 or
+0 and changes is a compact JSON object mapping each field name to its
+``[new_value, old_value]`` pair. JSON-safe values are stored as they are,
+other values are tagged objects such as ``{"$t": "datetime", "v": "..."}``,
+falling back to pickle for types without a dedicated tag.
+
+Legacy logs are stored as ``<pickled changes as a JSON list of bytes>~True``
+and remain readable.
+"""
+import base64
+import datetime
+import json
+import math
+import pickle
+import uuid
+from decimal import Decimal
+
+from django.db.models import Model
+from django.utils.dateparse import parse_date, parse_datetime, parse_time
+
+from tablechangelogger.datastructures import Change, Logged
+from tablechangelogger.utils import deserialize_field
+
+LOG_VERSION = '2'
+LOG_VERSION_PREFIX = LOG_VERSION + '~'
+LEGACY_LOG_PREFIX = '['
+TAG_KEY = '$t'
+# searchable values are cut to this length so that they fit in an index
+NORMALIZED_VALUE_LENGTH = 255
+
+# tagged types and how to turn them into JSON and back
+VALUE_TAGS = (
+    ('datetime', datetime.datetime, datetime.datetime.isoformat,
+     parse_datetime),
+    ('date', datetime.date, datetime.date.isoformat, parse_date),
+    ('time', datetime.time, datetime.time.isoformat, parse_time),
+    ('decimal', Decimal, str, Decimal),
+    ('uuid', uuid.UUID, str, uuid.UUID),
+)
+
+
+def encode_value(value):
+    """Turns a logged value into a JSON-safe value"""
+
+    if value is None or isinstance(value, (bool, str, int)):
+        return value
+    if isinstance(value, float) and math.isfinite(value):
+        return value
+    if type(value) is list:
+        return [encode_value(item) for item in value]
+    if (type(value) is dict and TAG_KEY not in value and
+            all(isinstance(key, str) for key in value)):
+        return {key: encode_value(item) for key, item in value.items()}
+
+    for tag, value_type, encode, _ in VALUE_TAGS:
+        if type(value) is value_type:
+            return {TAG_KEY: tag, 'v': encode(value)}
+
+    pickled_value = base64.b64encode(pickle.dumps(value)).decode('ascii')
+    return {TAG_KEY: 'pickle', 'v': pickled_value}
+
+
+def decode_value(value):
+    """Turns a value encoded by encode_value back into the logged value"""
+
+    if type(value) is list:
+        return [decode_value(item) for item in value]
+    if type(value) is not dict:
+        return value
+
+    tag = value.get(TAG_KEY)
+    if tag is None:
+        return {key: decode_value(item) for key, item in value.items()}
+    if tag == 'pickle':
+        return pickle.loads(base64.b64decode(value['v']))
+
+    for value_tag, _, _, decode in VALUE_TAGS:
+        if value_tag == tag:
+            return decode(value['v'])
+
+    raise ValueError('Unknown log value tag {}'.format(tag))
+
+
+def normalize_value(value):
+    """
+    A searchable text form of a logged value, the same for equal values.
+    Model instances are represented by their primary key.
+    """
+
+    if value is None:
+        return None
+    if isinstance(value, Model):
+        value = value.pk
+    if isinstance(value, str):
+        text = value
+    elif isinstance(value, bool):
+        text = 'true' if value else 'false'
+    elif isinstance(value, (int, float, Decimal)):
+        text = str(value)
+    else:
+        encoded = encode_value(value)
+        if type(encoded) is dict and encoded.get(TAG_KEY) not in (None,
+                                                                  'pickle'):
+            text = encoded['v']
+        else:
+            text = json.dumps(encoded, sort_keys=True, separators=(',', ':'),
+                              ensure_ascii=False)
+    return text[:NORMALIZED_VALUE_LENGTH]
+
+
+def encode_changes(changes):
+    """Encodes a changes mapping as compact JSON"""
+
+    encoded_changes = {
+        field_name: [encode_value(change.new_value),
+                     encode_value(change.old_value)]
+        for field_name, change in changes.items()
+    }
+    return json.dumps(encoded_changes, separators=(',', ':'),
+                      ensure_ascii=False)
+
+
+def decode_changes(value):
+    """Decodes a changes mapping encoded by encode_changes"""
+
+    return {
+        field_name: Change(new_value=decode_value(new_value),
+                           old_value=decode_value(old_value))
+        for field_name, (new_value, old_value) in json.loads(value).items()
+    }
+
+
+def decode_field_changes(value):
+    """Parses the changes JSON of a version 2 log without decoding values"""
+    return json.loads(value.split('~', 2)[2])
+
+
+def get_field_changes(log):
+    """Returns the changes of a log as parsed, still encoded JSON"""
+
+    if isinstance(log, LazyLogged):
+        return log.get_field_changes()
+    return json.loads(encode_changes(log.changes))
+
+
+def merge_logs(log, new_log):
+    """
+    Returns a log holding the changes of both logs, those of new_log taking
+    precedence. Works on the encoded changes, no value is decoded.
+    """
+
+    field_changes = get_field_changes(log) if log is not None else {}
+    field_changes.update(get_field_changes(new_log))
+    value = '{}{}~{}'.format(
+        LOG_VERSION_PREFIX, int(bool(new_log.created)),
+        json.dumps(field_changes, separators=(',', ':'), ensure_ascii=False))
+    return LazyLogged(value)
+
+
+def encode_log(log):
+    """Encodes a Logged object into the latest log format"""
+
+    return '{}{}~{}'.format(LOG_VERSION_PREFIX, int(bool(log.created)),
+                            encode_changes(log.changes))
+
+
+def is_legacy_log(value):
+    return value.startswith(LEGACY_LOG_PREFIX)
+
+
+def decode_log(value):
+    """Decodes a Logged object stored in any of the log formats"""
+
+    if is_legacy_log(value):
+        changes, created = value.split('~')
+        return Logged(changes=deserialize_field(changes),
+                      created=created == 'True')
+
+    version, created, changes = value.split('~', 2)
+    if version != LOG_VERSION:
+        raise ValueError('Unknown log version {}'.format(version))
+
+    return Logged(changes=decode_changes(changes), created=created == '1')
+
+
+class LazyLogged(Logged):
+    """
+    A Logged object kept in its stored form until it is first used. Reading
+    a single field of a version 2 log decodes only that field's values.
+    """
+
+    def __init__(self, value):
+        self.value = value
+        self._log = None
+        self._field_changes = None
+
+    @property
+    def is_decoded(self):
+        return self._log is not None
+
+    def decode(self):
+        if self._log is None:
+            self._log = decode_log(self.value)
+        return self._log
+
+    @property
+    def changes(self):
+        return self.decode().changes
+
+    @changes.setter
+    def changes(self, changes):
+        self.decode().changes = changes
+
+    @property
+    def created(self):
+        if self._log is None and not is_legacy_log(self.value):
+            return self.value[len(LOG_VERSION_PREFIX)] == '1'
+        return self.decode().created
+
+    @created.setter
+    def created(self, created):
+        self.decode().created = created
+
+    def get_field_changes(self):
+        if self._log is not None or is_legacy_log(self.value):
+            return json.loads(encode_changes(self.decode().changes))
+        if self._field_changes is None:
+            self._field_changes = decode_field_changes(self.value)
+        return dict(self._field_changes)
+
+    def get_field_names(self):
+        if self._log is not None or is_legacy_log(self.value):
+            return super().get_field_names()
+        return list(self.get_field_changes().keys())
+
+    def get_field_value(self, field_name, index):
+        if self._field_changes is None:
+            self._field_changes = decode_field_changes(self.value)
+        field_change = self._field_changes.get(field_name)
+        return decode_value(field_change[index]) if field_change else None
+
+    def get_field_new_value(self, field_name):
+        if self._log is None and not is_legacy_log(self.value):
+            return self.get_field_value(field_name, 0)
+        return super().get_field_new_value(field_name)
+
+    def get_field_old_value(self, field_name):
+        if self._log is None and not is_legacy_log(self.value):
+            return self.get_field_value(field_name, 1)
+        return super().get_field_old_value(field_name)
@@ -13,6 +13,78 @@ else:
     TABLE_CHANGE_LOG_ENABLED = TABLE_CHANGE_LOG_CONFIG.get(
         'TABLE_CHANGE_LOG_ENABLED', True)
 
+# snapshot loggable fields when instances are loaded and diff against that
+# snapshot instead of fetching the instance again before each save
+TRACK_LOADED_STATE = TABLE_CHANGE_LOG_CONFIG.get('TRACK_LOADED_STATE', False)
+
+# hold logs created inside a transaction until it commits and write them at
+# once, logs of rolled back transactions or savepoints are discarded
+BUFFER_WRITES = TABLE_CHANGE_LOG_CONFIG.get('BUFFER_WRITES', False)
+
+# how callbacks run: 'sync' within the save, 'thread' on a pool of
+# CALLBACK_THREADS threads after commit, or 'queue' through a database table
+# drained by the run_table_change_log_callbacks command
+CALLBACK_MODE = TABLE_CHANGE_LOG_CONFIG.get('CALLBACK_MODE', 'sync')
+CALLBACK_THREADS = TABLE_CHANGE_LOG_CONFIG.get('CALLBACK_THREADS', 4)
+
+if CALLBACK_MODE not in ('sync', 'thread', 'queue'):
+    logger.warning('Unknown CALLBACK_MODE {}, running callbacks '
+                   'synchronously'.format(CALLBACK_MODE))
+    CALLBACK_MODE = 'sync'
+
+# number of instances whose latest log content is remembered per process to
+# skip comparing the same change to their head again, 0 disables it
+DEDUP_CACHE_SIZE = TABLE_CHANGE_LOG_CONFIG.get('DEDUP_CACHE_SIZE', 10000)
+
+# logs older than this many days are dropped by the partition and prune
+# commands, None keeps them forever
+RETENTION_DAYS = TABLE_CHANGE_LOG_CONFIG.get('RETENTION_DAYS')
+
+# number of monthly partitions created ahead of the current month when the
+# log table is partitioned
+PARTITION_MONTHS_AHEAD = TABLE_CHANGE_LOG_CONFIG.get(
+    'PARTITION_MONTHS_AHEAD', 3)
+
+# import path of the class receiving the timers and counters of the logging
+# pipeline, built with STATS_SINK_OPTIONS as keyword arguments
+STATS_SINK = TABLE_CHANGE_LOG_CONFIG.get('STATS_SINK')
+STATS_SINK_OPTIONS = TABLE_CHANGE_LOG_CONFIG.get('STATS_SINK_OPTIONS', {})
+
+# a checkpoint of the logged values of an instance is written every this
+# many logs of the instance, 0 disables checkpoints
+CHECKPOINT_INTERVAL = TABLE_CHANGE_LOG_CONFIG.get('CHECKPOINT_INTERVAL', 100)
+
+# write a TableChangeLogField row for each field of each log, so changes of
+# a field or to a value can be looked up by index
+FIELD_ROWS = TABLE_CHANGE_LOG_CONFIG.get('FIELD_ROWS', False)
+
+# database aliases the logs are written to and read from, enforced by
+# tablechangelogger.routers.TableChangeLogRouter, None leaves them to the
+# other routers
+WRITE_DATABASE = TABLE_CHANGE_LOG_CONFIG.get('WRITE_DATABASE')
+READ_DATABASE = TABLE_CHANGE_LOG_CONFIG.get('READ_DATABASE')
+
+# 'inline' writes logs right away, within the transaction open on the log
+# database if any, 'on_commit' holds them until the transaction saving the
+# instance commits
+WRITE_MODE = TABLE_CHANGE_LOG_CONFIG.get('WRITE_MODE', 'inline')
+
+if WRITE_MODE not in ('inline', 'on_commit'):
+    logger.warning('Unknown WRITE_MODE {}, writing logs '
+                   'inline'.format(WRITE_MODE))
+    WRITE_MODE = 'inline'
+
+# directory logs are appended to instead of being written to the database,
+# loaded by the drain_table_change_logs command, None writes them directly
+SPOOL_DIRECTORY = TABLE_CHANGE_LOG_CONFIG.get('SPOOL_DIRECTORY')
+# size from which a spool segment is sealed and a new one started
+SPOOL_SEGMENT_BYTES = TABLE_CHANGE_LOG_CONFIG.get(
+    'SPOOL_SEGMENT_BYTES', 16 * 1024 * 1024)
+# spooled logs are fsynced every this many records or seconds, whichever
+# comes first
+SPOOL_FSYNC_RECORDS = TABLE_CHANGE_LOG_CONFIG.get('SPOOL_FSYNC_RECORDS', 100)
+SPOOL_FSYNC_SECONDS = TABLE_CHANGE_LOG_CONFIG.get('SPOOL_FSYNC_SECONDS', 1)
+
 LOGGABLE_MODELS = []
 
 if TABLE_CHANGE_LOG_ENABLED:
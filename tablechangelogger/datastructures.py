@@ -1,3 +1,4 @@
+import threading
 from collections import OrderedDict
 
 
@@ -20,6 +21,9 @@ class Logged(object):
         values = self.changes.values()
         return '{} -> {}'.format(', '.join(keys), ', '.join(values))
 
+    def get_field_names(self):
+        return list(self.changes.keys())
+
     def get_field_log(self, field_name):
         return self.changes.get(field_name)
 
@@ -37,3 +41,93 @@ class Logged(object):
         for key in sorted_keys:
             ordered_values[key] = self.changes[key].new_value
         return ordered_values
+
+    def get_old_values(self):
+        ordered_values = OrderedDict()
+        sorted_keys = sorted(self.changes.keys())
+        for key in sorted_keys:
+            ordered_values[key] = self.changes[key].old_value
+        return ordered_values
+
+
+class LoggingPlan(object):
+    """
+    Everything needed to log changes of a single model, resolved once from
+    the table change log config.
+    """
+
+    def __init__(self, model, app_label, table_name, config, fields,
+                 properties, callback=None, field_attnames=None,
+                 track_loaded_state=False, coalesce_seconds=0,
+                 min_deltas=None, sample_rates=None, checkpoint_interval=0,
+                 field_rows=False, property_dependencies=None,
+                 comparators=None):
+        self.model = model
+        self.app_label = app_label
+        self.table_name = table_name
+        self.config = config
+        self.fields = fields
+        self.properties = properties
+        self.callback = callback
+        # maps concrete loggable field names, and the concrete fields
+        # properties depend on, to their attribute names
+        self.field_attnames = field_attnames or {}
+        self.track_loaded_state = track_loaded_state
+        # changes of an instance within this many seconds make a single log
+        self.coalesce_seconds = coalesce_seconds
+        # field changes smaller than these are not logged
+        self.min_deltas = min_deltas or {}
+        # share of the changes of these fields that are logged
+        self.sample_rates = sample_rates or {}
+        # logs of an instance between two checkpoints of its logged values
+        self.checkpoint_interval = checkpoint_interval
+        # whether each logged field also gets a TableChangeLogField row
+        self.field_rows = field_rows
+        # maps properties to the fields they are computed from
+        self.property_dependencies = property_dependencies or {}
+        # maps fields to the comparators deciding whether they changed
+        self.comparators = comparators or {}
+
+    def __str__(self):
+        return '{}.{}'.format(self.app_label, self.table_name)
+
+    def get_loggable_properties(self, changed_fields):
+        """
+        Properties to evaluate and log for a change of changed_fields.
+        Properties without declared dependencies are always logged.
+        """
+        return [
+            name for name in self.properties
+            if name not in self.property_dependencies or
+            any(field_name in changed_fields
+                for field_name in self.property_dependencies[name])
+        ]
+
+
+class LRUCache(object):
+    """A thread safe mapping keeping only its most recently used items"""
+
+    def __init__(self, max_size):
+        self.max_size = max_size
+        self.items = OrderedDict()
+        self.lock = threading.Lock()
+
+    def get(self, key, default=None):
+        with self.lock:
+            if key not in self.items:
+                return default
+            self.items.move_to_end(key)
+            return self.items[key]
+
+    def set(self, key, value):
+        if self.max_size <= 0:
+            return
+        with self.lock:
+            self.items[key] = value
+            self.items.move_to_end(key)
+            while len(self.items) > self.max_size:
+                self.items.popitem(last=False)
+
+    def clear(self):
+        with self.lock:
+            self.items.clear()
@@ -0,0 +1,130 @@
+"""
+Diffing of the tracked columns of an instance.
+
+A comparator takes the old and the new value of a field and returns whether
+they are equal. Fields without a comparator are compared with ``==``.
+Comparators are declared per model under the ``comparators`` key, either by
+the name of a registered comparator factory or by an import path, with
+optional keyword arguments for the factory::
+
+    'comparators': {
+        'latest_speed': ('float', {'tolerance': 0.01}),
+        'location': ('geometry', {'tolerance': 0.00001}),
+        'details': 'json',
+    }
+"""
+import json
+import logging
+
+from django.utils.module_loading import import_string
+
+logger = logging.getLogger(__name__)
+
+# comparator factories by name, see register_comparator
+COMPARATORS = {}
+
+
+def register_comparator(name, factory):
+    """
+    Registers a comparator factory under name. The factory is called with
+    the options of a field and returns its comparator.
+    """
+    COMPARATORS[name] = factory
+
+
+def exact(old_value, new_value):
+    return old_value == new_value
+
+
+def float_tolerance(tolerance=1e-9):
+    """Numbers closer to each other than tolerance are equal"""
+
+    def compare(old_value, new_value):
+        if old_value is None or new_value is None:
+            return old_value is new_value
+        return abs(new_value - old_value) <= tolerance
+    return compare
+
+
+def geometry_tolerance(tolerance=0):
+    """
+    Geometries whose vertices are all within tolerance of each other are
+    equal, in the units of their spatial reference
+    """
+
+    def compare(old_value, new_value):
+        if old_value is None or new_value is None:
+            return old_value is new_value
+        if old_value.srid != new_value.srid:
+            return False
+        return old_value.equals_exact(new_value, tolerance)
+    return compare
+
+
+def load_json(value):
+    if isinstance(value, (str, bytes)):
+        try:
+            return json.loads(value)
+        except ValueError:
+            return value
+    return value
+
+
+def json_equal(old_value, new_value):
+    """JSON values, or strings holding JSON, equal regardless of key order"""
+    return load_json(old_value) == load_json(new_value)
+
+
+register_comparator('exact', lambda: exact)
+register_comparator('float', float_tolerance)
+register_comparator('geometry', geometry_tolerance)
+register_comparator('json', lambda: json_equal)
+
+
+def resolve_comparator(spec):
+    """
+    Returns the comparator declared by spec: a registered name or an import
+    path, optionally paired with the keyword arguments of its factory. An
+    import path without options is the comparator itself.
+    """
+    options = None
+    if isinstance(spec, (list, tuple)):
+        spec, options = spec
+
+    if spec in COMPARATORS:
+        return COMPARATORS[spec](**(options or {}))
+
+    comparator = import_string(spec)
+    return comparator(**options) if options is not None else comparator
+
+
+def resolve_comparators(config):
+    """Resolves the comparators of a table config, mapped by field name"""
+
+    comparators = {}
+    for field_name, spec in (config.get('comparators') or {}).items():
+        try:
+            comparators[field_name] = resolve_comparator(spec)
+        except Exception:
+            logger.exception('Could not resolve the comparator of {}'.format(
+                field_name))
+    return comparators
+
+
+def get_changed_fields(old_values, new_values, comparators=None):
+    """
+    Returns the names of the fields whose values differ.
+
+    Arguments:
+        old_values: <dict> Field values before the change, by field name
+        new_values: <dict> Field values after the change, by field name
+        comparators: <dict|optional> Comparators by field name
+    """
+    comparators = comparators or {}
+    changed_fields = []
+    for name, new_value in new_values.items():
+        old_value = old_values.get(name)
+        compare = comparators.get(name, exact)
+        if not compare(old_value, new_value):
+            changed_fields.append(name)
+    return changed_fields
@@ -1,14 +1,10 @@
 from django.db import models
 
-from tablechangelogger.utils import serialize_field, deserialize_field
-from tablechangelogger.datastructures import Logged
+from tablechangelogger.codec import LazyLogged, decode_log, encode_log
 
 
 def parse_log(value):
-    changes, created = value.split('~')
-    changes = deserialize_field(changes)
-    created = True if created == 'True' else False
-    return Logged(changes=changes, created=created)
+    return decode_log(value)
 
 
 class LoggedField(models.CharField):
@@ -19,19 +15,18 @@ class LoggedField(models.CharField):
         return super().deconstruct()
 
     def pre_save(self, model_instance, add):
-        log = model_instance.log
-        changes = log.changes
-        created = log.created
-        value = '{}~{}'.format(serialize_field(changes), created)
-        return value
+        return self.get_prep_value(getattr(model_instance, self.attname))
 
-    def from_db_value(self, value, expression, connection, context):
+    def from_db_value(self, value, expression, connection, *args):
         if value is None:
             return value
-        return parse_log(value)
+        # decoded on first access, rows only filtered or counted never are
+        return LazyLogged(value)
 
     def get_prep_value(self, value):
         if not value or isinstance(value, str):
             return value
-        return '{}~{}'.format(serialize_field(value.changes),
-                              value.created)
+        # logs read but never decoded are written back as they were stored
+        if isinstance(value, LazyLogged) and not value.is_decoded:
+            return value.value
+        return encode_log(value)
@@ -0,0 +1,253 @@
+import base64
+import json
+
+from django.db import connections
+from django.db.models import F, Q
+from django.utils.dateparse import parse_datetime
+
+from tablechangelogger.codec import (
+    LEGACY_LOG_PREFIX, LOG_VERSION_PREFIX, normalize_value
+)
+
+# number of instances whose logs are fetched by a single query
+STATE_CHUNK_SIZE = 500
+# number of logs per page of change history
+HISTORY_PAGE_SIZE = 100
+
+
+def replay_logs(values, logs):
+    """Applies the new values of logs, oldest first, onto values"""
+
+    for log in logs:
+        if log is None:
+            continue
+        for name in log.get_field_names():
+            values[name] = log.get_field_new_value(name)
+    return values
+
+
+def get_latest_checkpoints(app_label, table_name, instance_ids, timestamp):
+    """Latest checkpoint of each instance written by timestamp"""
+    from tablechangelogger.models import TableChangeLogCheckpoint
+
+    checkpoints = TableChangeLogCheckpoint.objects.filter(
+        app_label=app_label, table_name=table_name,
+        instance_id__in=instance_ids, created_at__lte=timestamp
+    ).order_by('instance_id', '-seq')
+    if connections[checkpoints.db].features.can_distinct_on_fields:
+        checkpoints = checkpoints.distinct('instance_id')
+
+    latest_checkpoints = {}
+    for checkpoint in checkpoints:
+        latest_checkpoints.setdefault(checkpoint.instance_id, checkpoint)
+    return latest_checkpoints
+
+
+def get_states_as_of(model, pks, timestamp):
+    """
+    Rebuilds the logged values of instances as they were at timestamp,
+    from the latest checkpoint of each instance and the logs written after
+    it. Fields that were never logged by then are missing.
+
+    Arguments:
+        model: <Model class> A loggable model
+        pks: <iterable> Primary keys of instances of model
+        timestamp: <datetime> The moment to rebuild the values at
+
+    Returns:
+        states: <dict> Logged field values, mapped by pk. Instances without
+        any log by timestamp are missing.
+    """
+    from tablechangelogger.models import TableChangesLog
+
+    app_label, table_name = model._meta.app_label, model.__name__
+    pks = list(pks)
+    states = {}
+
+    for start in range(0, len(pks), STATE_CHUNK_SIZE):
+        chunk = pks[start:start + STATE_CHUNK_SIZE]
+        checkpoints = get_latest_checkpoints(app_label, table_name, chunk,
+                                             timestamp)
+
+        query = Q()
+        for pk in chunk:
+            checkpoint = checkpoints.get(pk)
+            if checkpoint is None:
+                query |= Q(instance_id=pk)
+            else:
+                states[pk] = replay_logs({}, [checkpoint.log])
+                query |= Q(instance_id=pk, seq__gt=checkpoint.seq)
+
+        tcls = TableChangesLog.objects.filter(
+            query, app_label=app_label, table_name=table_name,
+            created_at__lte=timestamp
+        ).order_by(
+            'instance_id', F('seq').asc(nulls_first=True), 'created_at', 'id'
+        ).only('instance_id', 'log')
+        for tcl in tcls.iterator():
+            replay_logs(states.setdefault(tcl.instance_id, {}), [tcl.log])
+
+    return states
+
+
+def get_state_as_of(model, pk, timestamp):
+    """
+    Rebuilds the logged values of an instance as they were at timestamp.
+    Returns None if nothing was logged for the instance by then.
+    """
+    return get_states_as_of(model, [pk], timestamp).get(pk)
+
+
+def encode_cursor(tcl):
+    """Opaque cursor pointing right after a TableChangesLog record"""
+    value = json.dumps([tcl.created_at.isoformat(), tcl.id])
+    return base64.urlsafe_b64encode(value.encode('utf-8')).decode('ascii')
+
+
+def decode_cursor(cursor):
+    try:
+        created_at, pk = json.loads(
+            base64.urlsafe_b64decode(cursor.encode('ascii')).decode('utf-8'))
+    except (TypeError, ValueError):
+        raise ValueError('Invalid history cursor {}'.format(cursor))
+    return parse_datetime(created_at), pk
+
+
+def get_field_query(field_name):
+    """Logs whose comma separated field names contain field_name"""
+    return (Q(field_name=field_name) |
+            Q(field_name__startswith=field_name + ',') |
+            Q(field_name__endswith=',' + field_name) |
+            Q(field_name__contains=',' + field_name + ','))
+
+
+def get_created_query(created):
+    """Logs of newly created instances, or of updates if created is False"""
+    if created:
+        version_flag, legacy_flag = '1', 'True'
+    else:
+        version_flag, legacy_flag = '0', 'False'
+    return (Q(log__startswith='{}{}~'.format(LOG_VERSION_PREFIX,
+                                             version_flag)) |
+            Q(log__startswith=LEGACY_LOG_PREFIX,
+              log__endswith='~' + legacy_flag))
+
+
+def get_change_history_queryset(model, pk=None, fields=None, since=None,
+                                until=None, created=None, instances=None):
+    """
+    TableChangesLog records of a model, or of one of its instances, filtered
+    and ordered for keyset pagination.
+
+    Arguments:
+        model: <Model class> A loggable model
+        pk: <optional> Primary key of a single instance
+        fields: <list|optional> Only logs of any of these fields
+        since: <datetime|optional> Only logs created at or after this time
+        until: <datetime|optional> Only logs created before this time
+        created: <bool|optional> Only logs of created, or updated, instances
+        instances: <QuerySet|optional> Only logs of these instances
+    """
+    from tablechangelogger.models import TableChangesLog
+
+    tcls = TableChangesLog.objects.filter(app_label=model._meta.app_label,
+                                          table_name=model.__name__)
+    if pk is not None:
+        tcls = tcls.filter(instance_id=pk)
+    if instances is not None:
+        tcls = tcls.filter(instance_id__in=instances.values('pk'))
+    if fields:
+        query = Q()
+        for field_name in fields:
+            query |= get_field_query(field_name)
+        tcls = tcls.filter(query)
+    if since is not None:
+        tcls = tcls.filter(created_at__gte=since)
+    if until is not None:
+        tcls = tcls.filter(created_at__lt=until)
+    if created is not None:
+        tcls = tcls.filter(get_created_query(created))
+    return tcls
+
+
+def get_change_history_page(tcls, cursor=None, limit=HISTORY_PAGE_SIZE,
+                            ascending=False):
+    """
+    A page of logs after cursor, ordered by (created_at, id). The filter on
+    the last row seen keeps deep pages as fast as the first one, unlike an
+    offset.
+
+    Returns:
+        (tcls, next_cursor): <tuple> The logs of the page and the cursor of
+        the next page, None on the last page
+    """
+    if cursor is not None:
+        created_at, pk = decode_cursor(cursor)
+        if ascending:
+            tcls = tcls.filter(Q(created_at__gt=created_at) |
+                               Q(created_at=created_at, id__gt=pk))
+        else:
+            tcls = tcls.filter(Q(created_at__lt=created_at) |
+                               Q(created_at=created_at, id__lt=pk))
+
+    ordering = ('created_at', 'id') if ascending else ('-created_at', '-id')
+    page = list(tcls.order_by(*ordering)[:limit + 1])
+    if len(page) > limit:
+        return page[:limit], encode_cursor(page[limit - 1])
+    return page, None
+
+
+def iter_change_history(tcls, cursor=None, chunk_size=HISTORY_PAGE_SIZE,
+                        ascending=False):
+    """
+    Yields logs page by page. Their log values are only decoded when read.
+    """
+    while True:
+        page, cursor = get_change_history_page(tcls, cursor, chunk_size,
+                                               ascending)
+        for tcl in page:
+            yield tcl
+        if cursor is None:
+            return
+
+
+def get_field_changes(model, field_name, pk=None, **kwargs):
+    """
+    TableChangeLogField rows of a field of a model, or of one of its
+    instances, the latest first. Needs FIELD_ROWS.
+
+    Arguments:
+        model: <Model class> A loggable model
+        field_name: <str> A loggable field or property of model
+        pk: <optional> Primary key of a single instance
+        new_value: <optional> Only rows of changes to this value, compared
+        in its normalized form
+    """
+    from tablechangelogger.models import TableChangeLogField
+
+    rows = TableChangeLogField.objects.filter(
+        app_label=model._meta.app_label, table_name=model.__name__,
+        field_name=field_name)
+    if pk is not None:
+        rows = rows.filter(instance_id=pk)
+    if 'new_value' in kwargs:
+        rows = rows.filter(new_value=normalize_value(kwargs['new_value']))
+    return rows.order_by('-created_at', '-id')
+
+
+class ChangeHistoryMixin(object):
+    """Gives the instances of a loggable model a change_history method."""
+
+    def change_history(self, cursor=None, chunk_size=HISTORY_PAGE_SIZE,
+                       ascending=False, **filters):
+        """
+        Streams the logs of this instance, the latest first unless
+        ascending. Takes the filters of get_change_history_queryset.
+        """
+        tcls = get_change_history_queryset(type(self), self.pk, **filters)
+        return iter_change_history(tcls, cursor, chunk_size, ascending)
+
+    def get_change_history_page(self, cursor=None, limit=HISTORY_PAGE_SIZE,
+                                ascending=False, **filters):
+        tcls = get_change_history_queryset(type(self), self.pk, **filters)
+        return get_change_history_page(tcls, cursor, limit, ascending)
@@ -1,43 +1,75 @@
+import asyncio
+from collections import defaultdict
 from datetime import datetime
+from functools import partial
 import logging
 from hashlib import md5
+import random
 
-from django.db import IntegrityError
-from django.db.models import Q
+from django.db import IntegrityError, connections, router, transaction
+from django.db.models import F, Q
 from django.db.models.base import Model
-from tablechangelogger.config import LOGGABLE_APPS
+from django.db.models.signals import post_save
+from django.utils import timezone
+from tablechangelogger import stats
+from tablechangelogger.codec import merge_logs, normalize_value
+from tablechangelogger.config import (
+    BUFFER_WRITES, DEDUP_CACHE_SIZE, WRITE_MODE
+)
+from tablechangelogger.diff import get_changed_fields
+from tablechangelogger.history import get_field_query
+from tablechangelogger.registry import (
+    LOGGING_PLANS, get_log_plan, get_logging_plan, get_model_properties)
+from tablechangelogger.spool import SPOOL, spool_table_change_logs
 from tablechangelogger.utils import (
-    get_app_label, get_model, get_model_name, serialize_field,
-    is_same_dictionary)
-from tablechangelogger.datastructures import Logged, Change
+    get_model, serialize_field, is_same_dictionary)
+from tablechangelogger.datastructures import Logged, Change, LRUCache
 
 logger = logging.getLogger(__name__)
 
+# instance attribute marking a save logged by asave_with_log
+ASYNC_SAVE_ATTR = '_tcl_async_save'
+# record attribute marking a log whose callback is scheduled as a task
+ASYNC_CALLBACK_ATTR = '_tcl_async_callback'
+
+# instance attribute holding the loggable field values as they were loaded
+LOADED_STATE_ATTR = '_tcl_loaded_state'
+# orders the logs of an instance from the latest, logs written before they
+# were numbered come last
+LATEST_FIRST = (F('seq').desc(nulls_last=True), '-created_at')
+# log attribute holding its previous log until that one is saved
+UNSAVED_PREVIOUS_ATTR = '_tcl_unsaved_previous'
+# head attribute holding the latest log of its instance until it is saved
+UNSAVED_LATEST_ATTR = '_tcl_unsaved_latest'
+# log attribute holding the hash of what it records
+CONTENT_HASH_ATTR = '_tcl_content_hash'
+# log attribute holding the logged values of its instance as of the log,
+# when a checkpoint is due with it
+CHECKPOINT_ATTR = '_tcl_checkpoint'
+
+# content hash and unique id of the latest log written by this process for
+# each recently logged instance
+RECENT_LOGS = LRUCache(DEDUP_CACHE_SIZE)
+# latest value logged by this process for the fields that have a min delta,
+# so a field creeping by small steps is still logged once it drifts enough
+LOGGED_VALUES = LRUCache(DEDUP_CACHE_SIZE)
+
 
 def is_loggable(instance):
     """
         Determines whether the instance model or app label is loggable
         to TableChangeLog
     """
-    is_loggable = False
-    app_label = get_app_label(instance)
-    table_name = get_model_name(instance)
-    config = LOGGABLE_APPS.get(app_label)
-
-    if config is not None:
-        for model_path in config.keys():
-            is_loggable = table_name in model_path
-            # if instance is newly created, we cannot log it since
-            # there is no change
-            is_loggable &= instance.pk is not None
-            if is_loggable:
-                break
-
-    return is_loggable
+    # if instance is newly created, we cannot log it since there is no change
+    return get_logging_plan(instance) is not None and instance.pk is not None
 
 
 def get_differing_fields(first_instance, second_instance):
-    """Returns differing field names of two instances of the same type"""
+    """
+    Returns differing field names of two instances of the same type.
+    Only concrete columns are compared, by attribute name, so no related
+    object is loaded.
+    """
 
     differing_fields = []
 
@@ -47,20 +79,84 @@ def get_differing_fields(first_instance, second_instance):
     if any([first_instance is None, second_instance is None]):
         nonempty_instance = (first_instance if first_instance is not None else
                              second_instance)
-        field_names = nonempty_instance._meta.get_fields()
-        field_names = list(map(lambda field: field.name, field_names))
-        return field_names
+        return [field.name for field in
+                nonempty_instance._meta.concrete_fields]
+
+    return [
+        field.name for field in first_instance._meta.concrete_fields
+        if getattr(first_instance, field.attname, None) !=
+        getattr(second_instance, field.attname, None)
+    ]
+
+
+def get_tracked_values(instance, plan, field_names=None):
+    """
+    Returns the raw values of the concrete loggable fields of an instance,
+    keyed by field name. Foreign keys are read as ids, so no related object
+    is loaded.
+    """
+
+    field_names = field_names or plan.field_attnames.keys()
+    return {name: getattr(instance, plan.field_attnames[name])
+            for name in field_names}
+
+
+def get_tracked_row(plan, row):
+    """Maps a row of tracked columns to field names, None without a row"""
+
+    if row is None:
+        return None
+    return {name: row[attname]
+            for name, attname in plan.field_attnames.items()}
 
-    # get common field names
-    field_names = first_instance._meta.get_fields()
-    field_names = list(map(lambda field: field.name, field_names))
 
-    differing_fields = list(filter(
-         lambda field_name: getattr(first_instance, field_name, None) !=
-         getattr(second_instance, field_name, None), field_names
-    ))
+def fetch_tracked_values(plan, pk):
+    """
+    Returns the stored raw values of the concrete loggable fields of an
+    instance, None if it has no row. Only those columns are selected.
+    """
+
+    instances = plan.model.objects.filter(pk=pk)
+    if not plan.field_attnames:
+        return {} if instances.exists() else None
+
+    return get_tracked_row(plan, instances.values(
+        *plan.field_attnames.values()).first())
+
+
+async def afetch_tracked_values(plan, pk):
+    """Async version of fetch_tracked_values"""
+
+    instances = plan.model.objects.filter(pk=pk)
+    if not plan.field_attnames:
+        return {} if await instances.aexists() else None
+
+    return get_tracked_row(plan, await instances.values(
+        *plan.field_attnames.values()).afirst())
+
+
+def take_loaded_state(instance, plan):
+    """
+    Snapshots the loggable field values of an instance. Does nothing if any
+    of them is deferred, the instance is then fetched again before saving.
+    """
+
+    attnames = plan.field_attnames.values()
+    if any(attname not in instance.__dict__ for attname in attnames):
+        return
+    setattr(instance, LOADED_STATE_ATTR, get_tracked_values(instance, plan))
+
+
+def get_loaded_state(instance, plan):
+    """
+    Returns the loaded state snapshot of an instance if it can stand in for
+    its database row, otherwise None.
+    """
 
-    return differing_fields
+    # instances built by hand were never loaded from the database
+    if not plan.track_loaded_state or instance._state.adding:
+        return None
+    return getattr(instance, LOADED_STATE_ATTR, None)
 
 
 def get_loggable_fields(differing_fields, config):
@@ -82,17 +178,8 @@ def get_loggable_fields(differing_fields, config):
 def get_table_change_log_config(instance):
     """Returns table change log config based on instance"""
 
-    app_label = get_app_label(instance)
-    table_name = get_model_name(instance)
-    config = LOGGABLE_APPS.get(app_label)
-    table_path = list(filter(lambda key: table_name in key, config.keys()))
-
-    if table_path:
-        table_path = table_path[0]
-
-    table_config = config.get(table_path)
-
-    return table_config
+    plan = get_logging_plan(instance)
+    return plan.config if plan is not None else None
 
 
 def generate_changes_string(new_values):
@@ -105,16 +192,29 @@ def generate_changes_string(new_values):
     return changes
 
 
-def generate_tcl_unique_id(app_label, table_name, instance_id, field_names,
-                           new_values):
+def generate_tcl_content_hash(app_label, table_name, instance_id,
+                              field_names, log):
     """
-    Generates a unique id from specific log attributes.
+    Generates a hash of what a log records: the instance, the field names
+    and their new and old values.
     """
 
-    changes = generate_changes_string(new_values)
-    key = '{}{}{}{}{}{}'.format(app_label, table_name, instance_id, field_names,
-                              changes, datetime.now().timestamp())
+    new_changes = generate_changes_string(log.get_new_values())
+    old_changes = generate_changes_string(log.get_old_values())
+    key = '{}{}{}{}{}|{}'.format(app_label, table_name, instance_id,
+                                 field_names, new_changes, old_changes)
+
+    return md5(str(key).encode()).hexdigest()
+
+
+def generate_tcl_unique_id(content_hash, previous_unique_id=None):
+    """
+    Generates a unique id from the content hash of a log chained to the
+    unique id of the previous log of its instance, so the same change
+    written twice after the same log collides.
+    """
 
+    key = '{}{}'.format(previous_unique_id or '', content_hash)
     return md5(str(key).encode()).hexdigest()
 
 
@@ -135,46 +235,521 @@ def generate_tcl_property_unique_ids_dict(loggable_properties, changes):
     return unique_id_dict
 
 
-def create_table_change_log_record(app_label, table_name, instance_id,
-                                   field_names, log, loggable_properties=None):
+def get_log_key(tcl):
+    """Returns the key identifying the logged instance of a TableChangesLog"""
+    return tcl.app_label, tcl.table_name, tcl.instance_id
+
+
+def build_table_change_log(app_label, table_name, instance_id, field_names,
+                           log, loggable_properties=None):
     """
-    Creates TableChangeLog record and returns the created instance
+    Returns an unsaved TableChangesLog record. Its unique id is assigned
+    when it is written, after the previous log of its instance.
     """
     from tablechangelogger.models import TableChangesLog
 
-    unique_id = generate_tcl_unique_id(
-        app_label, table_name, instance_id, field_names,
-        log.get_new_values())
     property_unique_ids_dict = generate_tcl_property_unique_ids_dict(
         loggable_properties, log.changes)
 
-    is_unique_log = True
-    tcl_exists = TableChangesLog.objects.filter(unique_id=unique_id).exists()
+    tcl = TableChangesLog(
+        app_label=app_label, table_name=table_name,
+        instance_id=instance_id, field_name=field_names,
+        log=log, property_unique_ids=property_unique_ids_dict
+    )
+    setattr(tcl, CONTENT_HASH_ATTR, generate_tcl_content_hash(
+        app_label, table_name, instance_id, field_names, log))
+    return tcl
+
+
+def is_recent_log(tcl, head):
+    """
+    Checks whether a log records the same change as the latest log this
+    process wrote for its instance, as long as that log is still the latest
+    one of the instance. Another process may have logged a different change
+    since.
+    """
+
+    recent_log = RECENT_LOGS.get(get_log_key(tcl))
+    return (recent_log is not None and recent_log[1] is not None and
+            recent_log == (getattr(tcl, CONTENT_HASH_ATTR, None),
+                           getattr(head, 'last_unique_id', None)))
+
+
+def remember_recent_logs(tcls):
+    """Remembers the content hash and unique id of written logs"""
+
+    for tcl in tcls:
+        RECENT_LOGS.set(get_log_key(tcl),
+                        (getattr(tcl, CONTENT_HASH_ATTR, None), tcl.unique_id))
+
+
+def is_same_log(tcl, previous_log):
+    """
+    Checks whether a TableChangesLog record carries no change compared to
+    the previous record or the head of the same instance
+    """
+
     old_changes = get_old_changes(
-        property_unique_ids=property_unique_ids_dict,
-        field_names=field_names,
-        table_name=table_name,
-        app_label=app_label,
-        instance_id=instance_id,
-        log=log)
-    new_changes = log.get_new_values()
+        property_unique_ids=tcl.property_unique_ids,
+        field_names=tcl.field_name,
+        table_name=tcl.table_name,
+        app_label=tcl.app_label,
+        instance_id=tcl.instance_id,
+        log=tcl.log,
+        previous_log=previous_log)
+    new_changes = tcl.log.get_new_values()
+    return is_same_dictionary(old_changes, new_changes)
+
+
+def get_log_database():
+    """
+    Database alias the logs are written to. Reads feeding the write path,
+    such as deduplication, use it too, a replica may not have the latest
+    logs yet.
+    """
+    from tablechangelogger.models import TableChangesLog
+
+    return router.db_for_write(TableChangesLog)
+
+
+def get_table_change_log_heads(keys):
+    """
+    Returns the TableChangeLogHead of each instance, locked until the
+    running transaction ends, so concurrent writers of an instance take
+    turns instead of chaining their logs to the same one. Instances without
+    a head first get one, built from their latest stored log, so there is a
+    row to lock. Runs in a transaction of get_log_database().
+
+    Arguments:
+        keys: <set> (app_label, table_name, instance_id) tuples
+    """
+    from tablechangelogger.models import TableChangeLogHead
+
+    if not keys:
+        return {}
+
+    heads = {get_log_key(head): head for head in
+             get_table_change_log_heads_queryset(keys, lock=True)}
+    missing_keys = set(keys) - set(heads)
+    if missing_keys:
+        new_heads = build_table_change_log_heads(
+            {}, missing_keys, get_previous_logs(missing_keys))
+        # waits for a concurrent writer inserting the same head, then
+        # leaves it be and locks that one
+        TableChangeLogHead.objects.using(get_log_database()).bulk_create(
+            [new_heads[key] for key in sorted(new_heads)],
+            ignore_conflicts=True)
+        heads.update((get_log_key(head), head) for head in
+                     get_table_change_log_heads_queryset(missing_keys,
+                                                         lock=True))
+    return heads
+
+
+def get_table_change_log_heads_queryset(keys, lock=False):
+    from tablechangelogger.models import TableChangeLogHead
+
+    queryset = TableChangeLogHead.objects.using(get_log_database()).filter(
+        get_instances_query(keys)
+    ).annotate(last_unique_id=F('last_log__unique_id'))
+    if lock:
+        # in a steady order, so two writers do not wait for each other
+        queryset = queryset.select_for_update(of=('self', )).order_by('pk')
+    return queryset
+
+
+def build_table_change_log_heads(heads, missing_keys, previous_logs):
+    """
+    Adds an unsaved head to heads for each of missing_keys, built from the
+    latest stored log of its instance if there is one
+    """
+    from tablechangelogger.models import TableChangeLogHead
+
+    for key in missing_keys:
+        app_label, table_name, instance_id = key
+        head = TableChangeLogHead(app_label=app_label, table_name=table_name,
+                                  instance_id=instance_id)
+        head.last_unique_id = None
+        previous_log = previous_logs.get(key)
+        if previous_log is not None:
+            head.log = previous_log.log
+            head.property_unique_ids = previous_log.property_unique_ids
+            head.last_log = previous_log
+            head.last_unique_id = previous_log.unique_id
+            head.seq = previous_log.seq
+        heads[key] = head
+
+    return heads
+
+
+def link_table_change_log(tcl, head):
+    """
+    Points a TableChangesLog record to the latest record of its instance,
+    numbers it after that one and chains its unique id to that one's.
+    """
+
+    latest_log = getattr(head, UNSAVED_LATEST_ATTR, None)
+    previous_unique_id = (latest_log.unique_id if latest_log is not None
+                          else getattr(head, 'last_unique_id', None))
+    tcl.unique_id = generate_tcl_unique_id(
+        getattr(tcl, CONTENT_HASH_ATTR, ''), previous_unique_id)
+
+    if latest_log is None and head.last_log_id is None:
+        tcl.seq = 1
+        return
+
+    tcl.seq = head.seq + 1 if head.seq is not None else None
+    if latest_log is not None:
+        # written in the same batch, linked once it has a primary key
+        setattr(tcl, UNSAVED_PREVIOUS_ATTR, latest_log)
+    else:
+        tcl.previous_id = head.last_log_id
+
+
+def link_unsaved_previous_log(tcl):
+    """
+    Points a record to its previous record written in the same batch.
+    Returns whether there was one to point to.
+    """
+
+    previous_log = getattr(tcl, UNSAVED_PREVIOUS_ATTR, None)
+    if previous_log is None or previous_log.pk is None:
+        return False
+    tcl.previous = previous_log
+    delattr(tcl, UNSAVED_PREVIOUS_ATTR)
+    return True
+
+
+def fill_old_property_values(tcl, head):
+    """
+    Sets the old values of the properties a record logs to the values last
+    logged for its instance, kept by its head. Only the stored columns are
+    read before a save, so properties are never evaluated on the old row.
+    """
+
+    if head.log is None or tcl.log.created:
+        return
+    for name in tcl.property_unique_ids or {}:
+        change = tcl.log.get_field_log(name)
+        if change is not None and change.old_value is None:
+            change.old_value = head.log.get_field_new_value(name)
+
+
+def advance_table_change_log_head(head, tcl):
+    """Merges the values logged by a record into the head of its instance"""
+
+    head.log = merge_logs(head.log, tcl.log)
+    property_unique_ids = dict(head.property_unique_ids or {})
+    property_unique_ids.update(tcl.property_unique_ids or {})
+    head.property_unique_ids = property_unique_ids
+    head.seq = tcl.seq
+    setattr(head, UNSAVED_LATEST_ATTR, tcl)
+
+
+def is_checkpoint_due(tcl):
+    """Whether a checkpoint of its instance is written along with a log"""
+
+    plan = get_log_plan(tcl)
+    if plan is None or not plan.checkpoint_interval or not tcl.seq:
+        return False
+    return tcl.seq % plan.checkpoint_interval == 0
+
 
-    is_same_log = is_same_dictionary(old_changes, new_changes)
-    is_unique_log = not tcl_exists and not is_same_log
+def save_table_change_log_checkpoints(tcls, using):
+    """Saves the checkpoints due with saved TableChangesLog records"""
+    from tablechangelogger.models import TableChangeLogCheckpoint
 
-    if is_unique_log:
+    checkpoints = []
+    for tcl in tcls:
+        log = getattr(tcl, CHECKPOINT_ATTR, None)
+        if log is None or tcl.pk is None:
+            continue
+        checkpoints.append(TableChangeLogCheckpoint(
+            app_label=tcl.app_label, table_name=tcl.table_name,
+            instance_id=tcl.instance_id, log=log, last_log=tcl, seq=tcl.seq,
+            created_at=tcl.created_at))
+        delattr(tcl, CHECKPOINT_ATTR)
+
+    TableChangeLogCheckpoint.objects.using(using).bulk_create(checkpoints)
+
+
+def build_table_change_log_fields(tcl):
+    """Unsaved TableChangeLogField rows of a saved TableChangesLog record"""
+    from tablechangelogger.models import TableChangeLogField
+
+    return [
+        TableChangeLogField(
+            log=tcl, app_label=tcl.app_label, table_name=tcl.table_name,
+            instance_id=tcl.instance_id, field_name=field_name,
+            new_value=normalize_value(tcl.log.get_field_new_value(field_name)),
+            created_at=tcl.created_at)
+        for field_name in tcl.field_name.split(',') if field_name
+    ]
+
+
+def save_table_change_log_fields(tcls, using):
+    """Saves the field rows of saved records of models with FIELD_ROWS"""
+    from tablechangelogger.models import TableChangeLogField
+
+    rows = []
+    for tcl in tcls:
+        plan = get_log_plan(tcl)
+        if tcl.pk is not None and plan is not None and plan.field_rows:
+            rows.extend(build_table_change_log_fields(tcl))
+
+    TableChangeLogField.objects.using(using).bulk_create(rows)
+
+
+def save_table_change_log_heads(heads, using):
+    """Saves the heads advanced since they were fetched"""
+    from tablechangelogger.models import TableChangeLogHead
+
+    new_heads = []
+    changed_heads = []
+    for head in heads:
+        latest_log = getattr(head, UNSAVED_LATEST_ATTR, None)
+        if latest_log is None or latest_log.pk is None:
+            continue
+        head.last_log = latest_log
+        head.updated_at = timezone.now()
+        delattr(head, UNSAVED_LATEST_ATTR)
+        (changed_heads if head.pk else new_heads).append(head)
+
+    TableChangeLogHead.objects.using(using).bulk_create(new_heads)
+    TableChangeLogHead.objects.using(using).bulk_update(
+        changed_heads, ['log', 'property_unique_ids', 'last_log', 'seq',
+                        'updated_at'])
+
+
+def insert_table_change_logs(tcls, using):
+    """
+    Inserts TableChangesLog records with bulk_create, then points them to
+    their previous records of the same batch
+    """
+    from tablechangelogger.models import TableChangesLog
+
+    created_tcls = TableChangesLog.objects.using(using).bulk_create(tcls)
+    linked_tcls = list(filter(link_unsaved_previous_log, created_tcls))
+    if linked_tcls:
+        TableChangesLog.objects.using(using).bulk_update(
+            linked_tcls, ['previous'])
+    return created_tcls
+
+
+def save_table_change_logs(tcls, heads=(), insert=None):
+    """
+    Inserts TableChangesLog records at once along with the heads of their
+    instances. Falls back to one insert per record if any of them violates
+    a constraint, so a single duplicate does not drop the whole batch. The
+    post_save signals are left to send_table_change_log_signals, once the
+    heads are unlocked.
+
+    Arguments:
+        tcls: <list> Unsaved TableChangesLog records, linked and numbered
+        heads: <iterable> TableChangeLogHead records of their instances
+        insert: <callable|optional> Inserts the records given them and a
+            database alias, insert_table_change_logs by default
+    """
+    from tablechangelogger.models import TableChangesLog
+
+    using = get_log_database()
+    insert = insert or insert_table_change_logs
+
+    try:
+        with stats.timer('insert', tags=stats.get_batch_tags(tcls)), \
+                transaction.atomic(using=using):
+            created_tcls = insert(tcls, using)
+            save_table_change_log_heads(heads, using)
+            save_table_change_log_checkpoints(created_tcls, using)
+            save_table_change_log_fields(created_tcls, using)
+    except IntegrityError:
+        created_tcls = []
+        for tcl in tcls:
+            link_unsaved_previous_log(tcl)
+            try:
+                with transaction.atomic(using=using):
+                    TableChangesLog.objects.using(using).bulk_create([tcl])
+                created_tcls.append(tcl)
+                stats.increment('logs.written', tcl.app_label, tcl.table_name)
+            except IntegrityError as e:
+                stats.increment('logs.failed', tcl.app_label, tcl.table_name)
+                logger.exception(e)
         try:
-            TableChangesLog.objects.create(
-                app_label=app_label, table_name=table_name,
-                instance_id=instance_id, field_name=field_names,
-                log=log, unique_id=unique_id,
-                property_unique_ids=property_unique_ids_dict
-            )
+            with transaction.atomic(using=using):
+                save_table_change_log_heads(heads, using)
+                save_table_change_log_checkpoints(created_tcls, using)
+                save_table_change_log_fields(created_tcls, using)
         except IntegrityError as e:
             logger.exception(e)
+        return created_tcls
+
+    for tcl in created_tcls:
+        stats.increment('logs.written', tcl.app_label, tcl.table_name)
+    return created_tcls
+
+
+def send_table_change_log_signals(tcls, using):
+    """
+    Sends the post_save signals of TableChangesLog records saved with
+    save_table_change_logs, which run their callbacks. Called once the
+    transaction locking their heads is over, so a raising callback neither
+    holds the locks nor rolls the records back.
+    """
+    from tablechangelogger.models import TableChangesLog
+
+    for tcl in tcls:
+        post_save.send(sender=TableChangesLog, instance=tcl, created=True,
+                       update_fields=None, raw=False, using=using)
 
 
-def create_log_object(loggable_fields, instance, old_instance=None):
+def write_table_change_logs(tcls, insert=None):
+    """
+    Deduplicates unsaved TableChangesLog records in memory and writes the
+    remaining ones at once. Records of the same instance are compared in
+    order, the first one against the head of the instance. The heads stay
+    locked until the records are written, so processes writing logs of the
+    same instance take turns. Callbacks run after the heads are released.
+
+    Arguments:
+        tcls: <list> Unsaved TableChangesLog records, oldest first
+        insert: <callable|optional> See save_table_change_logs
+    """
+
+    if not tcls:
+        return []
+
+    using = get_log_database()
+    with transaction.atomic(using=using):
+        with stats.timer('dedup', tags=stats.get_batch_tags(tcls)):
+            heads = get_table_change_log_heads(set(map(get_log_key, tcls)))
+            unique_tcls = deduplicate_table_change_logs(tcls, heads)
+
+        created_tcls = save_table_change_logs(unique_tcls, heads.values(),
+                                              insert=insert)
+        # remembered once committed, logs rolled back may be written again
+        transaction.on_commit(partial(remember_recent_logs, created_tcls),
+                              using=using)
+    send_table_change_log_signals(created_tcls, using)
+    return created_tcls
+
+
+async def awrite_table_change_logs(tcls):
+    """
+    Async version of write_table_change_logs. The async ORM has no
+    transactions to lock the heads of the instances in, so the records are
+    written in a single sync_to_async call. Their callbacks are scheduled
+    as tasks.
+    """
+    from asgiref.sync import sync_to_async
+
+    from tablechangelogger.callbacks import adispatch_table_change_log_callback
+
+    for tcl in tcls:
+        setattr(tcl, ASYNC_CALLBACK_ATTR, True)
+    created_tcls = await sync_to_async(write_table_change_logs)(tcls)
+    for tcl in created_tcls:
+        await adispatch_table_change_log_callback(tcl)
+    return created_tcls
+
+
+def deduplicate_table_change_logs(tcls, heads):
+    """
+    Drops the records carrying no change compared to the previous record of
+    their instance, links and numbers the others and advances the heads.
+
+    Arguments:
+        tcls: <list> Unsaved TableChangesLog records, oldest first
+        heads: <dict> TableChangeLogHead records by instance key
+    """
+
+    unique_tcls = []
+    for tcl in tcls:
+        head = heads[get_log_key(tcl)]
+        latest_log = getattr(head, UNSAVED_LATEST_ATTR, None)
+        if latest_log is not None:
+            # the same change buffered twice in a row
+            duplicate = (getattr(latest_log, CONTENT_HASH_ATTR, None) ==
+                         getattr(tcl, CONTENT_HASH_ATTR, None))
+        else:
+            # the same change this process just wrote, not compared again
+            duplicate = is_recent_log(tcl, head)
+        if duplicate or is_same_log(tcl, head):
+            stats.increment('logs.deduplicated', tcl.app_label,
+                            tcl.table_name)
+            continue
+        fill_old_property_values(tcl, head)
+        link_table_change_log(tcl, head)
+        advance_table_change_log_head(head, tcl)
+        if is_checkpoint_due(tcl):
+            setattr(tcl, CHECKPOINT_ATTR, head.log)
+        unique_tcls.append(tcl)
+    return unique_tcls
+
+
+def create_table_change_log_records(tcls, using=None):
+    """
+    Writes unsaved TableChangesLog records, or buffers them until the
+    running transaction commits when BUFFER_WRITES is enabled. With the
+    on_commit WRITE_MODE, they wait for the transaction of the database
+    alias using, the one the logged instances were saved to. With a
+    SPOOL_DIRECTORY, they are appended to the spool once that transaction
+    commits.
+    """
+    from tablechangelogger.buffer import get_pending_logs
+
+    if not tcls:
+        return
+
+    if SPOOL is not None:
+        transaction.on_commit(partial(spool_table_change_logs, tcls),
+                              using=using)
+        return
+
+    if WRITE_MODE == 'on_commit':
+        pending_logs = get_pending_logs(using)
+    elif BUFFER_WRITES:
+        pending_logs = get_pending_logs()
+    else:
+        pending_logs = None
+    if pending_logs is not None:
+        pending_logs.extend(tcls)
+    else:
+        write_table_change_logs(tcls)
+
+
+def create_table_change_log_record(app_label, table_name, instance_id,
+                                   field_names, log, loggable_properties=None,
+                                   using=None):
+    """
+    Creates TableChangeLog record, or buffers it until the running
+    transaction commits, see create_table_change_log_records
+    """
+
+    with stats.timer('serialize', app_label, table_name):
+        tcl = build_table_change_log(app_label, table_name, instance_id,
+                                     field_names, log, loggable_properties)
+    create_table_change_log_records([tcl], using=using)
+
+
+async def acreate_table_change_log_records(tcls):
+    """
+    Async version of create_table_change_log_records. There is no
+    transaction to wait for in async code, so records are spooled or
+    written right away.
+    """
+
+    if not tcls:
+        return
+
+    if SPOOL is not None:
+        # an occasional fsync is no business of the event loop
+        await asyncio.get_running_loop().run_in_executor(
+            None, spool_table_change_logs, tcls)
+    else:
+        await awrite_table_change_logs(tcls)
+
+
+def create_log_object(loggable_fields, instance, old_instance=None,
+                      old_values=None, new_values=None):
     """
     Create TableChangesLog log attribute.
 
@@ -183,65 +758,173 @@ def create_log_object(loggable_fields, instance, old_instance=None):
         new_instance: <Model instance> A newly saved Django model instance
         old_instance: <Model instance|optional> Old version of the instance
         argument
+        old_values: <dict|optional> Old field values, used instead of
+        old_instance for the fields it contains
+        new_values: <dict|optional> New field values, used instead of
+        reading them from instance for the fields it contains
     """
 
     # initialize variables
     changes = {}
     log = None
+    created = old_instance is None and old_values is None
+    old_values = old_values or {}
+    new_values = new_values or {}
 
     # for each loggable field, get its value and save to the
     # respective table
     for field_name in loggable_fields:
-        old_value = getattr(old_instance, field_name, None)
-        new_value = getattr(instance, field_name, None)
+        if field_name in old_values:
+            old_value = old_values[field_name]
+        else:
+            old_value = getattr(old_instance, field_name, None)
+        if field_name in new_values:
+            new_value = new_values[field_name]
+        else:
+            new_value = getattr(instance, field_name, None)
         change = Change(old_value=old_value, new_value=new_value)
         changes[field_name] = change
 
     # if changes exist, create the log object
     if changes:
-        created = old_instance is None
         log = Logged(changes=changes, created=created)
 
     return log
 
 
-def create_initial_change_log_record(instance):
+def is_negligible_change(plan, instance_id, field_name, change):
     """
-    Creates a TableChangesLog record for a newly created instance.
+    Whether a field change is below its min delta, measured from the value
+    this process logged last, or is left out by its sample rate.
+    """
+    sample_rate = plan.sample_rates.get(field_name)
+    if sample_rate is not None and random.random() >= sample_rate:
+        return True
+
+    min_delta = plan.min_deltas.get(field_name)
+    if min_delta is not None:
+        key = (plan.app_label, plan.table_name, str(instance_id), field_name)
+        reference = LOGGED_VALUES.get(key)
+        if reference is None:
+            # pin the first seen value, until a change of the field is logged
+            reference = change.old_value
+            LOGGED_VALUES.set(key, reference)
+        try:
+            if abs(change.new_value - reference) < min_delta:
+                return True
+        except TypeError:
+            # not numeric or one of the values is None
+            pass
+        LOGGED_VALUES.set(key, change.new_value)
+
+    return False
+
+
+def drop_negligible_changes(plan, instance_id, log, field_names):
+    """
+    Removes negligible field changes from log and returns the field names
+    that are left. Properties are always kept.
+    """
+    if not plan.min_deltas and not plan.sample_rates:
+        return field_names
+
+    kept = []
+    for field_name in field_names:
+        if field_name not in plan.properties and is_negligible_change(
+                plan, instance_id, field_name, log.changes[field_name]):
+            del log.changes[field_name]
+        else:
+            kept.append(field_name)
+    return kept
+
+
+def build_initial_table_change_log(instance, plan):
+    """
+    Returns an unsaved TableChangesLog record holding the initial values of
+    the loggable properties of a newly created instance, if it has any.
     """
 
-    app_label = get_app_label(instance)
-    table_name = get_model_name(instance)
-    config = get_table_change_log_config(instance)
-    loggable_properties = get_loggable_properties(instance, config)
-    field_names = ','.join(loggable_properties)
+    loggable_properties = list(plan.properties)
     log = create_log_object(loggable_properties, instance)
-    create_table_change_log_record(
-        app_label,
-        table_name,
+    if log is None:
+        return None
+
+    return build_table_change_log(
+        plan.app_label,
+        plan.table_name,
         instance.pk,
-        field_names,
+        ','.join(loggable_properties),
         log,
         loggable_properties
     )
 
 
+def build_baseline_table_change_log(instance, plan):
+    """
+    Returns an unsaved TableChangesLog record holding the current values of
+    the loggable fields and properties of an instance logged for the first
+    time, the baseline its first change is compared against.
+    """
+
+    field_names = list(plan.fields) + list(plan.properties)
+    new_values = get_tracked_values(instance, plan, plan.fields)
+    for name in plan.properties:
+        new_values[name] = getattr(instance, name, None)
+    log = create_log_object(field_names, instance, new_values=new_values)
+    if log is None:
+        return None
+
+    return build_table_change_log(
+        plan.app_label,
+        plan.table_name,
+        instance.pk,
+        ','.join(field_names),
+        log,
+        list(plan.properties)
+    )
+
+
+def create_initial_change_log_record(instance):
+    """
+    Creates a TableChangesLog record for a newly created instance.
+    """
+
+    plan = get_logging_plan(instance)
+    tcl = build_initial_table_change_log(instance, plan) if plan else None
+    if tcl is not None:
+        create_table_change_log_records([tcl], using=instance._state.db)
+
+
 def get_latest_table_change_log(table_name, instance_id, field_name=None):
     """
         Returns most recent TableChangeLog record from specified table and
         instance
     """
 
-    from tablechangelogger.models import TableChangesLog
+    from tablechangelogger.models import TableChangeLogField, TableChangesLog
 
     query = Q(table_name=table_name) & Q(instance_id=instance_id)
 
+    if field_name and has_field_rows(table_name):
+        row = TableChangeLogField.objects.filter(
+            query, field_name=field_name
+        ).select_related('log').order_by('-created_at', '-id').first()
+        # logs written before field rows were enabled have none
+        if row is not None:
+            return row.log
+
     if field_name:
-        query &= Q(field_name__icontains=field_name)
+        query &= get_field_query(field_name)
 
     return TableChangesLog.objects.filter(query).order_by('created_at').last()
 
 
+def has_field_rows(table_name):
+    """Whether the logs of models named table_name have field rows"""
+    return any(plan.field_rows for plan in LOGGING_PLANS.values()
+               if plan.table_name == table_name)
+
+
 def get_notifiable_table_change_fields(tcl):
     """
     Returns notifiable property names and fields for TableChangesLog.
@@ -302,12 +985,12 @@ def get_loggable_properties(instance, config):
     returns loggable properties among those fields.
     """
 
+    plan = get_logging_plan(instance)
+    if plan is not None:
+        return list(plan.properties)
+
     fields = config.get('fields')
-    model = instance._meta.model
-    property_names = [
-        name for name in dir(model)
-        if isinstance(getattr(model, name), property)
-    ]
+    property_names = get_model_properties(get_model(instance))
     loggable_properties = list(
         filter(lambda prop: prop in fields, property_names))
     return loggable_properties
@@ -325,6 +1008,8 @@ def get_old_changes(**kwargs):
         instance_id (int)
         log (Logged)
         pk (int, optional)
+        previous_log (TableChangesLog or TableChangeLogHead, optional):
+            the latest known values, avoids querying the previous log
     """
 
     property_unique_ids = kwargs.get('property_unique_ids')
@@ -340,21 +1025,23 @@ def get_old_changes(**kwargs):
     fields = field_names.split(',')
     loggable_fields = [field for field in set(fields)
                        if field not in properties]
-    prev_log = get_previous_log(instance_id, table_name, app_label, pk=pk)
+    if 'previous_log' in kwargs:
+        prev_log = kwargs['previous_log']
+    else:
+        prev_log = get_previous_log(instance_id, table_name, app_label, pk=pk)
 
     changes_dict = {}
 
-    if prev_log:
-        prev_changes = prev_log.log.changes
+    if prev_log and prev_log.log:
+        prev_changes = prev_log.log
+        prev_field_names = prev_changes.get_field_names()
         existing_property_changes = [prop for prop in properties
-                                     if prop in prev_changes.keys()]
-        changes_dict = {key: prev_changes.get(key).new_value
+                                     if prop in prev_field_names]
+        changes_dict = {key: prev_changes.get_field_new_value(key)
                         for key in existing_property_changes}
 
-    current_changes = log.changes
-
     for field in loggable_fields:
-        changes_dict[field] = current_changes.get(field).old_value
+        changes_dict[field] = log.get_field_old_value(field)
 
     return changes_dict
 
@@ -362,61 +1049,226 @@ def get_old_changes(**kwargs):
 def get_previous_log(instance_id, table_name, app_label, pk=None):
     from tablechangelogger.models import TableChangesLog
 
-    queryset = TableChangesLog.objects.order_by('created_at').filter(
+    queryset = TableChangesLog.objects.using(get_log_database()).order_by(
+        *LATEST_FIRST).filter(
         instance_id=instance_id,
         table_name=table_name,
         app_label=app_label,
         created_at__lte=datetime.now())
     if pk:
         queryset = queryset.exclude(id=pk)
-    return queryset.last()
+    return queryset.first()
+
+
+def get_instances_query(keys):
+    """
+    Returns a query matching the TableChangesLog records of many instances.
+
+    Arguments:
+        keys: <iterable> (app_label, table_name, instance_id) tuples
+    """
+
+    instance_ids = defaultdict(set)
+    for app_label, table_name, instance_id in keys:
+        instance_ids[(app_label, table_name)].add(instance_id)
+
+    query = Q()
+    for (app_label, table_name), ids in instance_ids.items():
+        query |= Q(app_label=app_label, table_name=table_name,
+                   instance_id__in=ids)
+    return query
+
+
+def get_previous_logs(keys):
+    """
+    Returns the latest TableChangesLog record of each instance in one query.
+
+    Arguments:
+        keys: <set> (app_label, table_name, instance_id) tuples
+
+    Returns:
+        previous_logs: <dict> Latest records mapped by their key
+    """
+    if not keys:
+        return {}
+
+    previous_logs = {}
+    for tcl in get_previous_logs_queryset(keys):
+        previous_logs.setdefault(get_log_key(tcl), tcl)
+    return previous_logs
+
+
+def get_previous_logs_queryset(keys):
+    """
+    Logs of the instances of keys, latest first per instance. Only the
+    latest ones on databases supporting DISTINCT ON, the first log of each
+    instance is the one to keep either way.
+    """
+    from tablechangelogger.models import TableChangesLog
+
+    using = get_log_database()
+    queryset = TableChangesLog.objects.using(using).filter(
+        get_instances_query(keys)
+    ).order_by('app_label', 'table_name', 'instance_id', *LATEST_FIRST)
+    if connections[using].features.can_distinct_on_fields:
+        queryset = queryset.distinct('app_label', 'table_name',
+                                     'instance_id')
+    return queryset
+
+
+def build_change_log(plan, instance, old_values):
+    """
+    Diffs the tracked values of an instance against old_values and returns
+    the names of the fields to log, the log and the loggable properties, or
+    None when there is nothing to log. Shared by the sync and async paths.
+    """
+
+    tags = stats.get_tags(plan.app_label, plan.table_name)
+    # get differing fields
+    with stats.timer('diff', tags=tags):
+        new_values = get_tracked_values(instance, plan)
+        if old_values is None:
+            differing_fields = list(new_values)
+        else:
+            differing_fields = get_changed_fields(
+                old_values, new_values, plan.comparators)
+    # get properties to log, those depending on fields that did not
+    # change are neither evaluated nor logged
+    loggable_properties = plan.get_loggable_properties(differing_fields)
+    # get fields to log
+    loggable_fields = get_loggable_fields(differing_fields, plan.config)
+    # merge properties and loggable fields
+    loggable_fields = loggable_fields + loggable_properties
+
+    # evaluate properties once per save, on their own to time them, the log
+    # carries their values through deduplication and notification
+    with stats.timer('properties', tags=tags):
+        for name in loggable_properties:
+            new_values[name] = getattr(instance, name, None)
+
+    # create log changes mapping
+    log = create_log_object(loggable_fields, instance,
+                            old_values=old_values, new_values=new_values)
+    if not log:
+        return None
+
+    kept_fields = drop_negligible_changes(
+        plan, instance.pk, log, loggable_fields)
+    # skip the save when all of its changes were negligible
+    if len(kept_fields) == len(loggable_properties) and \
+            len(kept_fields) < len(loggable_fields):
+        stats.increment('logs.skipped', plan.app_label, plan.table_name)
+        return None
+    return kept_fields, log, loggable_properties
 
 
 def log_table_change(func):
     def wrapper(sender, instance, *args, **kwargs):
-        model = get_model(instance)
-
-        try:
-            obj = model.objects.get(pk=instance.pk)
-        except Exception:
-            obj = None
+        # a single lookup decides whether the instance is loggable,
+        # newly created instances are not since there is no change,
+        # instances saved through asave_with_log are logged by it
+        plan = get_logging_plan(instance)
+
+        if plan is None or instance.pk is None or \
+                getattr(instance, ASYNC_SAVE_ATTR, False):
+            return func(sender, instance, *args, **kwargs)
+
+        tags = stats.get_tags(plan.app_label, plan.table_name)
+        old_values = get_loaded_state(instance, plan)
+
+        # fetch the stored columns only when there is no loaded state to diff
+        if old_values is None:
+            try:
+                with stats.timer('refetch', tags=tags):
+                    old_values = fetch_tracked_values(plan, instance.pk)
+            except Exception:
+                old_values = None
 
         try:
             result = func(sender, instance, *args, **kwargs)
-            # get the instance from the pre_save method
-            # check if the instance is loggable
-            loggable = is_loggable(instance)
-
-            if loggable:
-                app_label = get_app_label(instance)
-                table_name = get_model_name(instance)
-                # get differing fields
-                differing_fields = get_differing_fields(obj, instance)
-                # get respective config
-                config = get_table_change_log_config(instance)
-                # get properties to log
-                loggable_properties = get_loggable_properties(
-                    instance, config)
-                # get fields to log
-                loggable_fields = get_loggable_fields(differing_fields,
-                                                      config)
-                # merge properties and loggable fields
-                loggable_fields = loggable_fields + loggable_properties
-
-                # create log changes mapping
-                log = create_log_object(loggable_fields, instance, obj)
-
-                if log:
-                    field_names = ','.join(loggable_fields)
-                    create_table_change_log_record(
-                        app_label,
-                        table_name,
-                        instance.pk,
-                        field_names,
-                        log,
-                        loggable_properties
-                    )
+            change = build_change_log(plan, instance, old_values)
+            if change is None:
                 return result
+            field_names, log, loggable_properties = change
+
+            if plan.coalesce_seconds:
+                from tablechangelogger.coalesce import (
+                    coalesce_table_change_log
+                )
+                coalesce_table_change_log(
+                    plan, instance.pk, field_names, log, loggable_properties,
+                    using=kwargs.get('using'))
+            else:
+                create_table_change_log_record(
+                    plan.app_label,
+                    plan.table_name,
+                    instance.pk,
+                    ','.join(field_names),
+                    log,
+                    loggable_properties,
+                    using=kwargs.get('using')
+                )
+            return result
         except Exception as e:
+            stats.increment('logs.failed', plan.app_label, plan.table_name)
             logger.exception(e)
     return wrapper
+
+
+async def asave_with_log(instance, asave, *args, **kwargs):
+    """
+    Saves an instance with the coroutine asave and logs its changes like
+    the log_table_change receiver does, fetching the stored values and
+    writing the log with the async ORM. Properties are evaluated on the
+    event loop, so they must not query the database.
+    """
+
+    plan = get_logging_plan(instance)
+    if plan is None or instance.pk is None:
+        return await asave(*args, **kwargs)
+
+    tags = stats.get_tags(plan.app_label, plan.table_name)
+    old_values = get_loaded_state(instance, plan)
+    if old_values is None:
+        try:
+            with stats.timer('refetch', tags=tags):
+                old_values = await afetch_tracked_values(plan, instance.pk)
+        except Exception:
+            old_values = None
+
+    setattr(instance, ASYNC_SAVE_ATTR, True)
+    try:
+        result = await asave(*args, **kwargs)
+    finally:
+        delattr(instance, ASYNC_SAVE_ATTR)
+
+    try:
+        change = build_change_log(plan, instance, old_values)
+        if change is None:
+            return result
+        field_names, log, loggable_properties = change
+
+        if plan.coalesce_seconds:
+            from tablechangelogger.coalesce import COALESCER
+            COALESCER.add(plan, instance.pk, field_names, log,
+                          loggable_properties)
+        else:
+            with stats.timer('serialize', tags=tags):
+                tcl = build_table_change_log(
+                    plan.app_label, plan.table_name, instance.pk,
+                    ','.join(field_names), log, loggable_properties)
+            await acreate_table_change_log_records([tcl])
+    except Exception as e:
+        stats.increment('logs.failed', plan.app_label, plan.table_name)
+        logger.exception(e)
+    return result
+
+
+class AsyncTableChangeLogMixin(object):
+    """
+    Model mixin logging the changes saved with asave through the async
+    logging path, see asave_with_log
+    """
+
+    async def asave(self, *args, **kwargs):
+        return await asave_with_log(self, super().asave, *args, **kwargs)
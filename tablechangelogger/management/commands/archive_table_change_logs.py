@@ -0,0 +1,98 @@
+import os
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import router, transaction
+from django.utils.dateparse import parse_datetime
+
+from tablechangelogger.archive import (
+    ArchiveWriter, get_checkpoint_name, read_checkpoint,
+    serialize_table_change_log, write_checkpoint
+)
+from tablechangelogger.models import TableChangeLogField, TableChangesLog
+
+
+class Command(BaseCommand):
+    help = ('Streams TableChangesLog records in primary key order into '
+            'rotated, gzipped NDJSON files, optionally deleting each file\'s '
+            'records once it is complete.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('directory', help='Directory of the archive files')
+        parser.add_argument('--app-label', help='Only logs of this app')
+        parser.add_argument('--table-name',
+                            help='Only logs of this model, by class name')
+        parser.add_argument('--since', type=parse_datetime,
+                            help='Only logs created at or after this time')
+        parser.add_argument('--until', type=parse_datetime,
+                            help='Only logs created before this time')
+        parser.add_argument('--chunk-size', type=int, default=2000,
+                            help='Number of records fetched at a time')
+        parser.add_argument('--max-rows', type=int, default=1000000,
+                            help='Number of records per file')
+        parser.add_argument('--checkpoint',
+                            help='Checkpoint file, defaults to one in the '
+                                 'archive directory named after the filters')
+        parser.add_argument('--delete', action='store_true',
+                            help='Delete the records of each finished file')
+
+    def get_queryset(self, options):
+        tcls = TableChangesLog.objects.all()
+        if options['app_label']:
+            tcls = tcls.filter(app_label=options['app_label'])
+        if options['table_name']:
+            tcls = tcls.filter(table_name=options['table_name'])
+        if options['since']:
+            tcls = tcls.filter(created_at__gte=options['since'])
+        if options['until']:
+            tcls = tcls.filter(created_at__lt=options['until'])
+        return tcls
+
+    def handle(self, *args, **options):
+        directory = options['directory']
+        if not os.path.isdir(directory):
+            raise CommandError('{} is not a directory'.format(directory))
+
+        prefix = 'table_change_logs'
+        if options['app_label']:
+            prefix = '{}-{}'.format(prefix, options['app_label'])
+        if options['table_name']:
+            prefix = '{}-{}'.format(prefix, options['table_name'])
+
+        checkpoint = options['checkpoint'] or os.path.join(
+            directory, get_checkpoint_name(prefix, options['since'],
+                                           options['until']))
+        last_id = read_checkpoint(checkpoint)
+        tcls = self.get_queryset(options)
+        totals = {'archived': 0, 'deleted': 0}
+
+        def finish_file(path, first_id, last_id):
+            if options['delete']:
+                # relations to logs do nothing on delete, so this is a
+                # single delete query
+                archived = tcls.filter(id__gte=first_id, id__lte=last_id)
+                with transaction.atomic(
+                        using=router.db_for_write(TableChangesLog)):
+                    TableChangeLogField.objects.filter(
+                        log__in=archived.values('id')).delete()
+                    deleted, _ = archived.delete()
+                totals['deleted'] += deleted
+            # moved once the records are deleted, a run interrupted in
+            # between archives them again and deletes them
+            write_checkpoint(checkpoint, last_id)
+            self.stdout.write('Archived {} logs to {}, deleted {}'.format(
+                totals['archived'], path, totals['deleted']))
+
+        writer = ArchiveWriter(directory, prefix, options['max_rows'],
+                               on_rotate=finish_file)
+
+        # the server-side cursor keeps a single chunk in memory and each log
+        # is only decoded as it is written
+        for tcl in tcls.filter(id__gt=last_id).order_by('id').iterator(
+                chunk_size=options['chunk_size']):
+            writer.write(serialize_table_change_log(tcl))
+            totals['archived'] += 1
+        writer.close()
+
+        self.stdout.write(self.style.SUCCESS(
+            'Archived {} logs, deleted {}'.format(
+                totals['archived'], totals['deleted'])))
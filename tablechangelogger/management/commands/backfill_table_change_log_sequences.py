@@ -0,0 +1,70 @@
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import router, transaction
+
+from tablechangelogger.backfill import number_table_change_logs
+from tablechangelogger.log_table_change import (
+    get_instances_query, get_log_key
+)
+from tablechangelogger.models import TableChangeLogHead, TableChangesLog
+
+
+class Command(BaseCommand):
+    help = ('Numbers TableChangesLog records written before sequence numbers '
+            'existed, points each to its previous record and the head of '
+            'its instance to its latest one, a chunk of instances at a '
+            'time.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--chunk-size', type=int, default=100,
+                            help='Number of instances per chunk')
+        parser.add_argument('--batch-size', type=int, default=1000,
+                            help='Number of records per update query')
+        parser.add_argument('--sleep', type=float, default=0,
+                            help='Seconds to wait between chunks')
+
+    def backfill(self, keys, batch_size):
+        instances_query = get_instances_query(keys)
+        tcls = TableChangesLog.objects.using(self.alias).filter(
+            instances_query
+        ).order_by('app_label', 'table_name', 'instance_id', 'created_at',
+                   'id').only('id', 'app_label', 'table_name', 'instance_id',
+                              'seq', 'previous')
+
+        with transaction.atomic(using=self.alias):
+            # writers of these instances wait until their heads are numbered
+            heads = {get_log_key(head): head for head in
+                     TableChangeLogHead.objects.using(self.alias).filter(
+                         instances_query).select_for_update().order_by('pk')}
+            changed_tcls, changed_heads = number_table_change_logs(
+                tcls, heads)
+
+            TableChangesLog.objects.using(self.alias).bulk_update(
+                changed_tcls, ['seq', 'previous'], batch_size=batch_size)
+            TableChangeLogHead.objects.using(self.alias).bulk_update(
+                changed_heads, ['seq', 'last_log'], batch_size=batch_size)
+        return len(changed_tcls)
+
+    def handle(self, *args, **options):
+        # read where the updates go, a replica may lag behind
+        self.alias = router.db_for_write(TableChangesLog)
+        total = 0
+
+        while True:
+            keys = list(TableChangesLog.objects.using(self.alias).filter(
+                seq__isnull=True
+            ).order_by().values_list(
+                'app_label', 'table_name', 'instance_id'
+            ).distinct()[:options['chunk_size']])
+            if not keys:
+                break
+
+            total += self.backfill(keys, options['batch_size'])
+            self.stdout.write('Numbered {} logs'.format(total))
+
+            if options['sleep']:
+                time.sleep(options['sleep'])
+
+        self.stdout.write(self.style.SUCCESS(
+            'Numbered {} logs'.format(total)))
@@ -0,0 +1,90 @@
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+from django.apps import apps
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections
+from django.db.models import Max, Min
+
+from tablechangelogger.archive import read_checkpoint, write_checkpoint
+from tablechangelogger.backfill import (
+    ChunkProgress, backfill_chunk, get_chunks, setup_worker
+)
+from tablechangelogger.registry import LOGGING_PLANS
+
+
+class Command(BaseCommand):
+    help = ('Writes a baseline log of the current values of every instance '
+            'of a loggable model that has no log yet, a primary key range '
+            'at a time, across a pool of processes.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('model', help='Model as app_label.ModelName')
+        parser.add_argument('--chunk-size', type=int, default=5000,
+                            help='Number of primary keys per chunk')
+        parser.add_argument('--workers', type=int, default=os.cpu_count(),
+                            help='Number of processes, 1 runs in this one')
+        parser.add_argument('--checkpoint',
+                            help='Checkpoint file, defaults to '
+                                 'backfill-<app_label>.<ModelName>.json')
+        parser.add_argument('--restart', action='store_true',
+                            help='Ignore the checkpoint and start over')
+
+    def handle(self, *args, **options):
+        try:
+            model = apps.get_model(options['model'])
+        except (LookupError, ValueError):
+            raise CommandError('Unknown model {}'.format(options['model']))
+        if model not in LOGGING_PLANS:
+            raise CommandError('{} is not loggable'.format(options['model']))
+
+        app_label, model_name = model._meta.app_label, model.__name__
+        checkpoint = options['checkpoint'] or 'backfill-{}.{}.json'.format(
+            app_label, model_name)
+        last_id = 0 if options['restart'] else read_checkpoint(checkpoint)
+
+        bounds = model._base_manager.filter(pk__gt=last_id).aggregate(
+            first=Min('pk'), last=Max('pk'))
+        chunks = get_chunks(bounds['first'], bounds['last'],
+                            options['chunk_size'])
+        progress = ChunkProgress(chunks)
+        totals = {'read': 0, 'written': 0, 'done': last_id}
+        started = time.monotonic()
+
+        def finish(start, read, written):
+            totals['read'] += read
+            totals['written'] += written
+            done = progress.finish(start)
+            if done is not None:
+                totals['done'] = done - 1
+                write_checkpoint(checkpoint, totals['done'])
+            elapsed = max(time.monotonic() - started, 1e-6)
+            self.stdout.write(
+                'Read {} rows, wrote {} logs, {:.0f} rows/s, {:.0f} logs/s, '
+                'done up to id {}'.format(
+                    totals['read'], totals['written'],
+                    totals['read'] / elapsed, totals['written'] / elapsed,
+                    totals['done']))
+
+        if options['workers'] <= 1:
+            for start, end in chunks:
+                finish(start, *backfill_chunk(app_label, model_name, start,
+                                              end))
+        else:
+            # forked workers must open connections of their own
+            connections.close_all()
+            with ProcessPoolExecutor(max_workers=options['workers'],
+                                     initializer=setup_worker) as executor:
+                futures = {
+                    executor.submit(backfill_chunk, app_label, model_name,
+                                    start, end): start
+                    for start, end in chunks
+                }
+                for future in as_completed(futures):
+                    finish(futures[future], *future.result())
+
+        self.stdout.write(self.style.SUCCESS(
+            'Read {} rows, wrote {} logs in {:.0f}s'.format(
+                totals['read'], totals['written'],
+                time.monotonic() - started)))
@@ -0,0 +1,125 @@
+import fcntl
+import logging
+import os
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections, router, transaction
+
+from tablechangelogger.config import SPOOL_DIRECTORY
+from tablechangelogger.log_table_change import write_table_change_logs
+from tablechangelogger.models import (
+    TableChangeLogSpoolSegment, TableChangesLog)
+from tablechangelogger.spool import (
+    copy_table_change_logs, decode_entry, get_segment_id, get_segments,
+    is_sealed, read_records)
+
+logger = logging.getLogger(__name__)
+
+
+class Command(BaseCommand):
+    help = ('Loads the logs appended to the spool into the database and '
+            'deletes the segments that are fully loaded. Run a single '
+            'drainer per spool directory.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--directory', default=SPOOL_DIRECTORY,
+                            help='Spool directory, defaults to '
+                                 'SPOOL_DIRECTORY')
+        parser.add_argument('--batch-size', type=int, default=1000,
+                            help='Number of records read from each segment '
+                                 'per transaction')
+        parser.add_argument('--sleep', type=float, default=1,
+                            help='Seconds to wait when the spool is empty')
+        parser.add_argument('--once', action='store_true',
+                            help='Exit once the spool is empty')
+        parser.add_argument('--no-copy', action='store_true',
+                            help='Insert with bulk_create instead of COPY')
+
+    def drain(self, directory, alias, insert, batch_size):
+        names = get_segments(directory)
+        # decided before reading, a sealed segment read to its end is done
+        sealed = [name for name in names if is_sealed(name)]
+        offsets = dict(TableChangeLogSpoolSegment.objects.using(alias).filter(
+            segment__in=[get_segment_id(name) for name in names]
+        ).values_list('segment', 'offset'))
+
+        payloads = []
+        ends = {}
+        for name in names:
+            segment = get_segment_id(name)
+            try:
+                records, end = read_records(
+                    os.path.join(directory, name), offsets.get(segment, 0),
+                    batch_size)
+            except FileNotFoundError:
+                # sealed since it was listed, read on the next round
+                continue
+            if records:
+                payloads.extend(records)
+                ends[segment] = end
+
+        # logs of an instance spooled by different processes are written
+        # in the order they were spooled
+        tcls = sorted(map(decode_entry, payloads),
+                      key=lambda tcl: tcl.created_at)
+        if tcls:
+            with transaction.atomic(using=alias):
+                write_table_change_logs(tcls, insert=insert)
+                for segment, end in ends.items():
+                    TableChangeLogSpoolSegment.objects.using(
+                        alias).update_or_create(
+                        segment=segment, defaults={'offset': end})
+
+        for name in sealed:
+            segment = get_segment_id(name)
+            offset = ends.get(segment, offsets.get(segment, 0))
+            path = os.path.join(directory, name)
+            if offset < os.path.getsize(path):
+                if segment not in ends:
+                    logger.warning('Segment {} has an unreadable record at '
+                                   'offset {}'.format(name, offset))
+                continue
+            # the file goes first, a leftover offset is harmless while a
+            # leftover file without its offset would be loaded again
+            os.remove(path)
+            TableChangeLogSpoolSegment.objects.using(alias).filter(
+                segment=segment).delete()
+
+        return len(tcls)
+
+    def handle(self, *args, **options):
+        directory = options['directory']
+        if not directory or not os.path.isdir(directory):
+            raise CommandError('Set SPOOL_DIRECTORY or --directory to an '
+                               'existing directory')
+
+        lock = open(os.path.join(directory, '.drain.lock'), 'w')
+        try:
+            fcntl.flock(lock, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            raise CommandError('Another drainer is running on {}'.format(
+                directory))
+
+        alias = router.db_for_write(TableChangesLog)
+        insert = None
+        if not options['no_copy'] and \
+                connections[alias].vendor == 'postgresql':
+            insert = copy_table_change_logs
+
+        total = 0
+        while True:
+            started = time.monotonic()
+            drained = self.drain(directory, alias, insert,
+                                 options['batch_size'])
+            if drained:
+                total += drained
+                self.stdout.write('Drained {} logs, {:.0f} logs/s'.format(
+                    total, drained / max(time.monotonic() - started, 1e-6)))
+            elif options['once']:
+                break
+            else:
+                time.sleep(options['sleep'])
+
+        self.stdout.write(self.style.SUCCESS(
+            'Drained {} logs'.format(total)))
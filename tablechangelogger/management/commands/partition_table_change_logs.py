@@ -0,0 +1,111 @@
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections, router, transaction
+from django.db.models import Max
+from django.utils import timezone
+
+from tablechangelogger.config import PARTITION_MONTHS_AHEAD, RETENTION_DAYS
+from tablechangelogger.models import TableChangeLogField, TableChangesLog
+from tablechangelogger.partitions import (
+    add_months, get_convert_prepare_sql, get_convert_sql,
+    get_create_partition_sql, get_expired_partitions, get_indexes,
+    get_month_start, get_partitions, get_remove_partition_sql,
+    get_serial_sequence, is_partitioned
+)
+
+
+class Command(BaseCommand):
+    help = ('Creates the monthly partitions of the TableChangesLog table '
+            'ahead of time and drops the partitions past retention. With '
+            '--convert, partitions the table by created_at first.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--convert', action='store_true',
+                            help='Partition the table, keeping its rows in '
+                                 'a legacy partition')
+        parser.add_argument('--months-ahead', type=int,
+                            default=PARTITION_MONTHS_AHEAD,
+                            help='Number of future monthly partitions')
+        parser.add_argument('--retention-days', type=int,
+                            default=RETENTION_DAYS,
+                            help='Drop partitions older than this many days')
+        parser.add_argument('--detach', action='store_true',
+                            help='Detach expired partitions instead of '
+                                 'dropping them')
+        parser.add_argument('--dry-run', action='store_true',
+                            help='Print the statements without running them')
+
+    def execute_sql(self, cursor, statements, dry_run):
+        for statement in statements:
+            self.stdout.write(statement)
+            if not dry_run:
+                cursor.execute(statement)
+
+    def convert(self, connection, table, dry_run):
+        # every existing row goes to the legacy partition
+        latest = TableChangesLog.objects.using(connection.alias).aggregate(
+            latest=Max('created_at'))['latest'] or timezone.now()
+        first_month = add_months(get_month_start(latest), 1)
+
+        # outside a transaction, the indexes are built concurrently
+        with connection.cursor() as cursor:
+            if is_partitioned(cursor, table):
+                raise CommandError('{} is already partitioned'.format(table))
+            self.execute_sql(
+                cursor,
+                get_convert_prepare_sql(connection, table, first_month),
+                dry_run)
+
+        with transaction.atomic(using=connection.alias), \
+                connection.cursor() as cursor:
+            self.execute_sql(cursor, get_convert_sql(
+                connection, table, first_month, get_indexes(cursor, table),
+                get_serial_sequence(cursor, table)), dry_run)
+        return first_month
+
+    def handle(self, *args, **options):
+        alias = router.db_for_write(TableChangesLog)
+        connection = connections[alias]
+        if connection.vendor != 'postgresql':
+            raise CommandError('Partitioning needs PostgreSQL, use '
+                               'prune_table_change_logs instead')
+
+        table = TableChangesLog._meta.db_table
+        dry_run = options['dry_run']
+        now = timezone.now()
+        first_month = get_month_start(now)
+
+        if options['convert']:
+            first_month = max(first_month, self.convert(
+                connection, table, dry_run))
+
+        with transaction.atomic(using=alias), connection.cursor() as cursor:
+            if not options['convert'] and not is_partitioned(cursor, table):
+                raise CommandError('{} is not partitioned, run with '
+                                   '--convert first'.format(table))
+
+            months = [add_months(first_month, count)
+                      for count in range(options['months_ahead'] + 1)]
+            self.execute_sql(cursor, [
+                get_create_partition_sql(connection, table, month)
+                for month in months
+            ], dry_run)
+
+            expired = []
+            if options['retention_days'] is not None:
+                cutoff = now - timedelta(days=options['retention_days'])
+                expired = get_expired_partitions(
+                    table, get_partitions(cursor, table), cutoff)
+
+        # a partition at a time, each along with its field rows
+        for name in expired:
+            with transaction.atomic(using=alias), \
+                    connection.cursor() as cursor:
+                self.execute_sql(cursor, get_remove_partition_sql(
+                    connection, table, TableChangeLogField._meta.db_table,
+                    name, detach=options['detach']), dry_run)
+
+        self.stdout.write(self.style.SUCCESS(
+            'Created {} partitions, removed {} expired partitions'.format(
+                len(months), len(expired))))
@@ -0,0 +1,64 @@
+import time
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import router
+from django.db.models import Max, Min
+from django.utils import timezone
+
+from tablechangelogger.config import RETENTION_DAYS
+from tablechangelogger.models import (
+    TableChangeLogCheckpoint, TableChangeLogField, TableChangesLog)
+
+
+class Command(BaseCommand):
+    help = ('Deletes TableChangesLog records older than the retention, a '
+            'range of primary keys at a time, for tables that are not '
+            'partitioned.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--retention-days', type=int,
+                            default=RETENTION_DAYS,
+                            help='Delete records older than this many days')
+        parser.add_argument('--chunk-size', type=int, default=10000,
+                            help='Number of primary keys per delete query')
+        parser.add_argument('--sleep', type=float, default=0,
+                            help='Seconds to wait between chunks')
+
+    def handle(self, *args, **options):
+        if options['retention_days'] is None:
+            raise CommandError('Set RETENTION_DAYS or --retention-days')
+
+        cutoff = timezone.now() - timedelta(days=options['retention_days'])
+        alias = router.db_for_write(TableChangesLog)
+        expired = TableChangesLog.objects.using(alias).filter(
+            created_at__lt=cutoff)
+        bounds = expired.aggregate(first=Min('id'), last=Max('id'))
+        if bounds['first'] is None:
+            self.stdout.write(self.style.SUCCESS('Deleted 0 logs'))
+            return
+
+        total = 0
+        start = bounds['first']
+        while start <= bounds['last']:
+            end = start + options['chunk_size']
+            # relations to logs do nothing on delete, so each chunk is a
+            # single delete query
+            deleted, _ = expired.filter(id__gte=start, id__lt=end).delete()
+            TableChangeLogField.objects.using(alias).filter(
+                log_id__gte=start, log_id__lt=end, created_at__lt=cutoff
+            ).delete()
+            TableChangeLogCheckpoint.objects.using(alias).filter(
+                last_log_id__gte=start, last_log_id__lt=end,
+                created_at__lt=cutoff
+            ).delete()
+            total += deleted
+            self.stdout.write('Deleted {} logs, up to id {}'.format(
+                total, end - 1))
+            start = end
+
+            if options['sleep']:
+                time.sleep(options['sleep'])
+
+        self.stdout.write(self.style.SUCCESS(
+            'Deleted {} logs'.format(total)))
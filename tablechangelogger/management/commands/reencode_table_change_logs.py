@@ -0,0 +1,54 @@
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import router
+
+from tablechangelogger.codec import LEGACY_LOG_PREFIX
+from tablechangelogger.datastructures import Logged
+from tablechangelogger.models import TableChangesLog
+
+
+class Command(BaseCommand):
+    help = ('Re-encodes TableChangesLog records stored in the legacy log '
+            'format, one primary key range at a time.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--chunk-size', type=int, default=1000)
+        parser.add_argument('--sleep', type=float, default=0,
+                            help='Seconds to wait between chunks')
+        parser.add_argument('--start-id', type=int, default=0,
+                            help='Resume after this primary key')
+
+    def handle(self, *args, **options):
+        # read where the updates go, a replica may lag behind
+        self.alias = router.db_for_write(TableChangesLog)
+        chunk_size = options['chunk_size']
+        last_id = options['start_id']
+        total = 0
+
+        while True:
+            ids = list(TableChangesLog.objects.using(self.alias).filter(
+                pk__gt=last_id).order_by('pk').values_list(
+                'pk', flat=True)[:chunk_size])
+            if not ids:
+                break
+
+            tcls = list(TableChangesLog.objects.using(self.alias).filter(
+                pk__in=ids, log__startswith=LEGACY_LOG_PREFIX
+            ).only('pk', 'log'))
+            for tcl in tcls:
+                tcl.log = Logged(changes=tcl.log.changes,
+                                 created=tcl.log.created)
+            TableChangesLog.objects.using(self.alias).bulk_update(
+                tcls, ['log'])
+
+            total += len(tcls)
+            last_id = ids[-1]
+            self.stdout.write('Re-encoded {} logs, up to id {}'.format(
+                total, last_id))
+
+            if options['sleep']:
+                time.sleep(options['sleep'])
+
+        self.stdout.write(self.style.SUCCESS(
+            'Re-encoded {} logs'.format(total)))
@@ -0,0 +1,80 @@
+import time
+import traceback
+
+from django.core.management.base import BaseCommand
+from django.db import router, transaction
+from django.db.models import F
+from django.db.models.functions import Mod
+
+from tablechangelogger.callbacks import (
+    get_log_plan, run_table_change_log_callback)
+from tablechangelogger.models import TableChangeLogCallback, TableChangesLog
+
+
+class Command(BaseCommand):
+    help = ('Runs the callbacks queued when CALLBACK_MODE is "queue". '
+            'Callbacks of the same instance run in the order they were '
+            'queued; run one worker per shard to spread the load.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=100)
+        parser.add_argument('--sleep', type=float, default=1,
+                            help='Seconds to wait when the queue is empty')
+        parser.add_argument('--max-attempts', type=int, default=5)
+        parser.add_argument('--shards', type=int, default=1)
+        parser.add_argument('--shard', type=int, default=0,
+                            help='Handle instances whose id modulo --shards '
+                                 'equals this value')
+        parser.add_argument('--once', action='store_true',
+                            help='Exit once the queue is empty')
+
+    def get_queryset(self, options):
+        queryset = TableChangeLogCallback.objects.using(self.alias).filter(
+            attempts__lt=options['max_attempts'])
+        if options['shards'] > 1:
+            queryset = queryset.annotate(
+                shard=Mod(F('instance_id'), options['shards'])
+            ).filter(shard=options['shard'])
+        return queryset.order_by('id')
+
+    def run_batch(self, options):
+        with transaction.atomic(using=self.alias):
+            jobs = list(self.get_queryset(options).select_for_update(
+                skip_locked=True)[:options['batch_size']])
+            tcls = TableChangesLog.objects.using(self.alias).in_bulk(
+                [job.log_id for job in jobs])
+            failed_instances = set()
+
+            for job in jobs:
+                key = (job.app_label, job.table_name, job.instance_id)
+                # keep the order of the instance until the failed job passes
+                if key in failed_instances:
+                    continue
+
+                tcl = tcls.get(job.log_id)
+                plan = get_log_plan(tcl) if tcl is not None else None
+                try:
+                    if plan is not None and plan.callback is not None:
+                        with transaction.atomic(using=self.alias):
+                            run_table_change_log_callback(tcl, plan.callback)
+                except Exception:
+                    failed_instances.add(key)
+                    job.attempts += 1
+                    job.error = traceback.format_exc()
+                    job.save(update_fields=['attempts', 'error'])
+                else:
+                    job.delete()
+
+        return len(jobs)
+
+    def handle(self, *args, **options):
+        # the jobs are locked where they are written, not on a replica
+        self.alias = router.db_for_write(TableChangeLogCallback)
+        while True:
+            processed = self.run_batch(options)
+            if processed:
+                self.stdout.write('Processed {} callbacks'.format(processed))
+                continue
+            if options['once']:
+                break
+            time.sleep(options['sleep'])
@@ -0,0 +1,220 @@
+import threading
+
+from django.db import models, transaction
+
+from tablechangelogger.config import TABLE_CHANGE_LOG_ENABLED
+from tablechangelogger.diff import get_changed_fields
+from tablechangelogger.history import (
+    HISTORY_PAGE_SIZE, get_change_history_page, get_change_history_queryset,
+    get_states_as_of, iter_change_history
+)
+from tablechangelogger.log_table_change import (
+    LOADED_STATE_ATTR, build_initial_table_change_log, build_table_change_log,
+    create_log_object, create_table_change_log_records, get_tracked_values)
+from tablechangelogger.registry import LOGGING_PLANS
+
+# set while bulk_update runs, the update queries it issues are logged by it
+_local = threading.local()
+
+
+def build_update_logs(plan, old_rows, new_rows, properties=None):
+    """
+    Diffs the loggable field values of many instances in memory and returns
+    an unsaved TableChangesLog record for each instance with changes.
+
+    Arguments:
+        plan: <LoggingPlan> The plan of the updated model
+        old_rows: <dict> Field values before the update, mapped by pk
+        new_rows: <dict> Field values after the update, mapped by pk
+        properties: <dict|optional> Instances to read the loggable
+        properties of, mapped by pk
+    """
+
+    tcls = []
+    for pk, new_values in new_rows.items():
+        old_values = old_rows.get(pk)
+        if old_values is None:
+            continue
+
+        changed_fields = get_changed_fields(old_values, new_values,
+                                            plan.comparators)
+        loggable_fields = [name for name in plan.fields
+                           if name in changed_fields]
+
+        instance = properties.get(pk) if properties else None
+        loggable_properties = (plan.get_loggable_properties(changed_fields)
+                               if instance is not None else [])
+        # properties with dependencies are only logged when those changed
+        if not loggable_fields and not any(
+                name in plan.property_dependencies
+                for name in loggable_properties):
+            continue
+
+        loggable_fields = loggable_fields + loggable_properties
+        log = create_log_object(loggable_fields, instance,
+                                old_values=old_values, new_values=new_values)
+        tcls.append(build_table_change_log(
+            plan.app_label, plan.table_name, pk, ','.join(loggable_fields),
+            log, loggable_properties))
+    return tcls
+
+
+class TableChangeLogQuerySet(models.QuerySet):
+    """
+    A QuerySet logging the changes made by update, bulk_update and
+    bulk_create, which do not send the signals saving instances does.
+    The values before the change are fetched and locked with a single query
+    and all logs are written at once.
+    """
+
+    def get_logging_plan(self):
+        if not TABLE_CHANGE_LOG_ENABLED:
+            return None
+        return LOGGING_PLANS.get(self.model)
+
+    def get_tracked_rows(self, queryset, plan, field_names):
+        attnames = [plan.field_attnames[name] for name in field_names]
+        return {
+            row[0]: dict(zip(field_names, row[1:]))
+            for row in queryset.values_list('pk', *attnames)
+        }
+
+    def lock_tracked_rows(self, queryset, plan, field_names):
+        """
+        Fetches the tracked values of rows about to be updated, locked until
+        the update commits, so a concurrent change cannot slip in between
+        and be logged twice or not at all
+        """
+        return self.get_tracked_rows(
+            queryset.select_for_update(of=('self', )).order_by('pk'), plan,
+            field_names)
+
+    def get_update_values(self, plan, field_names, kwargs):
+        """
+        Returns the raw values update sets, or None if some of them are
+        expressions only known once the update is applied
+        """
+
+        values = {}
+        for name in field_names:
+            attname = plan.field_attnames[name]
+            value = kwargs[name] if name in kwargs else kwargs[attname]
+            if hasattr(value, 'resolve_expression'):
+                return None
+            if isinstance(value, models.Model):
+                value = value.pk
+            values[name] = self.model._meta.get_field(name).to_python(value)
+        return values
+
+    def update(self, **kwargs):
+        plan = None if getattr(_local, 'bulk_updating', False) else \
+            self.get_logging_plan()
+        field_names = [
+            name for name, attname in plan.field_attnames.items()
+            if name in kwargs or attname in kwargs
+        ] if plan else []
+
+        if not field_names:
+            return super().update(**kwargs)
+
+        with transaction.atomic(using=self.db):
+            old_rows = self.lock_tracked_rows(self, plan, field_names)
+            rows = super().update(**kwargs)
+            values = self.get_update_values(plan, field_names, kwargs)
+            if values is not None:
+                new_rows = {pk: values for pk in old_rows}
+            else:
+                # expressions such as F() are read back once applied
+                new_rows = self.get_tracked_rows(
+                    self.model._base_manager.using(self.db).filter(
+                        pk__in=list(old_rows)), plan, field_names)
+            create_table_change_log_records(
+                build_update_logs(plan, old_rows, new_rows), using=self.db)
+
+        return rows
+
+    update.alters_data = True
+
+    def bulk_update(self, objs, fields, batch_size=None):
+        plan = self.get_logging_plan()
+        field_names = [name for name in plan.field_attnames
+                       if name in fields] if plan else []
+
+        if not field_names:
+            return super().bulk_update(objs, fields, batch_size=batch_size)
+
+        objs = list(objs)
+        instances = {obj.pk: obj for obj in objs}
+        with transaction.atomic(using=self.db):
+            old_rows = self.lock_tracked_rows(
+                self.model._base_manager.using(self.db).filter(
+                    pk__in=list(instances)), plan, field_names)
+            # Django runs an update per batch, logged here rather than there
+            _local.bulk_updating = True
+            try:
+                rows = super().bulk_update(objs, fields,
+                                           batch_size=batch_size)
+            finally:
+                _local.bulk_updating = False
+            new_rows = {pk: get_tracked_values(obj, plan, field_names)
+                        for pk, obj in instances.items()}
+            # the updated fields of objs now match their rows
+            for obj in objs:
+                loaded_state = getattr(obj, LOADED_STATE_ATTR, None)
+                if loaded_state is not None:
+                    loaded_state.update(
+                        get_tracked_values(obj, plan, field_names))
+            create_table_change_log_records(
+                build_update_logs(plan, old_rows, new_rows, instances),
+                using=self.db)
+
+        return rows
+
+    bulk_update.alters_data = True
+
+    def bulk_create(self, objs, *args, **kwargs):
+        plan = self.get_logging_plan()
+        if plan is None:
+            return super().bulk_create(objs, *args, **kwargs)
+
+        with transaction.atomic(using=self.db):
+            objs = super().bulk_create(objs, *args, **kwargs)
+            # only databases returning primary keys can be logged
+            tcls = [build_initial_table_change_log(obj, plan)
+                    for obj in objs if obj.pk is not None]
+            create_table_change_log_records(
+                [tcl for tcl in tcls if tcl is not None], using=self.db)
+
+        return objs
+
+    bulk_create.alters_data = True
+
+    def get_states_as_of(self, timestamp):
+        """
+        Logged values of the instances in this QuerySet as they were at
+        timestamp, mapped by pk
+        """
+        return get_states_as_of(self.model, self.values_list('pk', flat=True),
+                                timestamp)
+
+    def get_change_history_queryset(self, **filters):
+        # a filtered QuerySet only covers the logs of its own instances
+        instances = self if self.query.has_filters() else None
+        return get_change_history_queryset(self.model, instances=instances,
+                                           **filters)
+
+    def change_history(self, cursor=None, chunk_size=HISTORY_PAGE_SIZE,
+                       ascending=False, **filters):
+        """Streams the logs of the instances in this QuerySet"""
+        return iter_change_history(
+            self.get_change_history_queryset(**filters), cursor, chunk_size,
+            ascending)
+
+    def get_change_history_page(self, cursor=None, limit=HISTORY_PAGE_SIZE,
+                                ascending=False, **filters):
+        return get_change_history_page(
+            self.get_change_history_queryset(**filters), cursor, limit,
+            ascending)
+
+
+TableChangeLogManager = models.Manager.from_queryset(TableChangeLogQuerySet)
@@ -0,0 +1,30 @@
+# -*- coding: utf-8 -*-
+# Generated by Django 1.11.3 on 2026-10-18 09:00
+from __future__ import unicode_literals
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('tablechangelogger', '0006_auto_20191008_0813'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='tablechangeslog',
+            name='previous',
+            field=models.ForeignKey(blank=True, db_constraint=False, null=True, on_delete=django.db.models.deletion.DO_NOTHING, related_name='+', to='tablechangelogger.TableChangesLog'),
+        ),
+        migrations.AddField(
+            model_name='tablechangeslog',
+            name='seq',
+            field=models.PositiveIntegerField(blank=True, null=True),
+        ),
+        migrations.AddIndex(
+            model_name='tablechangeslog',
+            index=models.Index(fields=['app_label', 'table_name', 'instance_id', 'seq'], name='tcl_instance_seq_idx'),
+        ),
+    ]
@@ -0,0 +1,36 @@
+# -*- coding: utf-8 -*-
+# Generated by Django 1.11.3 on 2026-10-18 10:00
+from __future__ import unicode_literals
+
+import django.contrib.postgres.fields.jsonb
+from django.db import migrations, models
+import django.db.models.deletion
+import tablechangelogger.fields
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('tablechangelogger', '0007_auto_20261018_0900'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='TableChangeLogHead',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('app_label', models.CharField(max_length=255)),
+                ('table_name', models.CharField(max_length=255)),
+                ('instance_id', models.IntegerField()),
+                ('log', tablechangelogger.fields.LoggedField(max_length=10485000, null=True)),
+                ('property_unique_ids', django.contrib.postgres.fields.jsonb.JSONField(blank=True, default=dict, null=True)),
+                ('seq', models.PositiveIntegerField(blank=True, null=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('last_log', models.ForeignKey(blank=True, db_constraint=False, null=True, on_delete=django.db.models.deletion.DO_NOTHING, related_name='+', to='tablechangelogger.TableChangesLog')),
+            ],
+        ),
+        migrations.AlterUniqueTogether(
+            name='tablechangeloghead',
+            unique_together=set([('app_label', 'table_name', 'instance_id')]),
+        ),
+    ]
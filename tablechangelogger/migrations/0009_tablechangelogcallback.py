@@ -0,0 +1,29 @@
+# -*- coding: utf-8 -*-
+# Generated by Django 1.11.3 on 2026-10-18 11:00
+from __future__ import unicode_literals
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('tablechangelogger', '0008_tablechangeloghead'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='TableChangeLogCallback',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('app_label', models.CharField(max_length=255)),
+                ('table_name', models.CharField(max_length=255)),
+                ('instance_id', models.IntegerField()),
+                ('attempts', models.PositiveIntegerField(default=0)),
+                ('error', models.TextField(blank=True, default='')),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('log', models.ForeignKey(db_constraint=False, on_delete=django.db.models.deletion.DO_NOTHING, related_name='+', to='tablechangelogger.TableChangesLog')),
+            ],
+        ),
+    ]
@@ -0,0 +1,34 @@
+# -*- coding: utf-8 -*-
+# Generated by Django 1.11.3 on 2026-10-18 12:00
+from __future__ import unicode_literals
+
+from django.db import migrations, models
+import django.db.models.deletion
+import tablechangelogger.fields
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('tablechangelogger', '0009_tablechangelogcallback'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='TableChangeLogCheckpoint',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('app_label', models.CharField(max_length=255)),
+                ('table_name', models.CharField(max_length=255)),
+                ('instance_id', models.IntegerField()),
+                ('log', tablechangelogger.fields.LoggedField(max_length=10485000, null=True)),
+                ('seq', models.PositiveIntegerField()),
+                ('created_at', models.DateTimeField()),
+                ('last_log', models.ForeignKey(db_constraint=False, on_delete=django.db.models.deletion.DO_NOTHING, related_name='+', to='tablechangelogger.TableChangesLog')),
+            ],
+        ),
+        migrations.AddIndex(
+            model_name='tablechangelogcheckpoint',
+            index=models.Index(fields=['app_label', 'table_name', 'instance_id', 'created_at'], name='tcl_checkpoint_instance_idx'),
+        ),
+    ]
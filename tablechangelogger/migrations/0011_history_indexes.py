@@ -0,0 +1,23 @@
+# -*- coding: utf-8 -*-
+# Generated by Django 1.11.3 on 2026-10-18 13:00
+from __future__ import unicode_literals
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('tablechangelogger', '0010_tablechangelogcheckpoint'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='tablechangeslog',
+            index=models.Index(fields=['app_label', 'table_name', 'instance_id', 'created_at', 'id'], name='tcl_instance_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='tablechangeslog',
+            index=models.Index(fields=['app_label', 'table_name', 'created_at', 'id'], name='tcl_model_created_idx'),
+        ),
+    ]
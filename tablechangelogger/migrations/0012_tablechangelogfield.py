@@ -0,0 +1,41 @@
+# -*- coding: utf-8 -*-
+# Generated by Django 1.11.3 on 2026-10-18 14:00
+from __future__ import unicode_literals
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('tablechangelogger', '0011_history_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='TableChangeLogField',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('app_label', models.CharField(max_length=255)),
+                ('table_name', models.CharField(max_length=255)),
+                ('instance_id', models.IntegerField()),
+                ('field_name', models.CharField(max_length=255)),
+                ('new_value', models.CharField(blank=True, max_length=255, null=True)),
+                ('created_at', models.DateTimeField()),
+                ('log', models.ForeignKey(db_constraint=False, on_delete=django.db.models.deletion.DO_NOTHING, related_name='field_rows', to='tablechangelogger.TableChangesLog')),
+            ],
+        ),
+        migrations.AddIndex(
+            model_name='tablechangelogfield',
+            index=models.Index(fields=['app_label', 'table_name', 'field_name', 'created_at'], name='tcl_field_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='tablechangelogfield',
+            index=models.Index(fields=['app_label', 'table_name', 'field_name', 'new_value'], name='tcl_field_value_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='tablechangelogfield',
+            index=models.Index(fields=['table_name', 'instance_id', 'field_name', 'created_at'], name='tcl_field_instance_idx'),
+        ),
+    ]
@@ -0,0 +1,40 @@
+# -*- coding: utf-8 -*-
+# Generated by Django 1.11.3 on 2026-10-18 16:00
+from __future__ import unicode_literals
+
+from django.db import migrations
+
+try:
+    from django.db.models import JSONField
+except ImportError:  # Django < 3.1, the field stays as it is
+    from django.contrib.postgres.fields import JSONField
+
+
+class Migration(migrations.Migration):
+    """
+    Moves the JSON fields to the JSONField of django.db.models, the one
+    models.py uses where it exists. Both are jsonb columns on PostgreSQL,
+    so the database is left untouched.
+    """
+
+    dependencies = [
+        ('tablechangelogger', '0013_tablechangelogspoolsegment'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='tablechangeslog',
+            name='details',
+            field=JSONField(blank=True, default=dict, null=True),
+        ),
+        migrations.AlterField(
+            model_name='tablechangeslog',
+            name='property_unique_ids',
+            field=JSONField(blank=True, default=dict, null=True),
+        ),
+        migrations.AlterField(
+            model_name='tablechangeloghead',
+            name='property_unique_ids',
+            field=JSONField(blank=True, default=dict, null=True),
+        ),
+    ]
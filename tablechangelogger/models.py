@@ -1,16 +1,15 @@
 from django.contrib.gis.db import models
-from django.contrib.postgres.fields import JSONField
 from django.db.models.signals import post_save
 from django.dispatch import receiver
-from django.apps import apps
-from django.utils.module_loading import import_string
 
+try:
+    from django.db.models import JSONField
+except ImportError:  # Django < 3.1
+    from django.contrib.postgres.fields import JSONField
+
+from tablechangelogger.callbacks import dispatch_table_change_log_callback
 from tablechangelogger.config import TABLE_CHANGE_LOG_ENABLED
 from tablechangelogger.fields import LoggedField
-from tablechangelogger.log_table_change import (
-    get_notifiable_table_change_fields,
-    get_table_change_log_config
-)
 
 if TABLE_CHANGE_LOG_ENABLED:
     from tablechangelogger.signals import *  # noqa
@@ -28,39 +27,165 @@ class TableChangesLog(models.Model):
     property_unique_ids = JSONField(default=dict, null=True, blank=True)
     is_notified = models.BooleanField(default=False)
     details = JSONField(default=dict, null=True, blank=True)
+    # previous log of the same instance and the position of this log in the
+    # history of the instance, both assigned when the log is written
+    previous = models.ForeignKey('self', null=True, blank=True,
+                                 related_name='+', db_constraint=False,
+                                 on_delete=models.DO_NOTHING)
+    seq = models.PositiveIntegerField(null=True, blank=True)
 
     class Meta:
         index_together = (('table_name', 'instance_id'))
+        indexes = [
+            models.Index(fields=['app_label', 'table_name', 'instance_id',
+                                 'seq'], name='tcl_instance_seq_idx'),
+            # keyset pagination of change history
+            models.Index(fields=['app_label', 'table_name', 'instance_id',
+                                 'created_at', 'id'],
+                         name='tcl_instance_created_idx'),
+            models.Index(fields=['app_label', 'table_name', 'created_at',
+                                 'id'], name='tcl_model_created_idx'),
+        ]
 
     def __str__(self):
         return '{}_{}'.format(self.table_name, self.instance_id)
 
     @property
     def previous_log(self):
-        return self._meta.model.objects.order_by('created_at').filter(
-            instance_id=self.instance_id,
-            table_name=self.table_name,
-            app_label=self.app_label,
-            created_at__lte=self.created_at
-        ).exclude(id=self.id).last()
+        if self.previous_id is not None:
+            try:
+                return self.previous
+            except TableChangesLog.DoesNotExist:
+                return None
+
+        # numbered logs without a previous one are the first of their instance
+        if self.seq is not None:
+            return None
+
+        # logs written before pointers existed search the history once
+        if not hasattr(self, '_previous_log_cache'):
+            self._previous_log_cache = self._meta.model.objects.using(
+                self._state.db).order_by('created_at').filter(
+                instance_id=self.instance_id,
+                table_name=self.table_name,
+                app_label=self.app_label,
+                created_at__lte=self.created_at
+            ).exclude(id=self.id).last()
+        return self._previous_log_cache
+
+
+class TableChangeLogHead(models.Model):
+    """
+    The latest logged value of every field of an instance, updated along
+    with each TableChangesLog record of that instance.
+    """
+    app_label = models.CharField(max_length=255)
+    table_name = models.CharField(max_length=255)
+    instance_id = models.IntegerField()
+    log = LoggedField(max_length=10485000, null=True)
+    property_unique_ids = JSONField(default=dict, null=True, blank=True)
+    last_log = models.ForeignKey(TableChangesLog, null=True, blank=True,
+                                 related_name='+', db_constraint=False,
+                                 on_delete=models.DO_NOTHING)
+    seq = models.PositiveIntegerField(null=True, blank=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        unique_together = (('app_label', 'table_name', 'instance_id'), )
+
+    def __str__(self):
+        return '{}_{}'.format(self.table_name, self.instance_id)
+
+
+class TableChangeLogCheckpoint(models.Model):
+    """
+    The logged value of every field of an instance as of one of its logs,
+    written every CHECKPOINT_INTERVAL logs of the instance.
+    """
+    app_label = models.CharField(max_length=255)
+    table_name = models.CharField(max_length=255)
+    instance_id = models.IntegerField()
+    log = LoggedField(max_length=10485000, null=True)
+    last_log = models.ForeignKey(TableChangesLog, related_name='+',
+                                 db_constraint=False,
+                                 on_delete=models.DO_NOTHING)
+    seq = models.PositiveIntegerField()
+    # creation time of last_log
+    created_at = models.DateTimeField()
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['app_label', 'table_name', 'instance_id',
+                                 'created_at'],
+                         name='tcl_checkpoint_instance_idx'),
+        ]
+
+    def __str__(self):
+        return '{}_{}_{}'.format(self.table_name, self.instance_id, self.seq)
+
+
+class TableChangeLogField(models.Model):
+    """
+    A field logged by a TableChangesLog record, with its new value in a
+    searchable form. Written when FIELD_ROWS is enabled.
+    """
+    log = models.ForeignKey(TableChangesLog, related_name='field_rows',
+                            db_constraint=False, on_delete=models.DO_NOTHING)
+    app_label = models.CharField(max_length=255)
+    table_name = models.CharField(max_length=255)
+    instance_id = models.IntegerField()
+    field_name = models.CharField(max_length=255)
+    # see codec.normalize_value
+    new_value = models.CharField(max_length=255, null=True, blank=True)
+    # creation time of log
+    created_at = models.DateTimeField()
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['app_label', 'table_name', 'field_name',
+                                 'created_at'],
+                         name='tcl_field_created_idx'),
+            models.Index(fields=['app_label', 'table_name', 'field_name',
+                                 'new_value'],
+                         name='tcl_field_value_idx'),
+            models.Index(fields=['table_name', 'instance_id', 'field_name',
+                                 'created_at'],
+                         name='tcl_field_instance_idx'),
+        ]
+
+    def __str__(self):
+        return '{}_{}_{}'.format(self.table_name, self.instance_id,
+                                 self.field_name)
+
+
+class TableChangeLogCallback(models.Model):
+    """A pending callback of a TableChangesLog, used by the 'queue' mode"""
+    log = models.ForeignKey(TableChangesLog, related_name='+',
+                            db_constraint=False, on_delete=models.DO_NOTHING)
+    app_label = models.CharField(max_length=255)
+    table_name = models.CharField(max_length=255)
+    instance_id = models.IntegerField()
+    attempts = models.PositiveIntegerField(default=0)
+    error = models.TextField(blank=True, default='')
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self):
+        return '{}_{}'.format(self.table_name, self.instance_id)
+
+
+class TableChangeLogSpoolSegment(models.Model):
+    """
+    How far a spool segment was loaded, updated in the transaction writing
+    its logs so a segment is never loaded twice
+    """
+    segment = models.CharField(max_length=255, unique=True)
+    offset = models.BigIntegerField(default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return self.segment
 
 
 @receiver(post_save, sender=TableChangesLog)
 def tcl_post_save_actions(instance, created, **kwargs):
-    if not instance.log.created:
-        Model = apps.get_model(instance.app_label, instance.table_name)
-        logged_instance = Model.objects.get(pk=instance.instance_id)
-        config = get_table_change_log_config(logged_instance)
-
-        function_path = config.get('callback', '')
-        try:
-            func = import_string(function_path)
-        except ImportError:
-            return
-
-        notifiable_fields = get_notifiable_table_change_fields(instance)
-
-        # call  notification callback if there are notifiable_fields and
-        # there is a previous log
-        if notifiable_fields and instance.previous_log:
-            func(instance, notifiable_fields)
+    dispatch_table_change_log_callback(instance)
@@ -0,0 +1,213 @@
+import re
+from datetime import datetime, timezone
+
+# partitions hold the logs of a calendar month, in UTC
+PARTITION_NAME_FORMAT = '{}_p{:04d}_{:02d}'
+# partition holding the logs written before the table was partitioned
+LEGACY_PARTITION_NAME_FORMAT = '{}_legacy'
+# partition holding the logs no monthly partition was created for
+DEFAULT_PARTITION_NAME_FORMAT = '{}_default'
+
+
+def get_month_start(value):
+    """Start of the UTC month value falls in."""
+    if value.tzinfo is not None:
+        value = value.astimezone(timezone.utc)
+    return datetime(value.year, value.month, 1, tzinfo=timezone.utc)
+
+
+def add_months(month, count):
+    years, index = divmod(month.month - 1 + count, 12)
+    return month.replace(year=month.year + years, month=index + 1)
+
+
+def get_partition_name(table, month):
+    return PARTITION_NAME_FORMAT.format(table, month.year, month.month)
+
+
+def get_partition_month(table, name):
+    """Month held by the partition called name, None if it is not monthly."""
+    match = re.match(r'^{}_p(\d{{4}})_(\d{{2}})$'.format(re.escape(table)),
+                     name)
+    if match is None:
+        return None
+    return datetime(int(match.group(1)), int(match.group(2)), 1,
+                    tzinfo=timezone.utc)
+
+
+def format_bound(month):
+    return "'{}'".format(month.isoformat())
+
+
+def get_create_partition_sql(connection, table, month):
+    qn = connection.ops.quote_name
+    return (
+        'CREATE TABLE IF NOT EXISTS {} PARTITION OF {} '
+        'FOR VALUES FROM ({}) TO ({})'.format(
+            qn(get_partition_name(table, month)), qn(table),
+            format_bound(month), format_bound(add_months(month, 1)))
+    )
+
+
+def get_expired_partitions(table, names, cutoff):
+    """Monthly partitions whose logs are all older than cutoff."""
+    expired = []
+    for name in names:
+        month = get_partition_month(table, name)
+        if month is not None and add_months(month, 1) <= cutoff:
+            expired.append(name)
+    return sorted(expired)
+
+
+def get_legacy_unique_indexes(table):
+    """
+    Unique indexes of the legacy partition backing the unique constraints
+    of the partitioned table, by name
+    """
+    legacy = LEGACY_PARTITION_NAME_FORMAT.format(table)
+    return {
+        '{}_id_created_at'.format(legacy): ('id', 'created_at'),
+        '{}_unique_id_created_at'.format(legacy): ('unique_id', 'created_at'),
+    }
+
+
+def get_legacy_index_name(name):
+    """Name an index of the current table keeps in the legacy partition"""
+    return '{}_legacy'.format(name[:56])
+
+
+def get_convert_prepare_sql(connection, table, first_month):
+    """
+    Prepares the current table to become the legacy partition without
+    blocking writes: the check bounding created_at is validated and the
+    unique indexes the partitioned table needs are built concurrently. Runs
+    outside a transaction, before get_convert_sql.
+    """
+    qn = connection.ops.quote_name
+    check = '{}_created_at_check'.format(
+        LEGACY_PARTITION_NAME_FORMAT.format(table))
+    statements = [
+        # only the new rows are checked, so this takes a lock briefly
+        'ALTER TABLE {} ADD CONSTRAINT {} CHECK (created_at < {}) '
+        'NOT VALID'.format(qn(table), qn(check), format_bound(first_month)),
+        # reads and writes go on while the existing rows are checked
+        'ALTER TABLE {} VALIDATE CONSTRAINT {}'.format(qn(table), qn(check)),
+    ]
+    for name, columns in sorted(get_legacy_unique_indexes(table).items()):
+        statements.append(
+            'CREATE UNIQUE INDEX CONCURRENTLY IF NOT EXISTS {} '
+            'ON {} ({})'.format(qn(name), qn(table), ', '.join(columns)))
+    return statements
+
+
+def get_convert_sql(connection, table, first_month, indexes, sequence=None):
+    """
+    Turns the log table into one partitioned by created_at. The current
+    table is kept as a partition for everything before first_month, so no
+    row is copied, and a default partition takes the rows no monthly
+    partition holds. After get_convert_prepare_sql, every statement only
+    changes the catalog, so the table is locked briefly.
+
+    Unique constraints of a partitioned table must contain the partition
+    key, hence the primary key and unique_id become unique together with
+    created_at. Logs of an instance still cannot be written twice, writers
+    take turns on the head of the instance.
+
+    Arguments:
+        indexes: <list> (name, definition) of the indexes of the table
+            not backing a constraint, recreated on the partitioned table
+    """
+    qn = connection.ops.quote_name
+    legacy = LEGACY_PARTITION_NAME_FORMAT.format(table)
+    unique_indexes = get_legacy_unique_indexes(table)
+    indexes = [(name, definition) for name, definition in indexes
+               if name not in unique_indexes]
+
+    statements = ['ALTER TABLE {} RENAME TO {}'.format(qn(table), qn(legacy))]
+    # the partitioned table takes over the names of the indexes
+    statements += [
+        'ALTER INDEX {} RENAME TO {}'.format(
+            qn(name), qn(get_legacy_index_name(name)))
+        for name, _ in indexes
+    ]
+    statements += [
+        'ALTER TABLE {} ADD CONSTRAINT {} UNIQUE USING INDEX {}'.format(
+            qn(legacy), qn(name), qn(name))
+        for name in sorted(unique_indexes)
+    ]
+    statements += [
+        'CREATE TABLE {} (LIKE {} INCLUDING DEFAULTS INCLUDING STORAGE) '
+        'PARTITION BY RANGE (created_at)'.format(qn(table), qn(legacy)),
+        'ALTER TABLE {} ADD CONSTRAINT {} PRIMARY KEY (id, created_at)'.format(
+            qn(table), qn('{}_id_created_at_pkey'.format(table))),
+        'ALTER TABLE {} ADD CONSTRAINT {} UNIQUE (unique_id, '
+        'created_at)'.format(qn(table),
+                             qn('{}_unique_id_created_at'.format(table))),
+    ]
+    # the definitions name the table, which is the partitioned one by now
+    statements += [definition for _, definition in indexes]
+    if sequence:
+        # the id sequence would be dropped along with the legacy partition
+        statements.append('ALTER SEQUENCE {} OWNED BY {}.id'.format(
+            sequence, qn(table)))
+    statements += [
+        # the validated check spares a scan, the indexes of the legacy
+        # partition matching those of the table are attached, not built
+        'ALTER TABLE {} ATTACH PARTITION {} FOR VALUES FROM (MINVALUE) '
+        'TO ({})'.format(qn(table), qn(legacy), format_bound(first_month)),
+        'CREATE TABLE {} PARTITION OF {} DEFAULT'.format(
+            qn(DEFAULT_PARTITION_NAME_FORMAT.format(table)), qn(table)),
+    ]
+    return statements
+
+
+def get_remove_partition_sql(connection, table, field_table, name,
+                             detach=False):
+    """
+    Drops or detaches a partition, deleting first the field rows of its
+    logs, which would point to logs no longer in the table
+    """
+    qn = connection.ops.quote_name
+    statements = ['DELETE FROM {} WHERE log_id IN (SELECT id FROM {})'.format(
+        qn(field_table), qn(name))]
+    if detach:
+        statements.append('ALTER TABLE {} DETACH PARTITION {}'.format(
+            qn(table), qn(name)))
+    else:
+        statements.append('DROP TABLE {}'.format(qn(name)))
+    return statements
+
+
+def get_serial_sequence(cursor, table):
+    cursor.execute("SELECT pg_get_serial_sequence(%s, 'id')", [table])
+    return cursor.fetchone()[0]
+
+
+def is_partitioned(cursor, table):
+    cursor.execute(
+        'SELECT relkind FROM pg_class WHERE oid = to_regclass(%s)', [table])
+    row = cursor.fetchone()
+    return row is not None and row[0] == 'p'
+
+
+def get_partitions(cursor, table):
+    cursor.execute(
+        'SELECT child.relname FROM pg_inherits '
+        'JOIN pg_class child ON child.oid = pg_inherits.inhrelid '
+        'WHERE pg_inherits.inhparent = to_regclass(%s)', [table])
+    return [row[0] for row in cursor.fetchall()]
+
+
+def get_indexes(cursor, table):
+    """
+    Names and definitions of the indexes of a table, except those backing
+    a constraint
+    """
+    cursor.execute(
+        'SELECT idx.relname, pg_get_indexdef(pg_index.indexrelid) '
+        'FROM pg_index JOIN pg_class idx ON idx.oid = pg_index.indexrelid '
+        'WHERE pg_index.indrelid = to_regclass(%s) AND NOT EXISTS ('
+        'SELECT 1 FROM pg_constraint '
+        'WHERE pg_constraint.conindid = pg_index.indexrelid) '
+        'ORDER BY idx.relname', [table])
+    return [tuple(row) for row in cursor.fetchall()]
@@ -0,0 +1,169 @@
+import logging
+from collections import OrderedDict
+
+from django.apps import apps
+from django.core.exceptions import FieldDoesNotExist
+from django.utils.module_loading import import_string
+
+from tablechangelogger.config import (
+    CHECKPOINT_INTERVAL, FIELD_ROWS, LOGGABLE_APPS, TABLE_CHANGE_LOG_ENABLED,
+    TRACK_LOADED_STATE)
+from tablechangelogger.datastructures import LoggingPlan
+from tablechangelogger.diff import resolve_comparators
+from tablechangelogger.utils import get_model
+
+logger = logging.getLogger(__name__)
+
+# maps each loggable model class to its compiled LoggingPlan
+LOGGING_PLANS = {}
+
+
+def get_model_properties(model):
+    """Returns the property names defined on a model class"""
+
+    return [
+        name for name in dir(model)
+        if isinstance(getattr(model, name, None), property)
+    ]
+
+
+def resolve_callback(config):
+    """Imports the callback declared in a table config, if there is one"""
+
+    function_path = config.get('callback')
+    if not function_path:
+        return None
+
+    try:
+        return import_string(function_path)
+    except ImportError:
+        logger.exception('Could not import callback {}'.format(function_path))
+        return None
+
+
+def get_field_attnames(model, field_names):
+    """
+    Maps each concrete field among field_names to its attribute name,
+    e.g. 'driver' -> 'driver_id'. Other names are left out.
+    """
+
+    attnames = OrderedDict()
+    for name in field_names:
+        try:
+            field = model._meta.get_field(name)
+        except FieldDoesNotExist:
+            continue
+        if getattr(field, 'concrete', False):
+            attnames[name] = field.attname
+    return attnames
+
+
+def build_logging_plan(model, config):
+    """
+    Builds the LoggingPlan of a model from its table change log config.
+
+    Arguments:
+        model: <Model> A loggable Django model class
+        config: table change log config mapping for that model
+    """
+
+    config_fields = config.get('fields') or []
+    model_properties = set(get_model_properties(model))
+    properties = [name for name in config_fields if name in model_properties]
+    fields = [name for name in config_fields if name not in model_properties]
+    field_attnames = get_field_attnames(model, fields)
+
+    # only concrete columns are diffed, reverse relations and many to many
+    # fields have no value of their own
+    if len(field_attnames) != len(fields):
+        logger.warning('{} of {} are not concrete fields, they are not '
+                       'logged'.format(
+                           ', '.join(set(fields) - set(field_attnames)),
+                           model.__name__))
+        fields = [name for name in fields if name in field_attnames]
+
+    track_loaded_state = config.get('track_loaded_state', TRACK_LOADED_STATE)
+
+    # fields properties depend on are diffed along with the loggable fields
+    property_dependencies = config.get('property_dependencies') or {}
+    for name, dependencies in property_dependencies.items():
+        if name not in properties:
+            logger.warning('{} of {} is not a loggable property, ignoring '
+                           'its dependencies'.format(name, model.__name__))
+            continue
+        dependency_attnames = get_field_attnames(model, dependencies)
+        if len(dependency_attnames) != len(dependencies):
+            logger.warning('{} of {} depends on fields that are not '
+                           'concrete'.format(name, model.__name__))
+        for field_name, attname in dependency_attnames.items():
+            field_attnames.setdefault(field_name, attname)
+
+    return LoggingPlan(
+        model=model,
+        app_label=model._meta.app_label,
+        table_name=model.__name__,
+        config=config,
+        fields=fields,
+        properties=properties,
+        callback=resolve_callback(config),
+        field_attnames=field_attnames,
+        track_loaded_state=track_loaded_state,
+        coalesce_seconds=config.get('coalesce_seconds', 0),
+        min_deltas=config.get('min_deltas'),
+        sample_rates=config.get('sample_rates'),
+        checkpoint_interval=config.get('checkpoint_interval',
+                                       CHECKPOINT_INTERVAL),
+        field_rows=config.get('field_rows', FIELD_ROWS),
+        comparators=resolve_comparators(config),
+        property_dependencies={
+            name: list(dependencies)
+            for name, dependencies in property_dependencies.items()
+            if name in properties
+        }
+    )
+
+
+def compile_logging_plans():
+    """
+    Resolves every model path in LOGGABLE_APPS and compiles its LoggingPlan.
+    Called once when the app registry is ready.
+    """
+
+    LOGGING_PLANS.clear()
+
+    if not TABLE_CHANGE_LOG_ENABLED:
+        return LOGGING_PLANS
+
+    for app_label, app_config in LOGGABLE_APPS.items():
+        for model_path, config in app_config.items():
+            try:
+                model = import_string(model_path)
+            except ImportError:
+                logger.exception('Could not import {}'.format(model_path))
+                continue
+
+            if model._meta.app_label != app_label:
+                logger.warning(
+                    '{} is configured under {} but belongs to {}, '
+                    'skipping'.format(model_path, app_label,
+                                      model._meta.app_label))
+                continue
+
+            LOGGING_PLANS[model] = build_logging_plan(model, config)
+
+    return LOGGING_PLANS
+
+
+def get_logging_plan(instance):
+    """Returns the LoggingPlan of an instance's model or None"""
+    return LOGGING_PLANS.get(get_model(instance))
+
+
+def get_log_plan(tcl):
+    """Returns the LoggingPlan of the model a TableChangesLog belongs to"""
+
+    try:
+        Model = apps.get_model(tcl.app_label, tcl.table_name)
+    except LookupError:
+        return None
+    return LOGGING_PLANS.get(Model)
@@ -0,0 +1,36 @@
+from tablechangelogger.config import READ_DATABASE, WRITE_DATABASE
+
+
+class TableChangeLogRouter(object):
+    """
+    Routes the models of tablechangelogger to WRITE_DATABASE and
+    READ_DATABASE. Add it to DATABASE_ROUTERS, before any router that
+    would route every model.
+    """
+
+    app_label = 'tablechangelogger'
+
+    def db_for_read(self, model, **hints):
+        if model._meta.app_label != self.app_label:
+            return None
+        # related logs are read where the log pointing to them was, so a
+        # log just written is not looked for on a lagging replica
+        instance = hints.get('instance')
+        if instance is not None and instance._state.db:
+            return instance._state.db
+        return READ_DATABASE or WRITE_DATABASE
+
+    def db_for_write(self, model, **hints):
+        if model._meta.app_label != self.app_label:
+            return None
+        return WRITE_DATABASE
+
+    def allow_relation(self, obj1, obj2, **hints):
+        if self.app_label in (obj1._meta.app_label, obj2._meta.app_label):
+            return True
+        return None
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        if app_label != self.app_label or WRITE_DATABASE is None:
+            return None
+        return db == WRITE_DATABASE
@@ -1,43 +1,49 @@
-import logging
+from django.db.models.signals import post_init, post_save, pre_save
 
-from django.utils.module_loading import import_string
-from django.db.models.signals import pre_save
+from tablechangelogger.log_table_change import (
+    LOADED_STATE_ATTR, get_tracked_values, log_table_change,
+    take_loaded_state)
+from tablechangelogger.registry import LOGGING_PLANS
 
-from tablechangelogger.config import LOGGABLE_MODELS
 
+@log_table_change
+def log_instance_change(sender, instance, **kwargs):
+    pass
 
-logger = logging.getLogger(__name__)
 
-PRE_SAVE_FUNCTION_TEMPLATE = """
-from tablechangelogger.log_table_change import log_table_change
+def snapshot_loaded_state(sender, instance, **kwargs):
+    take_loaded_state(instance, LOGGING_PLANS[sender])
 
-@log_table_change
-def table_change_log_{model_name}(sender, instance, **kwargs):
-    pass
-"""  # noqa
-
-PRE_SAVE_FUNCS = {}
-
-
-for model_config in LOGGABLE_MODELS:
-    # get loggable fields from the configuration mapping
-    try:
-        model_path = list(model_config.keys())[0]
-        table_config = model_config.get(model_path)
-        fields_list = table_config.get('fields')
-        model_name = model_path.rsplit('.', 1)[1].lower()
-        # format function with loggable fields and the model name
-        pre_save_signal_code = PRE_SAVE_FUNCTION_TEMPLATE.format(
-            fields=fields_list, model_name=model_name
-        )
-        exec(pre_save_signal_code, {}, PRE_SAVE_FUNCS)
-
-        key = 'table_change_log_{}'.format(model_name)
-        func = PRE_SAVE_FUNCS[key]
-
-        sender = import_string(model_path)
-        pre_save.connect(func, sender=sender)
-    except Exception:
-        logger.exception('Could not bind to the pre_save signal of {}'.format(
-            model_name
-        ))
+
+def refresh_loaded_state(sender, instance, update_fields=None, **kwargs):
+    plan = LOGGING_PLANS[sender]
+    loaded_state = getattr(instance, LOADED_STATE_ATTR, None)
+
+    # only the saved fields now match the database row
+    if update_fields is not None:
+        field_names = [name for name in plan.field_attnames
+                       if name in update_fields]
+        if loaded_state is not None and field_names:
+            loaded_state.update(
+                get_tracked_values(instance, plan, field_names))
+        return
+
+    take_loaded_state(instance, plan)
+
+
+def connect_loaded_state_receivers(plans):
+    """
+    Snapshots loggable fields of the models tracking their loaded state
+    """
+
+    for model, plan in plans.items():
+        if plan.track_loaded_state:
+            post_init.connect(snapshot_loaded_state, sender=model)
+            post_save.connect(refresh_loaded_state, sender=model)
+
+
+def connect_pre_save_receivers(plans):
+    """Logs the changes of every model with a logging plan"""
+
+    for model in plans:
+        pre_save.connect(log_instance_change, sender=model)
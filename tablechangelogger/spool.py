@@ -0,0 +1,287 @@
+"""
+Local spool of unsaved logs.
+
+With SPOOL_DIRECTORY set, each process appends the logs it creates to its own
+segment file instead of writing them to the database, and the
+drain_table_change_logs command loads them. A segment is a sequence of
+records, each a 4 byte length and a 4 byte CRC32 of its payload followed by
+the payload, a JSON entry. Segments being appended to end with ``.open`` and
+are renamed to end with ``.seg`` once full or when their process exits.
+"""
+import atexit
+import io
+import json
+import logging
+import os
+import socket
+import struct
+import threading
+import time
+import zlib
+
+from django.db import connections
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+from tablechangelogger import stats
+from tablechangelogger.codec import decode_log, encode_log
+from tablechangelogger.config import (
+    SPOOL_DIRECTORY, SPOOL_FSYNC_RECORDS, SPOOL_FSYNC_SECONDS,
+    SPOOL_SEGMENT_BYTES
+)
+
+logger = logging.getLogger(__name__)
+
+HEADER = struct.Struct('>II')
+OPEN_SUFFIX = '.open'
+SEALED_SUFFIX = '.seg'
+
+
+def encode_record(payload):
+    return HEADER.pack(len(payload), zlib.crc32(payload)) + payload
+
+
+def read_records(path, offset=0, limit=None):
+    """
+    Reads the complete records of a segment from offset. Returns their
+    payloads and the offset following the last one. A record cut short, by
+    a crash or because it is being written, ends the read.
+    """
+    payloads = []
+    with open(path, 'rb') as segment:
+        segment.seek(offset)
+        while limit is None or len(payloads) < limit:
+            header = segment.read(HEADER.size)
+            if len(header) < HEADER.size:
+                break
+            length, checksum = HEADER.unpack(header)
+            payload = segment.read(length)
+            if len(payload) < length or zlib.crc32(payload) != checksum:
+                break
+            payloads.append(payload)
+            offset += HEADER.size + length
+    return payloads, offset
+
+
+def fsync_directory(directory):
+    """Makes the creation or renaming of a segment durable"""
+    descriptor = os.open(directory, os.O_RDONLY)
+    try:
+        os.fsync(descriptor)
+    finally:
+        os.close(descriptor)
+
+
+def get_segment_id(name):
+    """Name of a segment without its suffix, kept when it is sealed"""
+    return name.rsplit('.', 1)[0]
+
+
+def get_segments(directory):
+    """Names of the segments of a spool, sealed or not, oldest first"""
+    names = [name for name in os.listdir(directory)
+             if name.endswith((OPEN_SUFFIX, SEALED_SUFFIX))]
+    return sorted(names, key=lambda name: (
+        int(get_segment_id(name).rsplit('-', 1)[1]), name))
+
+
+def is_sealed(name, hostname=None):
+    """
+    Whether no record will be appended to a segment anymore: it is sealed,
+    or the process of this host that appended to it is gone.
+    """
+    if name.endswith(SEALED_SUFFIX):
+        return True
+
+    host, pid, _ = get_segment_id(name).rsplit('-', 2)
+    if host != (hostname or socket.gethostname()):
+        return False
+    try:
+        os.kill(int(pid), 0)
+    except ProcessLookupError:
+        return True
+    except PermissionError:
+        return False
+    return False
+
+
+class Spool(object):
+    """
+    Appends records to a segment of its own per process. Records reach the
+    operating system on every append and the disk every fsync_records
+    records or fsync_seconds seconds.
+    """
+
+    def __init__(self, directory, segment_bytes=SPOOL_SEGMENT_BYTES,
+                 fsync_records=SPOOL_FSYNC_RECORDS,
+                 fsync_seconds=SPOOL_FSYNC_SECONDS):
+        self.directory = directory
+        self.segment_bytes = segment_bytes
+        self.fsync_records = fsync_records
+        self.fsync_seconds = fsync_seconds
+        self.lock = threading.Lock()
+        self.segment = None
+        self.path = None
+        self.pid = None
+        self.unsynced = 0
+        self.synced_at = time.monotonic()
+
+    def open_segment(self):
+        name = '{}-{}-{:d}{}'.format(
+            socket.gethostname(), os.getpid(), int(time.time() * 1000000),
+            OPEN_SUFFIX)
+        self.path = os.path.join(self.directory, name)
+        self.segment = open(self.path, 'ab')
+        fsync_directory(self.directory)
+        self.synced_at = time.monotonic()
+
+    def append(self, payloads):
+        with self.lock:
+            if self.pid != os.getpid():
+                # a segment inherited from the parent process is its own
+                self.segment = None
+                self.pid = os.getpid()
+            if self.segment is None:
+                self.open_segment()
+
+            self.segment.write(b''.join(map(encode_record, payloads)))
+            self.segment.flush()
+            self.unsynced += len(payloads)
+
+            if self.unsynced >= self.fsync_records or \
+                    time.monotonic() - self.synced_at >= self.fsync_seconds:
+                self.sync()
+            if self.segment.tell() >= self.segment_bytes:
+                self.seal()
+
+    def sync(self):
+        os.fsync(self.segment.fileno())
+        self.unsynced = 0
+        self.synced_at = time.monotonic()
+
+    def seal(self):
+        self.sync()
+        self.segment.close()
+        os.rename(self.path, self.path[:-len(OPEN_SUFFIX)] + SEALED_SUFFIX)
+        fsync_directory(self.directory)
+        self.segment = None
+
+    def close(self):
+        with self.lock:
+            if self.segment is not None and self.pid == os.getpid():
+                self.seal()
+
+
+SPOOL = Spool(SPOOL_DIRECTORY) if SPOOL_DIRECTORY else None
+
+if SPOOL is not None:
+    atexit.register(SPOOL.close)
+
+
+def encode_entry(tcl, created_at):
+    from tablechangelogger.log_table_change import CONTENT_HASH_ATTR
+
+    return json.dumps({
+        'app_label': tcl.app_label,
+        'table_name': tcl.table_name,
+        'instance_id': tcl.instance_id,
+        'field_name': tcl.field_name,
+        'log': encode_log(tcl.log),
+        'property_unique_ids': tcl.property_unique_ids,
+        'content_hash': getattr(tcl, CONTENT_HASH_ATTR, None),
+        'created_at': created_at.isoformat(),
+    }, separators=(',', ':')).encode()
+
+
+def decode_entry(payload):
+    """Returns the unsaved TableChangesLog record of a spooled entry"""
+    from tablechangelogger.log_table_change import CONTENT_HASH_ATTR
+    from tablechangelogger.models import TableChangesLog
+
+    entry = json.loads(payload.decode())
+    tcl = TableChangesLog(
+        app_label=entry['app_label'], table_name=entry['table_name'],
+        instance_id=entry['instance_id'], field_name=entry['field_name'],
+        log=decode_log(entry['log']),
+        property_unique_ids=entry['property_unique_ids'],
+        created_at=parse_datetime(entry['created_at']))
+    setattr(tcl, CONTENT_HASH_ATTR, entry['content_hash'])
+    return tcl
+
+
+def spool_table_change_logs(tcls):
+    """
+    Appends unsaved TableChangesLog records to the spool of this process,
+    or writes them to the database if that fails
+    """
+    from tablechangelogger.log_table_change import write_table_change_logs
+
+    created_at = timezone.now()
+    try:
+        with stats.timer('spool', tags=stats.get_batch_tags(tcls)):
+            SPOOL.append([encode_entry(tcl, created_at) for tcl in tcls])
+    except Exception as e:
+        logger.exception(e)
+        write_table_change_logs(tcls)
+
+
+def escape_copy_value(value):
+    """A value in the text format of COPY"""
+    if value is None:
+        return '\\N'
+    if isinstance(value, bool):
+        return 't' if value else 'f'
+    return str(value).replace('\\', '\\\\').replace('\t', '\\t').replace(
+        '\n', '\\n').replace('\r', '\\r')
+
+
+def get_copy_value(field, tcl, connection):
+    value = getattr(tcl, field.attname)
+    if isinstance(value, (dict, list)):
+        return escape_copy_value(json.dumps(value))
+    return escape_copy_value(field.get_db_prep_save(value, connection))
+
+
+def copy_rows(cursor, sql, data):
+    # psycopg2 and psycopg 3 expose COPY differently
+    if hasattr(cursor, 'copy_expert'):
+        cursor.copy_expert(sql, io.StringIO(data))
+    else:
+        with cursor.copy(sql) as copy:
+            copy.write(data)
+
+
+def copy_table_change_logs(tcls, using):
+    """
+    Inserts TableChangesLog records with a PostgreSQL COPY. Their primary
+    keys are taken from the id sequence beforehand, so records can point to
+    previous ones of the same batch. Unlike bulk_create, it keeps the time
+    the records were spooled as their created_at.
+    """
+    from tablechangelogger.log_table_change import link_unsaved_previous_log
+    from tablechangelogger.models import TableChangesLog
+
+    connection = connections[using]
+    qn = connection.ops.quote_name
+    table = TableChangesLog._meta.db_table
+    fields = TableChangesLog._meta.concrete_fields
+
+    with connection.cursor() as cursor:
+        cursor.execute(
+            "SELECT nextval(pg_get_serial_sequence(%s, 'id')) "
+            "FROM generate_series(1, %s)", [table, len(tcls)])
+        for tcl, (pk, ) in zip(tcls, cursor.fetchall()):
+            tcl.pk = pk
+            tcl._state.adding = False
+            tcl._state.db = using
+        for tcl in tcls:
+            link_unsaved_previous_log(tcl)
+
+        data = ''.join(
+            '\t'.join(get_copy_value(field, tcl, connection)
+                      for field in fields) + '\n'
+            for tcl in tcls)
+        sql = 'COPY {} ({}) FROM STDIN'.format(
+            qn(table), ', '.join(qn(field.column) for field in fields))
+        copy_rows(cursor.cursor, sql, data)
+    return tcls
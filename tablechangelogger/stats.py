@@ -0,0 +1,158 @@
+import logging
+import socket
+import time
+
+from django.utils.module_loading import import_string
+
+from tablechangelogger.config import STATS_SINK, STATS_SINK_OPTIONS
+
+logger = logging.getLogger(__name__)
+
+# sink receiving the timers and counters of the logging pipeline, None when
+# no sink is configured so that instrumenting costs a single check
+SINK = None
+
+
+class StatsSink(object):
+    """
+    Receives the timers and counters of the logging pipeline. Timers are
+    named after their stage: refetch, diff, properties, serialize, dedup,
+    insert and callback. Counters are logs.written, logs.skipped,
+    logs.deduplicated and logs.failed. Tags hold the app label and model.
+    """
+
+    def timing(self, name, seconds, tags):
+        raise NotImplementedError
+
+    def increment(self, name, value, tags):
+        raise NotImplementedError
+
+
+class LoggingSink(StatsSink):
+    """Writes every metric to the tablechangelogger.stats logger."""
+
+    def __init__(self, level=logging.INFO):
+        self.level = level
+
+    def format_tags(self, tags):
+        return ' '.join('{}={}'.format(key, value)
+                        for key, value in sorted(tags.items()))
+
+    def timing(self, name, seconds, tags):
+        logger.log(self.level, '%s took %.3fms %s', name, seconds * 1000,
+                   self.format_tags(tags))
+
+    def increment(self, name, value, tags):
+        logger.log(self.level, '%s +%s %s', name, value,
+                   self.format_tags(tags))
+
+
+class StatsdSink(StatsSink):
+    """
+    Sends metrics over UDP in the StatsD line format, with tags in the
+    DogStatsD format that the Prometheus statsd_exporter maps to labels.
+    """
+
+    def __init__(self, host='localhost', port=8125,
+                 prefix='tablechangelogger'):
+        self.address = (host, port)
+        self.prefix = prefix
+        self.socket = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+
+    def format_line(self, name, value, metric_type, tags):
+        line = '{}.{}:{}|{}'.format(self.prefix, name, value, metric_type)
+        if tags:
+            line += '|#' + ','.join('{}:{}'.format(key, value)
+                                    for key, value in sorted(tags.items()))
+        return line
+
+    def send(self, line):
+        try:
+            self.socket.sendto(line.encode('utf-8'), self.address)
+        except OSError:
+            # metrics are best effort, never fail a save over them
+            pass
+
+    def timing(self, name, seconds, tags):
+        self.send(self.format_line(name, round(seconds * 1000, 3), 'ms',
+                                   tags))
+
+    def increment(self, name, value, tags):
+        self.send(self.format_line(name, value, 'c', tags))
+
+
+class Timer(object):
+    __slots__ = ('name', 'tags', 'start')
+
+    def __init__(self, name, tags):
+        self.name = name
+        self.tags = tags
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc_info):
+        SINK.timing(self.name, time.perf_counter() - self.start, self.tags)
+
+
+class NullTimer(object):
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        pass
+
+
+NULL_TIMER = NullTimer()
+
+
+def get_tags(app_label=None, model=None):
+    tags = {}
+    if app_label is not None:
+        tags['app_label'] = app_label
+    if model is not None:
+        tags['model'] = model
+    return tags
+
+
+def get_batch_tags(tcls):
+    """Tags shared by every TableChangesLog record of a batch"""
+    keys = {(tcl.app_label, tcl.table_name) for tcl in tcls}
+    if len(keys) == 1:
+        return get_tags(*keys.pop())
+    return {}
+
+
+def timer(name, app_label=None, model=None, tags=None):
+    """Times the block it wraps, does nothing without a sink"""
+    if SINK is None:
+        return NULL_TIMER
+    return Timer(name, tags if tags is not None else get_tags(app_label,
+                                                              model))
+
+
+def increment(name, app_label=None, model=None, value=1):
+    if SINK is not None:
+        SINK.increment(name, value, get_tags(app_label, model))
+
+
+def configure_stats_sink():
+    """
+    Builds the sink declared by STATS_SINK, with STATS_SINK_OPTIONS as
+    keyword arguments. Called once when the app registry is ready.
+    """
+    global SINK
+
+    SINK = None
+    if not STATS_SINK:
+        return None
+
+    try:
+        SINK = import_string(STATS_SINK)(**STATS_SINK_OPTIONS)
+    except Exception:
+        logger.exception('Could not configure stats sink {}'.format(
+            STATS_SINK))
+    return SINK
@@ -0,0 +1,48 @@
+import sys
+import types
+
+import pytest
+from mock import Mock
+
+
+class FakeModel(object):
+    """Stands in for a model of tablechangelogger.models, which needs GDAL"""
+
+    defaults = {}
+
+    def __init__(self, **kwargs):
+        self.pk = None
+        for name, value in dict(self.defaults, **kwargs).items():
+            setattr(self, name, value)
+
+
+class FakeTableChangeLogHead(FakeModel):
+    # setting last_log sets last_log_id
+    defaults = {'log': None, 'property_unique_ids': None, 'last_log': None,
+                'seq': None}
+
+    def __setattr__(self, name, value):
+        super().__setattr__(name, value)
+        if name == 'last_log':
+            super().__setattr__(
+                'last_log_id', getattr(value, 'pk', None))
+
+
+class FakeTableChangesLog(FakeModel):
+    defaults = {'unique_id': None, 'seq': None, 'previous_id': None,
+                'property_unique_ids': None}
+
+
+@pytest.fixture
+def fake_models(monkeypatch):
+    """
+    Replaces tablechangelogger.models, so code importing its models inside
+    functions runs for real against these stand-ins
+    """
+    module = types.ModuleType('tablechangelogger.models')
+    module.TableChangeLogHead = FakeTableChangeLogHead
+    module.TableChangesLog = FakeTableChangesLog
+    monkeypatch.setattr(FakeTableChangeLogHead, 'objects', Mock(),
+                        raising=False)
+    monkeypatch.setitem(sys.modules, 'tablechangelogger.models', module)
+    return module
@@ -10,3 +10,9 @@ TABLE_CHANGE_LOG_CONFIG = {
 }
 SECRET_KEY = 'dummy'
 INSTALLED_APPS = ('tablechangelogger', )
+DATABASES = {
+    'default': {
+        'ENGINE': 'django.db.backends.sqlite3',
+        'NAME': ':memory:',
+    }
+}
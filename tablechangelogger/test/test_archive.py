@@ -0,0 +1,66 @@
+import gzip
+import json
+from datetime import datetime, timezone
+from decimal import Decimal
+
+from mock import Mock
+
+from tablechangelogger.archive import (
+    ArchiveWriter, get_checkpoint_name, read_checkpoint,
+    serialize_table_change_log, write_checkpoint
+)
+from tablechangelogger.codec import LazyLogged, encode_log
+from tablechangelogger.datastructures import Change, Logged
+
+
+def mock_tcl(_id):
+    log = Logged(changes={
+        'latest_speed': Change(new_value=Decimal('10.5'), old_value=None)})
+    return Mock(id=_id, app_label='mocks', table_name='MockClass',
+                instance_id=1, field_name='latest_speed',
+                created_at=datetime(2026, 10, 18, tzinfo=timezone.utc),
+                unique_id='abc', property_unique_ids={}, is_notified=False,
+                details={}, previous_id=None, seq=_id,
+                log=LazyLogged(encode_log(log)))
+
+
+def test_serialize_table_change_log_is_json_safe():
+    record = serialize_table_change_log(mock_tcl(1))
+
+    assert json.loads(json.dumps(record))['changes'] == {
+        'latest_speed': {'new': {'$t': 'decimal', 'v': '10.5'}, 'old': None}}
+    assert record['created_at'] == '2026-10-18T00:00:00+00:00'
+
+
+def test_archive_writer_rotates_files(tmp_path):
+    finished = []
+    writer = ArchiveWriter(str(tmp_path), 'tcl', 2,
+                           on_rotate=lambda *args: finished.append(args))
+
+    for _id in range(1, 6):
+        writer.write(serialize_table_change_log(mock_tcl(_id)))
+    writer.close()
+
+    assert [(first, last) for _, first, last in finished] == [
+        (1, 2), (3, 4), (5, 5)]
+    with gzip.open(finished[1][0], 'rt') as archive:
+        assert [json.loads(line)['id'] for line in archive] == [3, 4]
+    assert not list(tmp_path.glob('*.part'))
+
+
+def test_checkpoint_roundtrip(tmp_path):
+    path = str(tmp_path / 'checkpoint.json')
+
+    assert read_checkpoint(path) == 0
+    write_checkpoint(path, 42)
+    assert read_checkpoint(path) == 42
+
+
+def test_checkpoint_name_follows_the_filters():
+    since = datetime(2026, 1, 1, tzinfo=timezone.utc)
+
+    assert get_checkpoint_name('tcl') == 'tcl.checkpoint.json'
+    assert get_checkpoint_name('tcl-mocks', since=since) == (
+        'tcl-mocks-since-20260101T000000+0000.checkpoint.json')
+    assert get_checkpoint_name('tcl', until=since) != get_checkpoint_name(
+        'tcl', since=since)
@@ -0,0 +1,145 @@
+import asyncio
+
+from mock import Mock, patch
+
+from tablechangelogger import callbacks, log_table_change
+from tablechangelogger.datastructures import Change, Logged
+from tablechangelogger.log_table_change import (
+    ASYNC_CALLBACK_ATTR, ASYNC_SAVE_ATTR, asave_with_log,
+    awrite_table_change_logs
+)
+
+
+def make_plan():
+    return Mock(app_label='mocks', table_name='MockClass', coalesce_seconds=0)
+
+
+@patch.object(log_table_change, 'acreate_table_change_log_records')
+@patch.object(log_table_change, 'build_table_change_log')
+@patch.object(log_table_change, 'build_change_log')
+@patch.object(log_table_change, 'get_loaded_state', return_value=None)
+@patch.object(log_table_change, 'afetch_tracked_values')
+@patch.object(log_table_change, 'get_logging_plan')
+def test_asave_with_log_logs_after_save(
+        mock_get_plan, mock_fetch, mock_loaded_state, mock_build_change,
+        mock_build_tcl, mock_create):
+    plan = mock_get_plan.return_value = make_plan()
+    instance = Mock(pk=1)
+    log = Logged(changes={'route_id': Change(new_value=2, old_value=1)})
+    calls = []
+
+    async def fetch(*args):
+        calls.append('fetch')
+        return {'route_id': 1}
+
+    async def asave():
+        # the pre_save receiver leaves the save to the async path
+        calls.append(('save', getattr(instance, ASYNC_SAVE_ATTR, False)))
+
+    async def create(tcls):
+        calls.append('create')
+
+    mock_fetch.side_effect = fetch
+    mock_build_change.return_value = (['route_id'], log, [])
+    mock_create.side_effect = create
+
+    asyncio.run(asave_with_log(instance, asave))
+
+    assert calls == ['fetch', ('save', True), 'create']
+    assert not hasattr(instance, ASYNC_SAVE_ATTR)
+    mock_build_change.assert_called_once_with(plan, instance, {'route_id': 1})
+    mock_build_tcl.assert_called_once_with(
+        'mocks', 'MockClass', 1, 'route_id', log, [])
+
+
+@patch('tablechangelogger.callbacks.adispatch_table_change_log_callback')
+@patch.object(log_table_change, 'write_table_change_logs')
+def test_awrite_shares_the_sync_write_and_dispatches_callbacks(
+        mock_write, mock_dispatch):
+    tcl = Mock(app_label='mocks', table_name='MockClass', instance_id=1)
+    dispatched = []
+
+    def write(tcls):
+        # post_save does not run the callback a second time
+        assert getattr(tcl, ASYNC_CALLBACK_ATTR) is True
+        return tcls
+
+    async def dispatch(tcl):
+        dispatched.append(tcl)
+
+    mock_write.side_effect = write
+    mock_dispatch.side_effect = dispatch
+
+    created = asyncio.run(awrite_table_change_logs([tcl]))
+
+    assert created == [tcl]
+    mock_write.assert_called_once_with([tcl])
+    assert dispatched == [tcl]
+
+
+@patch.object(callbacks, 'get_callback_fields', return_value={'route_id'})
+@patch.object(callbacks, 'aload_previous_log')
+def test_callbacks_of_an_instance_run_in_order(mock_load, mock_fields):
+    order = []
+
+    async def load(tcl):
+        pass
+
+    async def callback(tcl, fields):
+        # the first callback yields, the second one still waits for it
+        await asyncio.sleep(0.01 if tcl.seq == 1 else 0)
+        order.append(tcl.seq)
+
+    mock_load.side_effect = load
+
+    async def run():
+        tasks = [
+            callbacks.schedule_table_change_log_callback(
+                Mock(app_label='mocks', table_name='MockClass',
+                     instance_id=1, seq=seq), callback)
+            for seq in (1, 2)
+        ]
+        await asyncio.gather(*tasks)
+
+    asyncio.run(run())
+    assert order == [1, 2]
+    assert callbacks._tasks == {}
+
+
+def test_heads_are_inserted_for_instances_without_one(fake_models):
+    previous_log = fake_models.TableChangesLog(
+        app_label='mocks', table_name='MockClass', instance_id=1,
+        log='log', unique_id='u1', seq=3)
+    previous_log.pk = 10
+    keys = {('mocks', 'MockClass', 1), ('mocks', 'MockClass', 2)}
+    bulk_create = fake_models.TableChangeLogHead.objects.using.return_value \
+        .bulk_create
+
+    def select_heads(keys, lock=False):
+        assert lock
+        # the heads just inserted are selected again
+        return bulk_create.call_args[0][0] if bulk_create.called else []
+
+    with patch.object(log_table_change, 'get_log_database',
+                      return_value='default'), \
+            patch.object(log_table_change,
+                         'get_table_change_log_heads_queryset',
+                         side_effect=select_heads), \
+            patch.object(log_table_change, 'get_previous_logs',
+                         return_value={('mocks', 'MockClass', 1):
+                                       previous_log}):
+        heads = log_table_change.get_table_change_log_heads(keys)
+
+    # in a steady order, and left be if a concurrent writer inserted them
+    inserted = bulk_create.call_args[0][0]
+    assert [head.instance_id for head in inserted] == [1, 2]
+    assert bulk_create.call_args[1] == {'ignore_conflicts': True}
+
+    head = heads[('mocks', 'MockClass', 1)]
+    assert head.last_log_id == 10
+    assert head.last_unique_id == 'u1'
+    assert head.seq == 3
+    assert head.log == 'log'
+    new_head = heads[('mocks', 'MockClass', 2)]
+    assert new_head.last_log_id is None
+    assert new_head.last_unique_id is None
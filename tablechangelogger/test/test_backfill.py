@@ -0,0 +1,105 @@
+from mock import Mock, patch
+
+from tablechangelogger import backfill, log_table_change
+from tablechangelogger.backfill import (
+    ChunkProgress, get_chunks, number_table_change_logs
+)
+from tablechangelogger.datastructures import LoggingPlan
+
+
+def test_get_chunks_cover_the_primary_key_range():
+    assert get_chunks(None, None, 10) == []
+    assert get_chunks(1, 25, 10) == [(1, 11), (11, 21), (21, 26)]
+    assert get_chunks(5, 5, 10) == [(5, 6)]
+
+
+def test_chunk_progress_only_moves_past_finished_chunks():
+    progress = ChunkProgress(get_chunks(1, 30, 10))
+
+    assert progress.finish(11) is None
+    assert progress.finish(1) == 21
+    assert progress.finish(21) == 31
+
+
+def test_number_table_change_logs_numbers_logs_and_heads():
+    def tcl(_id, instance_id, seq=None, previous_id=None):
+        return Mock(id=_id, app_label='mocks', table_name='MockClass',
+                    instance_id=instance_id, seq=seq, previous_id=previous_id)
+
+    # the first instance is numbered already, up to its last log
+    tcls = [tcl(1, 1, 1), tcl(3, 1, 2, 1), tcl(2, 2), tcl(4, 2), tcl(5, 1)]
+    heads = {
+        ('mocks', 'MockClass', 1): Mock(seq=2, last_log_id=3),
+        ('mocks', 'MockClass', 2): Mock(seq=None, last_log_id=4),
+    }
+
+    changed_tcls, changed_heads = number_table_change_logs(tcls, heads)
+
+    assert [(t.id, t.seq, t.previous_id) for t in changed_tcls] == [
+        (2, 1, None), (4, 2, 2), (5, 3, 3)]
+    assert [(head.seq, head.last_log_id) for head in changed_heads] == [
+        (3, 5), (2, 4)]
+
+
+class Vehicle(object):
+    def __init__(self, pk, plate):
+        self.pk = pk
+        self.plate = plate
+
+    @property
+    def label(self):
+        return 'vehicle-{}'.format(self.plate)
+
+
+def test_backfill_chunk_logs_instances_without_a_log(fake_models):
+    plan = LoggingPlan(model=Vehicle, app_label='mocks', table_name='Vehicle',
+                       config={}, fields=['plate'], properties=['label'],
+                       field_attnames={'plate': 'plate'})
+    Vehicle._base_manager = Mock()
+    Vehicle._base_manager.filter.return_value.order_by.return_value = [
+        Vehicle(1, 'a'), Vehicle(2, 'b')]
+    # the second vehicle was logged before
+    last_log = fake_models.TableChangesLog(unique_id='u4')
+    last_log.pk = 40
+    logged_head = fake_models.TableChangeLogHead(
+        app_label='mocks', table_name='Vehicle', instance_id=2, seq=4,
+        last_log=last_log)
+    logged_head.pk = 7
+    bulk_create = fake_models.TableChangeLogHead.objects.using.return_value \
+        .bulk_create
+
+    def select_heads(keys, lock=False):
+        # the heads just inserted are selected again
+        return bulk_create.call_args[0][0] if bulk_create.called else [
+            logged_head]
+
+    with patch.object(backfill, 'transaction'), \
+            patch.object(backfill.apps, 'get_model', return_value=Vehicle), \
+            patch.dict(backfill.LOGGING_PLANS, {Vehicle: plan}), \
+            patch.object(log_table_change, 'get_log_plan',
+                         return_value=plan), \
+            patch.object(log_table_change,
+                         'get_table_change_log_heads_queryset',
+                         side_effect=select_heads), \
+            patch.object(log_table_change, 'get_previous_logs',
+                         return_value={}), \
+            patch.object(backfill, 'send_table_change_log_signals'), \
+            patch.object(backfill, 'save_table_change_logs',
+                         side_effect=lambda tcls, heads: tcls) as mock_save:
+        assert backfill.backfill_chunk('mocks', 'Vehicle', 1, 3) == (2, 1)
+
+    Vehicle._base_manager.filter.assert_called_once_with(pk__gte=1, pk__lt=3)
+    (tcl, ), heads = mock_save.call_args[0]
+    assert tcl.instance_id == 1
+    assert tcl.field_name == 'plate,label'
+    assert tcl.log.created
+    assert tcl.log.get_new_values() == {'plate': 'a', 'label': 'vehicle-a'}
+    assert tcl.seq == 1 and tcl.unique_id
+    # the head of the first vehicle was inserted, then locked
+    new_head, = bulk_create.call_args[0][0]
+    assert new_head.instance_id == 1
+    assert bulk_create.call_args[1] == {'ignore_conflicts': True}
+    # and now carries its baseline
+    head = {head.instance_id: head for head in heads}[1]
+    assert head.seq == 1
+    assert head.log.get_new_values() == tcl.log.get_new_values()
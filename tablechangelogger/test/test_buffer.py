@@ -0,0 +1,101 @@
+import pytest
+from mock import patch
+
+from tablechangelogger.buffer import TransactionBuffer
+
+
+class MockConnection(object):
+    def __init__(self):
+        self.savepoint_ids = []
+        self.run_on_commit = []
+
+    def on_commit(self, func, using=None):
+        self.run_on_commit.append((set(self.savepoint_ids), func))
+
+    def savepoint_release(self, sid):
+        self.savepoint_ids.remove(sid)
+
+    def savepoint_rollback(self, sid):
+        self.savepoint_ids.remove(sid)
+        self.run_on_commit = [(sids, func)
+                              for sids, func in self.run_on_commit
+                              if sid not in sids]
+
+    def commit(self):
+        hooks, self.run_on_commit = self.run_on_commit, []
+        for _, func in hooks:
+            func()
+
+
+@pytest.fixture
+def mock_connection():
+    connection = MockConnection()
+    with patch('tablechangelogger.buffer.transaction') as mock_transaction:
+        mock_transaction.get_connection.return_value = connection
+        mock_transaction.on_commit.side_effect = connection.on_commit
+        yield connection
+
+
+@patch('tablechangelogger.log_table_change.write_table_change_logs')
+def test_buffer_discards_rolled_back_savepoints(mock_write, mock_connection):
+    buffer = TransactionBuffer('default')
+    buffer.get_pending_logs().append('first')
+
+    mock_connection.savepoint_ids.append('s1')
+    buffer.get_pending_logs().append('rolled back')
+    mock_connection.savepoint_rollback('s1')
+
+    buffer.get_pending_logs().append('second')
+    mock_connection.commit()
+
+    mock_write.assert_called_once_with(['first', 'second'])
+
+
+@patch('tablechangelogger.log_table_change.write_table_change_logs')
+def test_buffer_discards_rolled_back_transactions(mock_write,
+                                                  mock_connection):
+    buffer = TransactionBuffer('default')
+    buffer.get_pending_logs().append('rolled back')
+    mock_connection.run_on_commit = []
+
+    buffer.get_pending_logs().append('committed')
+    mock_connection.commit()
+
+    mock_write.assert_called_once_with(['committed'])
+
+
+@patch('tablechangelogger.log_table_change.write_table_change_logs')
+def test_buffer_keeps_the_order_across_released_savepoints(mock_write,
+                                                           mock_connection):
+    buffer = TransactionBuffer('default')
+    buffer.get_pending_logs().append('outer')
+
+    mock_connection.savepoint_ids.append('s1')
+    buffer.get_pending_logs().append('nested')
+    mock_connection.savepoint_release('s1')
+
+    buffer.get_pending_logs().append('outer again')
+    mock_connection.commit()
+
+    # written once, in the order the records were buffered
+    mock_write.assert_called_once_with(['outer', 'nested', 'outer again'])
+
+
+@patch('tablechangelogger.log_table_change.write_table_change_logs')
+def test_buffer_discards_savepoints_rolled_back_last(mock_write,
+                                                     mock_connection):
+    buffer = TransactionBuffer('default')
+    buffer.get_pending_logs().append('first')
+
+    mock_connection.savepoint_ids.append('s1')
+    buffer.get_pending_logs().append('rolled back')
+    mock_connection.savepoint_rollback('s1')
+    mock_connection.commit()
+
+    mock_write.assert_called_once_with(['first'])
+    mock_write.reset_mock()
+
+    # the next transaction starts with an empty buffer
+    buffer.get_pending_logs().append('next')
+    mock_connection.commit()
+    mock_write.assert_called_once_with(['next'])
@@ -0,0 +1,20 @@
+import time
+
+from tablechangelogger.callbacks import OrderedExecutor
+
+
+def test_ordered_executor_keeps_order_per_key():
+    executor = OrderedExecutor(max_workers=3)
+    calls = []
+
+    def task(key, index):
+        time.sleep(0.001 * (5 - index))
+        calls.append((key, index))
+
+    for index in range(5):
+        for key in ('first', 'second'):
+            executor.submit(key, task, key, index)
+    executor.shutdown()
+
+    for key in ('first', 'second'):
+        assert [index for k, index in calls if k == key] == list(range(5))
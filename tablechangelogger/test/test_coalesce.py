@@ -0,0 +1,84 @@
+from mock import Mock, patch
+
+from tablechangelogger.coalesce import Coalescer
+from tablechangelogger.datastructures import Change, Logged, LoggingPlan
+from tablechangelogger.log_table_change import drop_negligible_changes
+
+
+def make_plan(**kwargs):
+    return LoggingPlan(model=Mock(), app_label='mocks',
+                       table_name='MockClass', config={},
+                       fields=['latest_speed', 'pickup_point'],
+                       properties=['route_id'], **kwargs)
+
+
+def make_log(**values):
+    changes = {
+        name: Change(new_value=new_value, old_value=old_value)
+        for name, (new_value, old_value) in values.items()
+    }
+    return Logged(changes=changes)
+
+
+@patch('tablechangelogger.log_table_change.create_table_change_log_record')
+def test_coalescer_keeps_first_old_and_last_new_value(mock_create):
+    plan = make_plan(coalesce_seconds=60)
+    coalescer = Coalescer()
+    coalescer.start = Mock()
+
+    coalescer.add(plan, 1, ['latest_speed', 'route_id'],
+                  make_log(latest_speed=(10, 5), route_id=(3, 3)),
+                  ['route_id'])
+    coalescer.add(plan, 1, ['latest_speed', 'pickup_point', 'route_id'],
+                  make_log(latest_speed=(20, 10), pickup_point=('1,1', '0,0'),
+                           route_id=(4, 3)),
+                  ['route_id'])
+    assert coalescer.pop_expired() == []
+    coalescer.flush()
+
+    assert mock_create.call_count == 1
+    args = mock_create.call_args[0]
+    assert args[3] == 'latest_speed,route_id,pickup_point'
+    log = args[4]
+    assert log.get_field_new_value('latest_speed') == 20
+    assert log.get_field_old_value('latest_speed') == 5
+    assert log.get_field_new_value('route_id') == 4
+
+
+@patch('tablechangelogger.log_table_change.create_table_change_log_record')
+def test_coalescer_drops_reverted_changes(mock_create):
+    plan = make_plan(coalesce_seconds=60)
+    coalescer = Coalescer()
+    coalescer.start = Mock()
+
+    coalescer.add(plan, 1, ['latest_speed'], make_log(latest_speed=(10, 5)),
+                  [])
+    coalescer.add(plan, 1, ['latest_speed'], make_log(latest_speed=(5, 10)),
+                  [])
+    coalescer.flush()
+
+    assert not mock_create.called
+
+
+def test_drop_negligible_changes_measures_from_last_logged_value():
+    plan = make_plan(min_deltas={'latest_speed': 1})
+
+    kept = []
+    for speed in (10.4, 10.8, 11.2):
+        log = make_log(latest_speed=(speed, speed - 0.4), route_id=(3, 3))
+        kept.append(drop_negligible_changes(
+            plan, 'creep', log, ['latest_speed', 'route_id']))
+
+    assert kept == [['route_id'], ['route_id'], ['latest_speed', 'route_id']]
+
+
+@patch('tablechangelogger.log_table_change.random.random', return_value=0.5)
+def test_drop_negligible_changes_samples(mock_random):
+    log = make_log(latest_speed=(10, 5), pickup_point=('1,1', '0,0'))
+    plan = make_plan(sample_rates={'latest_speed': 0.1})
+
+    kept = drop_negligible_changes(plan, 1, log,
+                                   ['latest_speed', 'pickup_point'])
+
+    assert kept == ['pickup_point']
+    assert list(log.changes) == ['pickup_point']
@@ -0,0 +1,89 @@
+import datetime
+from decimal import Decimal
+
+from django.db.models import Model
+from mock import Mock
+
+from tablechangelogger.codec import (
+    LOG_VERSION_PREFIX, LazyLogged, decode_log, encode_log, merge_logs,
+    normalize_value)
+from tablechangelogger.datastructures import Change, Logged
+from tablechangelogger.utils import serialize_field
+
+
+def test_encode_log_roundtrip():
+    changes = {
+        'route_id': Change(new_value=2, old_value=1),
+        'pickup_point': Change(new_value=(2, 2), old_value=None),
+        'details': Change(new_value={'$t': 'x'}, old_value={'a': [1.5]}),
+        'price': Change(new_value=Decimal('1.10'), old_value=None),
+        'updated_at': Change(
+            new_value=datetime.datetime(2019, 2, 22, 9, 1, 14, 619568),
+            old_value=datetime.date(2019, 2, 22)),
+    }
+    value = encode_log(Logged(changes=changes, created=False))
+    assert value.startswith(LOG_VERSION_PREFIX)
+
+    log = decode_log(value)
+    assert not log.created
+    for field_name, change in changes.items():
+        assert log.get_field_new_value(field_name) == change.new_value
+        assert log.get_field_old_value(field_name) == change.old_value
+
+
+def test_decode_legacy_log():
+    changes = {'route_id': Change(new_value=2, old_value=1)}
+    value = '{}~{}'.format(serialize_field(changes), True)
+
+    log = decode_log(value)
+    assert log.created
+    assert log.get_field_new_value('route_id') == 2
+    assert len(encode_log(log)) < len(value)
+
+
+def test_lazy_logged_decodes_on_access():
+    changes = {
+        'route_id': Change(new_value=2, old_value=1),
+        'pickup_point': Change(new_value=(2, 2), old_value=(1, 1)),
+    }
+    value = encode_log(Logged(changes=changes, created=False))
+
+    log = LazyLogged(value)
+    assert not log.created
+    assert log.get_field_new_value('route_id') == 2
+    assert log.get_field_old_value('missing') is None
+    assert not log.is_decoded
+
+    assert log.get_field_new_value('pickup_point') == (2, 2)
+    assert log.get_new_values()['route_id'] == 2
+    assert log.is_decoded
+
+
+def test_merge_logs_keeps_latest_values():
+    first_log = Logged(changes={
+        'route_id': Change(new_value=1, old_value=None),
+        'pickup_point': Change(new_value=(1, 1), old_value=None),
+    }, created=True)
+    second_log = LazyLogged(encode_log(Logged(changes={
+        'route_id': Change(new_value=2, old_value=1),
+    })))
+
+    log = merge_logs(first_log, second_log)
+    assert not log.created
+    assert sorted(log.get_field_names()) == ['pickup_point', 'route_id']
+    assert log.get_field_new_value('route_id') == 2
+    assert log.get_field_new_value('pickup_point') == (1, 1)
+    assert not second_log.is_decoded
+
+
+def test_normalize_value():
+    model_instance = Mock(spec=Model, pk=42)
+
+    assert normalize_value(None) is None
+    assert normalize_value(42) == normalize_value('42') == '42'
+    assert normalize_value(model_instance) == '42'
+    assert normalize_value(True) == 'true'
+    assert normalize_value(Decimal('1.50')) == '1.50'
+    assert normalize_value(datetime.date(2026, 10, 18)) == '2026-10-18'
+    assert normalize_value({'b': 1, 'a': [1]}) == '{"a":[1],"b":1}'
+    assert len(normalize_value('x' * 1000)) == 255
@@ -0,0 +1,46 @@
+import pytest
+from mock import Mock
+
+from tablechangelogger.diff import (
+    get_changed_fields, register_comparator, resolve_comparator,
+    resolve_comparators
+)
+
+
+def test_get_changed_fields_uses_comparators():
+    old_values = {'speed': 10.0, 'details': '{"a": 1, "b": 2}', 'name': 'a'}
+    new_values = {'speed': 10.004, 'details': {'b': 2, 'a': 1}, 'name': 'b'}
+    comparators = resolve_comparators({'comparators': {
+        'speed': ('float', {'tolerance': 0.01}),
+        'details': 'json',
+    }})
+
+    assert get_changed_fields(old_values, new_values, comparators) == ['name']
+    assert get_changed_fields(old_values, new_values) == [
+        'speed', 'details', 'name']
+
+
+def test_float_comparator_handles_none():
+    compare = resolve_comparator(('float', {'tolerance': 1}))
+
+    assert compare(None, None)
+    assert not compare(None, 0)
+
+
+def test_geometry_comparator():
+    compare = resolve_comparator(('geometry', {'tolerance': 0.5}))
+    old_value = Mock(srid=4326)
+    old_value.equals_exact.return_value = True
+
+    assert compare(old_value, Mock(srid=4326))
+    old_value.equals_exact.assert_called_once()
+    assert not compare(old_value, Mock(srid=3857))
+
+
+def test_registered_and_imported_comparators():
+    register_comparator('always', lambda: lambda old, new: True)
+
+    assert resolve_comparator('always')(1, 2)
+    assert resolve_comparator('tablechangelogger.diff.json_equal')('[1]', [1])
+    with pytest.raises(ImportError):
+        resolve_comparator('unknown')
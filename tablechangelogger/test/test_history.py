@@ -0,0 +1,87 @@
+from datetime import datetime, timezone
+
+import pytest
+from mock import MagicMock, Mock, patch
+
+from tablechangelogger.codec import merge_logs
+from tablechangelogger.datastructures import Change, Logged, LoggingPlan
+from tablechangelogger.history import (
+    decode_cursor, encode_cursor, get_change_history_page, get_field_query,
+    replay_logs
+)
+from tablechangelogger.log_table_change import is_checkpoint_due
+
+
+def make_log(**new_values):
+    return Logged(changes={
+        name: Change(new_value=value, old_value=None)
+        for name, value in new_values.items()
+    })
+
+
+def test_replay_logs_keeps_latest_values():
+    logs = [make_log(route_id=1, pickup_point='1,1'), None,
+            make_log(route_id=2)]
+
+    assert replay_logs({'driver_id': 7}, logs) == {
+        'driver_id': 7, 'route_id': 2, 'pickup_point': '1,1'}
+
+
+def test_replay_logs_from_merged_checkpoint():
+    checkpoint = merge_logs(make_log(route_id=1, pickup_point='1,1'),
+                            make_log(route_id=2))
+
+    values = replay_logs({}, [checkpoint, make_log(pickup_point='2,2')])
+
+    assert values == {'route_id': 2, 'pickup_point': '2,2'}
+
+
+def test_is_checkpoint_due():
+    plan = LoggingPlan(model=Mock(), app_label='mocks',
+                       table_name='MockClass', config={}, fields=[],
+                       properties=[], checkpoint_interval=3)
+
+    with patch('tablechangelogger.log_table_change.get_log_plan',
+               return_value=plan):
+        due = [is_checkpoint_due(Mock(seq=seq)) for seq in (None, 1, 3, 6)]
+
+    assert due == [False, False, True, True]
+
+
+def test_cursor_roundtrip():
+    created_at = datetime(2026, 10, 18, 9, tzinfo=timezone.utc)
+    cursor = encode_cursor(Mock(created_at=created_at, id=42))
+
+    assert decode_cursor(cursor) == (created_at, 42)
+    with pytest.raises(ValueError):
+        decode_cursor('not a cursor')
+
+
+def test_get_change_history_page_filters_after_cursor():
+    created_at = datetime(2026, 10, 18, 9, tzinfo=timezone.utc)
+    rows = [Mock(created_at=created_at, id=_id) for _id in (3, 2, 1)]
+    tcls = MagicMock()
+    tcls.filter.return_value = tcls
+    tcls.order_by.return_value = rows
+
+    page, cursor = get_change_history_page(tcls, limit=2)
+
+    assert page == rows[:2]
+    tcls.order_by.assert_called_once_with('-created_at', '-id')
+    assert decode_cursor(cursor) == (created_at, 2)
+
+    tcls.order_by.return_value = rows[2:]
+    page, cursor = get_change_history_page(tcls, cursor, limit=2)
+
+    assert page == rows[2:] and cursor is None
+    query = tcls.filter.call_args[0][0]
+    assert ('id__lt', 2) in query.children[1].children
+
+
+def test_get_field_query_matches_whole_field_names():
+    query = get_field_query('id')
+
+    assert ('field_name', 'id') in query.children
+    assert ('field_name__startswith', 'id,') in query.children
+    assert ('field_name__endswith', ',id') in query.children
+    assert ('field_name__contains', ',id,') in query.children
@@ -0,0 +1,111 @@
+import django
+import pytest
+from django.apps.registry import Apps
+from django.db import connection, models
+from mock import Mock, patch
+
+from tablechangelogger.datastructures import LoggingPlan
+from tablechangelogger.log_table_change import LOADED_STATE_ATTR
+from tablechangelogger.managers import (
+    TableChangeLogManager, build_update_logs
+)
+from tablechangelogger.registry import LOGGING_PLANS
+
+
+@patch('tablechangelogger.managers.build_table_change_log')
+def test_build_update_logs_diffs_in_memory(mock_build):
+    mock_build.side_effect = lambda *args: args
+    plan = LoggingPlan(model=None, app_label='mocks', table_name='MockClass',
+                       config={}, fields=['route_id', 'pickup_point'],
+                       properties=[])
+    old_rows = {
+        1: {'route_id': 1, 'pickup_point': '1,1'},
+        2: {'route_id': 1, 'pickup_point': '2,2'},
+    }
+    new_rows = {
+        1: {'route_id': 2, 'pickup_point': '1,1'},
+        2: {'route_id': 1, 'pickup_point': '2,2'},
+        3: {'route_id': 1, 'pickup_point': '3,3'},
+    }
+
+    tcls = build_update_logs(plan, old_rows, new_rows)
+
+    assert len(tcls) == 1
+    app_label, table_name, pk, field_names, log, properties = tcls[0]
+    assert (pk, field_names) == (1, 'route_id')
+    assert not log.created
+    assert log.get_field_old_value('route_id') == 1
+    assert log.get_field_new_value('route_id') == 2
+
+
+@patch('tablechangelogger.managers.build_table_change_log')
+def test_build_update_logs_logs_properties_of_changed_dependencies(
+        mock_build):
+    mock_build.side_effect = lambda *args: args
+    plan = LoggingPlan(model=None, app_label='mocks', table_name='MockClass',
+                       config={}, fields=['route_id'],
+                       properties=['route_name', 'label'],
+                       property_dependencies={'route_name': ['route_id'],
+                                              'label': ['name']})
+    old_rows = {1: {'route_id': 1, 'name': 'a'}, 2: {'route_id': 1,
+                                                      'name': 'a'}}
+    new_rows = {1: {'route_id': 2, 'name': 'a'}, 2: {'route_id': 1,
+                                                      'name': 'b'}}
+    instances = {pk: Mock(route_name='route', label='label')
+                 for pk in new_rows}
+
+    tcls = build_update_logs(plan, old_rows, new_rows, instances)
+
+    assert [(tcl[2], tcl[3]) for tcl in tcls] == [
+        (1, 'route_id,route_name'), (2, 'label')]
+
+
+@pytest.fixture(scope='module')
+def car_model():
+    """A model logged through the QuerySet, on an in-memory SQLite table"""
+    try:
+        django.setup()
+    except Exception as e:
+        pytest.skip('Django cannot be set up: {}'.format(e))
+
+    class Car(models.Model):
+        name = models.CharField(max_length=20)
+        speed = models.IntegerField()
+
+        objects = TableChangeLogManager()
+
+        class Meta:
+            app_label = 'mocks'
+            apps = Apps()
+
+    with connection.schema_editor() as editor:
+        editor.create_model(Car)
+    yield Car
+    with connection.schema_editor() as editor:
+        editor.delete_model(Car)
+
+
+@patch('tablechangelogger.managers.create_table_change_log_records')
+def test_bulk_update_logs_each_change_once(mock_create, car_model,
+                                           fake_models):
+    plan = LoggingPlan(model=car_model, app_label='mocks', table_name='Car',
+                       config={}, fields=['name', 'speed'], properties=[],
+                       field_attnames={'name': 'name', 'speed': 'speed'})
+    first = car_model.objects.create(name='a', speed=1)
+    second = car_model.objects.create(name='b', speed=1)
+    first.speed, second.speed = 2, 3
+    setattr(first, LOADED_STATE_ATTR, {'name': 'a', 'speed': 1})
+
+    with patch.dict(LOGGING_PLANS, {car_model: plan}):
+        assert car_model.objects.bulk_update(
+            [first, second], ['speed'], batch_size=1) == 2
+
+    # the updates Django runs per batch are not logged a second time
+    tcls, = [call[0][0] for call in mock_create.call_args_list]
+    assert [(tcl.instance_id, tcl.field_name,
+             tcl.log.get_field_new_value('speed')) for tcl in tcls] == [
+        (first.pk, 'speed', 2), (second.pk, 'speed', 3)]
+    assert sorted(car_model.objects.values_list('speed', flat=True)) == [
+        2, 3]
+    # the loaded state matches the row again
+    assert getattr(first, LOADED_STATE_ATTR) == {'name': 'a', 'speed': 2}
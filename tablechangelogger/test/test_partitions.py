@@ -0,0 +1,106 @@
+from datetime import datetime, timezone
+
+from mock import Mock
+
+from tablechangelogger.partitions import (
+    add_months, get_convert_prepare_sql, get_convert_sql,
+    get_create_partition_sql, get_expired_partitions, get_month_start,
+    get_partition_month, get_remove_partition_sql
+)
+
+
+def month(year, month):
+    return datetime(year, month, 1, tzinfo=timezone.utc)
+
+
+def mock_connection():
+    return Mock(ops=Mock(quote_name=lambda name: '"{}"'.format(name)))
+
+
+def test_add_months_crosses_years():
+    assert add_months(month(2026, 11), 3) == month(2027, 2)
+    assert add_months(month(2026, 1), -1) == month(2025, 12)
+
+
+def test_get_month_start():
+    value = datetime(2026, 10, 18, 9, 30, tzinfo=timezone.utc)
+    assert get_month_start(value) == month(2026, 10)
+
+
+def test_get_create_partition_sql():
+    sql = get_create_partition_sql(mock_connection(), 'tcl', month(2026, 12))
+
+    assert sql == (
+        'CREATE TABLE IF NOT EXISTS "tcl_p2026_12" PARTITION OF "tcl" '
+        "FOR VALUES FROM ('2026-12-01T00:00:00+00:00') "
+        "TO ('2027-01-01T00:00:00+00:00')")
+    assert get_partition_month('tcl', 'tcl_p2026_12') == month(2026, 12)
+
+
+def test_get_expired_partitions_keeps_legacy_and_current_months():
+    names = ['tcl_legacy', 'tcl_default', 'tcl_p2026_09', 'tcl_p2026_08',
+             'tcl_p2026_10', 'other_p2026_01']
+    cutoff = datetime(2026, 10, 1, 12, tzinfo=timezone.utc)
+
+    expired = get_expired_partitions('tcl', names, cutoff)
+
+    assert expired == ['tcl_p2026_08', 'tcl_p2026_09']
+
+
+def test_get_convert_prepare_sql_does_not_block_writes():
+    statements = get_convert_prepare_sql(mock_connection(), 'tcl',
+                                         month(2026, 11))
+
+    assert statements == [
+        'ALTER TABLE "tcl" ADD CONSTRAINT "tcl_legacy_created_at_check" '
+        "CHECK (created_at < '2026-11-01T00:00:00+00:00') NOT VALID",
+        'ALTER TABLE "tcl" VALIDATE CONSTRAINT "tcl_legacy_created_at_check"',
+        'CREATE UNIQUE INDEX CONCURRENTLY IF NOT EXISTS '
+        '"tcl_legacy_id_created_at" ON "tcl" (id, created_at)',
+        'CREATE UNIQUE INDEX CONCURRENTLY IF NOT EXISTS '
+        '"tcl_legacy_unique_id_created_at" ON "tcl" (unique_id, created_at)',
+    ]
+
+
+def test_get_convert_sql_attaches_table_as_legacy_partition():
+    indexes = [
+        ('tcl_instance_seq_idx', 'CREATE INDEX tcl_instance_seq_idx ON '
+         'public.tcl USING btree (app_label, table_name, instance_id, seq)'),
+        ('tcl_legacy_id_created_at', 'CREATE UNIQUE INDEX '
+         'tcl_legacy_id_created_at ON public.tcl USING btree '
+         '(id, created_at)'),
+    ]
+
+    statements = get_convert_sql(mock_connection(), 'tcl', month(2026, 11),
+                                 indexes, sequence='tcl_id_seq')
+
+    assert statements[0] == 'ALTER TABLE "tcl" RENAME TO "tcl_legacy"'
+    # the index is recreated under its name, the legacy one is renamed
+    assert statements.index(
+        'ALTER INDEX "tcl_instance_seq_idx" RENAME TO '
+        '"tcl_instance_seq_idx_legacy"') < statements.index(indexes[0][1])
+    # the unique indexes built beforehand back the constraints
+    assert indexes[1][1] not in statements
+    assert ('ALTER TABLE "tcl_legacy" ADD CONSTRAINT '
+            '"tcl_legacy_id_created_at" UNIQUE USING INDEX '
+            '"tcl_legacy_id_created_at"') in statements
+    assert 'ALTER SEQUENCE tcl_id_seq OWNED BY "tcl".id' in statements
+    assert statements[-2:] == [
+        'ALTER TABLE "tcl" ATTACH PARTITION "tcl_legacy" FOR VALUES FROM '
+        "(MINVALUE) TO ('2026-11-01T00:00:00+00:00')",
+        'CREATE TABLE "tcl_default" PARTITION OF "tcl" DEFAULT',
+    ]
+
+
+def test_get_remove_partition_sql_deletes_field_rows_first():
+    connection = mock_connection()
+
+    assert get_remove_partition_sql(
+        connection, 'tcl', 'tcl_field', 'tcl_p2026_08') == [
+        'DELETE FROM "tcl_field" WHERE log_id IN '
+        '(SELECT id FROM "tcl_p2026_08")',
+        'DROP TABLE "tcl_p2026_08"',
+    ]
+    assert get_remove_partition_sql(
+        connection, 'tcl', 'tcl_field', 'tcl_p2026_08', detach=True)[-1] == (
+        'ALTER TABLE "tcl" DETACH PARTITION "tcl_p2026_08"')
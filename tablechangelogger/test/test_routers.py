@@ -0,0 +1,51 @@
+from mock import Mock, patch
+
+from tablechangelogger import log_table_change
+from tablechangelogger.routers import TableChangeLogRouter
+
+
+def get_model(app_label):
+    return Mock(_meta=Mock(app_label=app_label))
+
+
+@patch('tablechangelogger.routers.READ_DATABASE', 'logs_replica')
+@patch('tablechangelogger.routers.WRITE_DATABASE', 'logs')
+def test_router_routes_log_models_only():
+    router = TableChangeLogRouter()
+    log_model = get_model('tablechangelogger')
+    other_model = get_model('mocks')
+
+    assert router.db_for_write(log_model) == 'logs'
+    assert router.db_for_read(log_model) == 'logs_replica'
+    assert router.db_for_write(other_model) is None
+    assert router.db_for_read(other_model) is None
+
+    # related logs are read where the log pointing to them was read
+    instance = Mock(_state=Mock(db='logs'))
+    assert router.db_for_read(log_model, instance=instance) == 'logs'
+
+    assert router.allow_migrate('logs', 'tablechangelogger') is True
+    assert router.allow_migrate('default', 'tablechangelogger') is False
+    assert router.allow_migrate('default', 'mocks') is None
+
+
+@patch('tablechangelogger.routers.READ_DATABASE', None)
+@patch('tablechangelogger.routers.WRITE_DATABASE', None)
+def test_router_defers_without_aliases():
+    router = TableChangeLogRouter()
+    log_model = get_model('tablechangelogger')
+
+    assert router.db_for_write(log_model) is None
+    assert router.db_for_read(log_model) is None
+    assert router.allow_migrate('default', 'tablechangelogger') is None
+
+
+@patch('tablechangelogger.buffer.get_pending_logs')
+@patch.object(log_table_change, 'WRITE_MODE', 'on_commit')
+def test_on_commit_mode_waits_for_instance_database(mock_get_pending_logs):
+    pending_logs = mock_get_pending_logs.return_value = []
+
+    log_table_change.create_table_change_log_records(['tcl'], using='other')
+
+    mock_get_pending_logs.assert_called_once_with('other')
+    assert pending_logs == ['tcl']
@@ -0,0 +1,72 @@
+import os
+import socket
+
+from tablechangelogger.spool import (
+    OPEN_SUFFIX, SEALED_SUFFIX, Spool, escape_copy_value, get_segment_id,
+    get_segments, is_sealed, read_records
+)
+
+
+def test_spool_appends_readable_records(tmp_path):
+    spool = Spool(str(tmp_path), segment_bytes=1024, fsync_records=2)
+    spool.append([b'first', b'second'])
+    spool.append([b'third'])
+
+    name, = os.listdir(str(tmp_path))
+    assert name.endswith(OPEN_SUFFIX)
+    path = os.path.join(str(tmp_path), name)
+
+    payloads, offset = read_records(path)
+    assert payloads == [b'first', b'second', b'third']
+    assert offset == os.path.getsize(path)
+
+    payloads, offset = read_records(path, limit=1)
+    assert payloads == [b'first']
+    assert read_records(path, offset)[0] == [b'second', b'third']
+
+
+def test_read_stops_at_torn_record(tmp_path):
+    spool = Spool(str(tmp_path))
+    spool.append([b'complete'])
+    path = spool.path
+    end = os.path.getsize(path)
+
+    # a crash in the middle of an append leaves part of a record
+    with open(path, 'ab') as segment:
+        segment.write(b'\x00\x00\x00\x10\x00')
+
+    assert read_records(path) == ([b'complete'], end)
+
+
+def test_spool_seals_full_segments(tmp_path):
+    spool = Spool(str(tmp_path), segment_bytes=10)
+    spool.append([b'a long enough payload'])
+    spool.append([b'next'])
+    spool.close()
+
+    names = get_segments(str(tmp_path))
+    assert len(names) == 2
+    assert all(name.endswith(SEALED_SUFFIX) for name in names)
+    assert read_records(os.path.join(str(tmp_path), names[0]))[0] == [
+        b'a long enough payload']
+
+
+def test_open_segment_of_gone_process_is_sealed():
+    host = socket.gethostname()
+    alive = '{}-{}-1{}'.format(host, os.getpid(), OPEN_SUFFIX)
+    gone = '{}-{}-2{}'.format(host, 2 ** 22 + 1, OPEN_SUFFIX)
+    remote = 'other-host-{}-3{}'.format(2 ** 22 + 1, OPEN_SUFFIX)
+
+    assert not is_sealed(alive)
+    assert is_sealed(gone)
+    assert not is_sealed(remote)
+    assert is_sealed('host-1-4' + SEALED_SUFFIX)
+    assert get_segment_id(gone) == get_segment_id(
+        gone.replace(OPEN_SUFFIX, SEALED_SUFFIX))
+
+
+def test_escape_copy_value():
+    assert escape_copy_value(None) == '\\N'
+    assert escape_copy_value(True) == 't'
+    assert escape_copy_value(12) == '12'
+    assert escape_copy_value('a\tb\nc\\d') == 'a\\tb\\nc\\\\d'
@@ -0,0 +1,46 @@
+from mock import Mock, patch
+
+from tablechangelogger import stats
+from tablechangelogger.stats import NULL_TIMER, StatsdSink
+
+
+def test_timer_does_nothing_without_sink():
+    with patch.object(stats, 'SINK', None):
+        assert stats.timer('diff', 'mocks', 'MockClass') is NULL_TIMER
+        stats.increment('logs.written', 'mocks', 'MockClass')
+
+
+def test_timer_and_increment_reach_sink():
+    sink = Mock()
+    with patch.object(stats, 'SINK', sink):
+        with stats.timer('diff', 'mocks', 'MockClass'):
+            pass
+        stats.increment('logs.skipped', 'mocks', 'MockClass')
+
+    name, seconds, tags = sink.timing.call_args[0]
+    assert name == 'diff'
+    assert seconds >= 0
+    assert tags == {'app_label': 'mocks', 'model': 'MockClass'}
+    sink.increment.assert_called_once_with(
+        'logs.skipped', 1, {'app_label': 'mocks', 'model': 'MockClass'})
+
+
+def test_get_batch_tags_only_tags_uniform_batches():
+    tcl = Mock(app_label='mocks', table_name='MockClass')
+    other_tcl = Mock(app_label='mocks', table_name='OtherClass')
+
+    assert stats.get_batch_tags([tcl, tcl]) == {
+        'app_label': 'mocks', 'model': 'MockClass'}
+    assert stats.get_batch_tags([tcl, other_tcl]) == {}
+
+
+def test_statsd_sink_line_format():
+    sink = StatsdSink(prefix='tcl')
+    sink.socket = Mock()
+
+    sink.timing('insert', 0.0125, {'model': 'MockClass', 'app_label': 'x'})
+    sink.increment('logs.written', 2, {})
+
+    lines = [call[0][0] for call in sink.socket.sendto.call_args_list]
+    assert lines == [b'tcl.insert:12.5|ms|#app_label:x,model:MockClass',
+                     b'tcl.logs.written:2|c']
@@ -1,15 +1,22 @@
 import pytest
-from mock import patch
+from mock import Mock, patch
 
-from tablechangelogger.datastructures import Logged, Change
+from tablechangelogger import log_table_change, signals
+from tablechangelogger.datastructures import (
+    Logged, Change, LoggingPlan, LRUCache)
 from tablechangelogger.log_table_change import (
-    is_loggable
+    CONTENT_HASH_ATTR, RECENT_LOGS, advance_table_change_log_head,
+    create_log_object, deduplicate_table_change_logs,
+    generate_tcl_content_hash, generate_tcl_unique_id, get_loaded_state,
+    get_tracked_values, is_loggable, is_recent_log, link_table_change_log,
+    link_unsaved_previous_log, remember_recent_logs, take_loaded_state
 )
 
 
 class MockClass(object):
     def __init__(self, _id, route_id, pickup_point):
         self.id = _id
+        self.pk = _id
         self.properties = ['route_id']
         self.fields = ['pickup_point']
         self.route_id = route_id
@@ -36,6 +43,24 @@ def mock_tcl_data(app_label, table_name, _id, route_id, pickup_point):
     return data
 
 
+class MockClassModel(MockClass):
+    pass
+
+
+MockClass._meta = Mock(model=MockClass, app_label='mocks')
+MockClassModel._meta = Mock(model=MockClassModel, app_label='mocks')
+
+
+@pytest.fixture
+def mock_logging_plans():
+    plan = LoggingPlan(model=MockClass, app_label='mocks',
+                       table_name='MockClass', config={},
+                       fields=['pickup_point'], properties=['route_id'])
+    with patch.dict('tablechangelogger.registry.LOGGING_PLANS',
+                    {MockClass: plan}, clear=True) as plans:
+        yield plans
+
+
 @pytest.fixture(params=[True, False])
 def mock_tcl_attributes(request):
     app_label = 'mocks'
@@ -46,12 +71,194 @@ def mock_tcl_attributes(request):
     return data
 
 
-@patch('tablechangelogger.log_table_change.get_app_label')
-@patch('tablechangelogger.log_table_change.get_model_name')
-def test_is_loggable(mock1, mock2, mock_tcl_attributes):
+def test_is_loggable(mock_logging_plans, mock_tcl_attributes):
     created = mock_tcl_attributes.get('created')
     mock_instance = mock_tcl_attributes.pop('mock_instance')
-    mock1.return_value = mock_tcl_attributes.get('table_name')
-    mock2.return_value = mock_tcl_attributes.get('app_label')
     loggable = is_loggable(mock_instance)
     assert loggable == (not created)
+
+
+def test_is_loggable_matches_exact_model(mock_logging_plans):
+    mock_instance = MockClassModel(_id=1, route_id=1, pickup_point='2,2')
+    assert not is_loggable(mock_instance)
+
+
+def test_loaded_state_snapshot():
+    plan = LoggingPlan(model=MockClass, app_label='mocks',
+                       table_name='MockClass', config={},
+                       fields=['pickup_point'], properties=['route_id'],
+                       field_attnames={'pickup_point': 'pickup_point'},
+                       track_loaded_state=True)
+    mock_instance = MockClass(_id=1, route_id=1, pickup_point='2,2')
+    mock_instance._state = Mock(adding=False)
+    take_loaded_state(mock_instance, plan)
+    mock_instance.pickup_point = '3,3'
+
+    assert get_loaded_state(mock_instance, plan) == {'pickup_point': '2,2'}
+
+    log = create_log_object(
+        ['pickup_point'], mock_instance,
+        old_values=get_loaded_state(mock_instance, plan),
+        new_values=get_tracked_values(mock_instance, plan))
+    assert not log.created
+    assert log.get_field_old_value('pickup_point') == '2,2'
+    assert log.get_field_new_value('pickup_point') == '3,3'
+
+    # instances built by hand are fetched from the database instead
+    mock_instance._state.adding = True
+    assert get_loaded_state(mock_instance, plan) is None
+
+
+def test_link_table_change_log():
+    head = Mock(last_log_id=None, seq=None, property_unique_ids={}, log=None)
+    del head._tcl_unsaved_latest
+    first_log = Mock(pk=None, seq=None, property_unique_ids={},
+                     log=Logged(changes={}, created=True))
+    link_table_change_log(first_log, head)
+    advance_table_change_log_head(head, first_log)
+    assert first_log.seq == 1
+
+    second_log = Mock(pk=None, seq=None, property_unique_ids={},
+                      log=Logged(changes={}))
+    link_table_change_log(second_log, head)
+    advance_table_change_log_head(head, second_log)
+    assert second_log.seq == 2
+    assert head.seq == 2
+    assert not link_unsaved_previous_log(second_log)
+
+    first_log.pk = 1
+    assert link_unsaved_previous_log(second_log)
+    assert second_log.previous is first_log
+
+
+def test_unique_id_is_chained_content_hash():
+    log = Logged(changes={'route_id': Change(new_value=2, old_value=1)})
+    content_hash = generate_tcl_content_hash('mocks', 'MockClass', 1,
+                                             'route_id', log)
+    assert content_hash == generate_tcl_content_hash(
+        'mocks', 'MockClass', 1, 'route_id', log)
+
+    first_id = generate_tcl_unique_id(content_hash)
+    assert first_id == generate_tcl_unique_id(content_hash)
+    assert first_id != generate_tcl_unique_id(content_hash, first_id)
+
+
+def mock_log(content_hash):
+    tcl = Mock(app_label='mocks', table_name='MockClass', instance_id=1,
+               pk=None, property_unique_ids={}, log=Logged(changes={}))
+    setattr(tcl, CONTENT_HASH_ATTR, content_hash)
+    return tcl
+
+
+def mock_head(last_unique_id):
+    head = Mock(last_log_id=5, seq=3, property_unique_ids={}, log=None,
+                last_unique_id=last_unique_id)
+    del head._tcl_unsaved_latest
+    return head
+
+
+@patch('tablechangelogger.log_table_change.get_log_plan', return_value=None)
+@patch('tablechangelogger.log_table_change.is_same_log', return_value=False)
+def test_recent_log_is_trusted_while_it_is_the_latest(mock_same, mock_plan):
+    written = mock_log('a')
+    written.unique_id = 'u1'
+    key = ('mocks', 'MockClass', 1)
+
+    with patch.dict(RECENT_LOGS.items, clear=True):
+        remember_recent_logs([written])
+
+        assert is_recent_log(mock_log('a'), mock_head('u1'))
+        # another process logged a different change since
+        assert not is_recent_log(mock_log('a'), mock_head('u2'))
+
+        assert deduplicate_table_change_logs(
+            [mock_log('a')], {key: mock_head('u1')}) == []
+        # the change is undone and redone in the same batch
+        tcls = [mock_log('b'), mock_log('a')]
+        assert deduplicate_table_change_logs(
+            tcls, {key: mock_head('u1')}) == tcls
+
+
+@patch('tablechangelogger.log_table_change.get_log_plan', return_value=None)
+@patch('tablechangelogger.log_table_change.is_same_log', return_value=False)
+def test_old_property_values_are_the_last_logged_ones(mock_same, mock_plan):
+    key = ('mocks', 'MockClass', 1)
+    head = mock_head('u1')
+    head.log = Logged(changes={
+        'plate': Change(new_value='b', old_value='a'),
+        'label': Change(new_value='b-0', old_value='a-0')})
+    tcls = [mock_log('a'), mock_log('b')]
+    for tcl, plate in zip(tcls, ['b', 'c']):
+        # the fetched row has no properties, their old values are unknown
+        tcl.log = Logged(changes={
+            'plate': Change(new_value=chr(ord(plate) + 1), old_value=plate),
+            'label': Change(new_value=plate + '-1', old_value=None)})
+        tcl.property_unique_ids = {'label': plate + '-1'}
+
+    deduplicate_table_change_logs(tcls, {key: head})
+
+    assert tcls[0].log.changes['label'].old_value == 'b-0'
+    # the second one follows the first one of the same batch
+    assert tcls[1].log.changes['label'].old_value == 'b-1'
+    # fields keep the old values of the row
+    assert tcls[1].log.changes['plate'].old_value == 'c'
+
+
+def test_lru_cache_evicts_least_recently_used():
+    cache = LRUCache(max_size=2)
+    cache.set('first', 1)
+    cache.set('second', 2)
+    cache.get('first')
+    cache.set('third', 3)
+
+    assert cache.get('first') == 1
+    assert cache.get('second') is None
+    assert cache.get('third') == 3
+
+
+def test_callbacks_run_once_the_heads_are_unlocked(fake_models):
+    tcls = [mock_log('a'), mock_log('b')]
+    calls = []
+
+    class Atomic(object):
+        def __init__(self, using=None):
+            pass
+
+        def __enter__(self):
+            calls.append('lock')
+
+        def __exit__(self, *exc_info):
+            calls.append('commit' if exc_info[0] is None else 'rollback')
+
+    def callback(sender, instance, **kwargs):
+        calls.append(('callback', instance))
+        raise ValueError
+
+    with patch.object(log_table_change.transaction, 'atomic', Atomic), \
+            patch.object(log_table_change.transaction, 'on_commit'), \
+            patch.object(log_table_change, 'get_table_change_log_heads'), \
+            patch.object(log_table_change, 'deduplicate_table_change_logs',
+                         side_effect=lambda tcls, heads: tcls), \
+            patch.object(log_table_change, 'save_table_change_logs',
+                         side_effect=lambda tcls, heads, insert: tcls), \
+            patch.object(log_table_change.post_save, 'send',
+                         side_effect=callback):
+        with pytest.raises(ValueError):
+            log_table_change.write_table_change_logs(tcls)
+
+    # the records are committed before the first callback raises
+    assert calls == ['lock', 'commit', ('callback', tcls[0])]
+
+
+def test_pre_save_is_connected_for_every_model_of_an_app():
+    class Car(object):
+        pass
+
+    class Truck(object):
+        pass
+
+    with patch.object(signals.pre_save, 'connect') as mock_connect:
+        signals.connect_pre_save_receivers({Car: Mock(), Truck: Mock()})
+
+    assert [call[1]['sender'] for call in mock_connect.call_args_list] == [
+        Car, Truck]